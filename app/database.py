@@ -1,18 +1,86 @@
+import logging
+import os
+import re
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from config import DATABASE_URL
-from sqlalchemy import select, insert, update
+from config import (
+    DATABASE_URL, DB_ECHO, DB_READ_POOL_SIZE, SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS,
+    SQLITE_CACHE_SIZE, SQLITE_MMAP_SIZE, SQLITE_TEMP_STORE, SQLITE_BUSY_TIMEOUT
+)
+from sqlalchemy import select, insert, update, text, inspect, event
+
+logger = logging.getLogger(__name__)
+
+# 全文索引分词时的文字片段（中文、字母、数字）
+WORD_RUN_PATTERN = re.compile(r"\w+")
+# 上传/导入的文件以内容sha256命名（早期导入的重复文件带 _1、_2 后缀）
+CONTENT_HASH_FILENAME_PATTERN = re.compile(r"^([0-9a-f]{64})(?:_\d+)?$")
 
 # 声明基类
 Base = declarative_base()
 
+# SQLite 连接参数（journal_mode 为数据库文件级设置，其余为连接级设置，需要每个连接各执行一次）
+SQLITE_PRAGMAS = {
+    "journal_mode": SQLITE_JOURNAL_MODE,
+    "synchronous": SQLITE_SYNCHRONOUS,
+    "cache_size": SQLITE_CACHE_SIZE,
+    "mmap_size": SQLITE_MMAP_SIZE,
+    "temp_store": SQLITE_TEMP_STORE,
+    "busy_timeout": SQLITE_BUSY_TIMEOUT,
+}
+# 只读连接不修改日志模式，并禁止写入
+SQLITE_READ_PRAGMAS = {
+    **{name: value for name, value in SQLITE_PRAGMAS.items() if name != "journal_mode"},
+    "query_only": "ON",
+}
+
+def apply_sqlite_pragmas(dbapi_connection, pragmas: dict):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+def cjk_bigrams(value):
+    """
+    把文本切成相邻两字组（空格分隔），供二元全文索引 documents_bigram 使用
+
+    按非文字字符断开，单字的片段原样保留；写入与查询使用同一切分，结果一致
+    """
+    if value is None:
+        return None
+    tokens = []
+    for run in WORD_RUN_PATTERN.findall(str(value)):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return " ".join(tokens)
+
+def create_engine_with_pragmas(url: str, pragmas: dict, **kwargs):
+    """创建异步引擎，SQLite 下每个新建的池连接都会执行 pragmas"""
+    new_engine = create_async_engine(
+        url,
+        connect_args={"check_same_thread": False},  # 允许多线程访问
+        echo=DB_ECHO,  # 可选，查看SQL日志
+        **kwargs
+    )
+    if new_engine.dialect.name == "sqlite":
+        @event.listens_for(new_engine.sync_engine, "connect")
+        def _on_connect(dbapi_connection, connection_record):
+            apply_sqlite_pragmas(dbapi_connection, pragmas)
+    return new_engine
+
 # database.py
-engine = create_async_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},  # 允许多线程访问
-    echo=True  # 可选，查看SQL日志
-)
+engine = create_engine_with_pragmas(DATABASE_URL, SQLITE_PRAGMAS)
+
+# 只读引擎：独立连接池，重读接口使用，WAL下读连接不会排在写事务后面
+if engine.dialect.name == "sqlite" and ":memory:" not in DATABASE_URL:
+    read_engine = create_engine_with_pragmas(DATABASE_URL, SQLITE_READ_PRAGMAS, pool_size=DB_READ_POOL_SIZE)
+else:
+    read_engine = engine
 
 AsyncSessionLocal = sessionmaker(
     bind=engine,
@@ -20,13 +88,191 @@ AsyncSessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+ReadSessionLocal = sessionmaker(
+    bind=read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False
+)
+
 async def get_db():
     async with AsyncSessionLocal() as session:
         yield session
 
+async def get_read_db():
+    """只读会话，用于搜索、统计等只查询不写入的接口"""
+    async with ReadSessionLocal() as session:
+        yield session
+
+def _create_missing_indexes(sync_conn, metadata):
+    # create_all 不会给已存在的表补建新增的索引
+    for table in metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+def _add_missing_columns(sync_conn, metadata):
+    # create_all 不会给已存在的表补加新增的列，这里只补加可为空的列；返回补加的 (表名, 列名)
+    added = set()
+    inspector = inspect(sync_conn)
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing or not column.nullable:
+                continue
+            column_type = column.type.compile(dialect=sync_conn.dialect)
+            sync_conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+            added.add((table.name, column.name))
+    return added
+
+def file_content_hash(file_path):
+    """文件的sha256：文件名即哈希时直接取用，否则读取文件计算；文件不存在或不可读时返回None"""
+    if not file_path:
+        return None
+    stem = os.path.splitext(os.path.basename(file_path))[0]
+    match = CONTENT_HASH_FILENAME_PATTERN.match(stem)
+    if match:
+        return match.group(1)
+    from app.utils.parse_cache import file_sha256
+    try:
+        return file_sha256(file_path)
+    except OSError:
+        return None
+
+def _backfill_content_hash(sync_conn):
+    """
+    content_hash 列新加入时为已有文档回填（只执行一次）
+
+    内容相同的多条文档只有id最小的一条写入哈希，其余保持为空，保证唯一索引可以建立
+    """
+    seen = set()
+    updates = []
+    duplicates = []
+    for doc_id, file_path in sync_conn.execute(text("SELECT id, file_path FROM documents ORDER BY id")):
+        content_hash = file_content_hash(file_path)
+        if content_hash is None:
+            continue
+        if content_hash in seen:
+            duplicates.append(doc_id)
+            continue
+        seen.add(content_hash)
+        updates.append({"id": doc_id, "content_hash": content_hash})
+    if updates:
+        sync_conn.execute(text("UPDATE documents SET content_hash = :content_hash WHERE id = :id"), updates)
+    logger.info(f"已为 {len(updates)} 条文档回填 content_hash")
+    if duplicates:
+        logger.warning(f"{len(duplicates)} 条文档与更早的文档内容相同，content_hash 保持为空: {duplicates[:20]}")
+
 async def create_table(Base):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        added = await conn.run_sync(_add_missing_columns, Base.metadata)
+        if ("documents", "content_hash") in added:
+            # 唯一索引建立之前回填
+            await conn.run_sync(_backfill_content_hash)
+        await conn.run_sync(_create_missing_indexes, Base.metadata)
+
+# 文档全文索引：
+# documents_fts 使用 trigram 分词，支持3个字符及以上的子串匹配，由触发器与 documents 表保持同步；
+# trigram 无法检索两个字的词（洪涝、干旱、水库等），documents_bigram 存放切成相邻两字组的文本
+# （cjk_bigrams），用 unicode61 分词建索引，两个字及以上的词都可检索。
+# 两字组在 Python 中生成，由 doc_crud 写入文档时一并写入；触发器只做删除、不调用自定义函数，
+# 应用之外（sqlite3 命令行、迁移脚本等）写 documents 表不会出错，只是新写入的文本在重建前不能按两字词检索
+DOCUMENT_FTS_TABLES = {
+    "documents_fts": """CREATE VIRTUAL TABLE documents_fts USING fts5(
+        title, description, content,
+        content='documents', content_rowid='id', tokenize='trigram'
+    )""",
+    "documents_bigram": """CREATE VIRTUAL TABLE documents_bigram USING fts5(
+        title, description, content,
+        tokenize='unicode61'
+    )""",
+}
+DOCUMENT_FTS_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_ai AFTER INSERT ON documents BEGIN
+        INSERT INTO documents_fts(rowid, title, description, content)
+        VALUES (new.id, new.title, new.description, new.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_ad AFTER DELETE ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, title, description, content)
+        VALUES ('delete', old.id, old.title, old.description, old.content);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS documents_fts_au AFTER UPDATE OF title, description, content ON documents BEGIN
+        INSERT INTO documents_fts(documents_fts, rowid, title, description, content)
+        VALUES ('delete', old.id, old.title, old.description, old.content);
+        INSERT INTO documents_fts(rowid, title, description, content)
+        VALUES (new.id, new.title, new.description, new.content);
+    END""",
+    # 文档删除或文本修改后移除旧的两字组，修改后的文本由写入方重新写入
+    """CREATE TRIGGER IF NOT EXISTS documents_bigram_clear_ad AFTER DELETE ON documents BEGIN
+        DELETE FROM documents_bigram WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS documents_bigram_clear_au AFTER UPDATE OF title, description, content ON documents BEGIN
+        DELETE FROM documents_bigram WHERE rowid = old.id;
+    END""",
+]
+# 早期版本在触发器中调用 cjk_bigrams 函数，升级时删除
+OBSOLETE_DOCUMENT_FTS_TRIGGERS = ["documents_bigram_ai", "documents_bigram_ad", "documents_bigram_au"]
+DOCUMENT_FTS_DDL = list(DOCUMENT_FTS_TABLES.values()) + DOCUMENT_FTS_TRIGGERS
+BIGRAM_REBUILD_BATCH = 1000
+
+def document_bigram_row(doc_id, title, description, content) -> dict:
+    return {
+        "id": doc_id,
+        "title": cjk_bigrams(title),
+        "description": cjk_bigrams(description),
+        "content": cjk_bigrams(content),
+    }
+
+def rebuild_document_bigrams(sync_conn):
+    """
+    按 documents 表重建二元索引（新建索引表时执行；也可在脚本中用 conn.run_sync 调用）
+
+    逐批读取、生成两字组后写入，不把全部文档读入内存
+    """
+    sync_conn.execute(text("DELETE FROM documents_bigram"))
+    insert_stmt = text(
+        "INSERT INTO documents_bigram(rowid, title, description, content) "
+        "VALUES (:id, :title, :description, :content)"
+    )
+    last_id = 0
+    while True:
+        rows = sync_conn.execute(
+            text("SELECT id, title, description, content FROM documents WHERE id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": BIGRAM_REBUILD_BATCH}
+        ).all()
+        if not rows:
+            break
+        sync_conn.execute(insert_stmt, [document_bigram_row(*row) for row in rows])
+        last_id = rows[-1][0]
+
+async def create_document_fts():
+    """创建文档全文索引及同步触发器，首次创建时用已有数据回填（仅SQLite）"""
+    if engine.dialect.name != "sqlite":
+        return False
+    async with engine.begin() as conn:
+        for name in OBSOLETE_DOCUMENT_FTS_TRIGGERS:
+            await conn.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+        created = []
+        for name, ddl in DOCUMENT_FTS_TABLES.items():
+            result = await conn.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": name}
+            )
+            existing = result.scalar()
+            if existing is not None and name == "documents_bigram" and "content=''" in existing:
+                # 早期版本为无内容表，删除记录需要原文的两字组，无法只用触发器维护，重建为普通表
+                await conn.execute(text(f"DROP TABLE {name}"))
+                existing = None
+            if existing is None:
+                await conn.execute(text(ddl))
+                created.append(name)
+        for ddl in DOCUMENT_FTS_TRIGGERS:
+            await conn.execute(text(ddl))
+        if "documents_fts" in created:
+            await conn.execute(text("INSERT INTO documents_fts(documents_fts) VALUES ('rebuild')"))
+        if "documents_bigram" in created:
+            await conn.run_sync(rebuild_document_bigrams)
+    return True
 
 # database.py
 async def insert_data(table, data):
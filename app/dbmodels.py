@@ -1,11 +1,11 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, LargeBinary, Text
+from sqlalchemy import Boolean, Column, ForeignKey, Index, Integer, String, DateTime, LargeBinary, Text
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.ext.asyncio import AsyncAttrs
 
-class User(Base):
+class User(AsyncAttrs, Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -45,12 +45,17 @@ class AttendanceRecord(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    timestamp = Column(DateTime(timezone=True), server_default=func.now(), index=True)  # 按日期统计签到
     photo_path = Column(String)  # 签到照片路径
     is_verified = Column(Boolean, default=False)  # 人脸验证状态
     
     user = relationship("User", back_populates="attendance_records")    
 
+    # 首页按日统计签到人数只需 timestamp 和 user_id，覆盖索引免去逐行回表
+    __table_args__ = (
+        Index("ix_attendance_records_timestamp_user_id", "timestamp", "user_id"),
+    )
+
 
 class Tag(Base):
     __tablename__ = "tags"
@@ -78,6 +83,8 @@ class Document(AsyncAttrs, Base):
     parsed = Column(Boolean, default=False)
     file_path = Column(String)
     file_type = Column(String)
+    # 文件内容sha256，相同内容只保留一条文档（只解析、索引一次）
+    content_hash = Column(String(64), unique=True, index=True, nullable=True)
     
     # 保留关系但重命名
     tags = relationship("Tag", secondary="document_tags", back_populates="documents")
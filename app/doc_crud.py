@@ -1,13 +1,14 @@
 import os
 from app import schemas
 from app.utils.es_utils import delete_document_from_es, index_document_with_fragments
+from app.database import WORD_RUN_PATTERN, cjk_bigrams, document_bigram_row
 from app.dbmodels import Document, Tag
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import select, func, or_
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+from sqlalchemy import select, insert, func, or_, text
 import logging
 logger = logging.getLogger(__name__)
 
@@ -44,6 +45,45 @@ async def delete_tag(db: AsyncSession, tag_id: int):
     return
 
 # 新增文档操作
+def merge_tag_string(tag_string: Optional[str], *values: str) -> str:
+    """把新的标签/标题合并进逗号分隔的 tag_string，去重并保持原有顺序"""
+    tags = []
+    for value in (tag_string or "", *values):
+        for tag in (value or "").replace("，", ",").split(","):
+            tag = tag.strip()
+            if tag and tag not in tags:
+                tags.append(tag)
+    return ",".join(tags)
+
+async def write_document_bigrams(db: AsyncSession, documents: List[Document]):
+    """
+    写入（或替换）文档在二元索引中的两字组文本，与文档写入在同一事务中执行
+
+    两字组在 Python 中生成，数据库触发器不依赖自定义函数；需在 flush 之后调用（文档已有id）
+    """
+    if not documents or "documents_bigram" not in await get_document_fts_tables(db):
+        return
+    rows = [document_bigram_row(doc.id, doc.title, doc.description, doc.content) for doc in documents]
+    await db.execute(text("DELETE FROM documents_bigram WHERE rowid = :id"), [{"id": row["id"]} for row in rows])
+    await db.execute(
+        text(
+            "INSERT INTO documents_bigram(rowid, title, description, content) "
+            "VALUES (:id, :title, :description, :content)"
+        ),
+        rows
+    )
+
+async def add_document_reference(db: AsyncSession, document: Document, title: str, tags: str):
+    """重复内容不再新建文档，只把本次的标题和标签记到已有文档上"""
+    extra_title = title if title and title != document.title else ""
+    tag_string = merge_tag_string(document.tag_string, tags, extra_title)
+    if tag_string != (document.tag_string or ""):
+        document.tag_string = tag_string
+        await db.commit()
+        await db.refresh(document)
+    logger.info(f"内容重复，复用已有文档 {document.id}: {title}")
+    return document
+
 async def create_document(
     db: AsyncSession, 
     title: str, 
@@ -51,21 +91,114 @@ async def create_document(
     content: str,
     tags: str,
     file_path: str,
-    file_type: str
+    file_type: str,
+    content_hash: Optional[str] = None
 ):
+    """
+    创建文档；指定 content_hash 且已有相同内容的文档时返回已有文档（upsert），
+    只把标题/标签合并进已有文档的 tag_string，不会重复解析和索引
+    """
+    if content_hash:
+        existing = await get_document_by_content_hash(db, content_hash)
+        if existing:
+            return await add_document_reference(db, existing, title, tags)
+
     db_document = Document(
         title=title,
         description=description,
         content=content,
         tag_string=tags,  # 使用新字段名
         file_path=file_path,
-        file_type=file_type
+        file_type=file_type,
+        content_hash=content_hash
     )
     db.add(db_document)
-    await db.commit()
+    try:
+        await db.flush()
+        await write_document_bigrams(db, [db_document])
+        await db.commit()
+    except IntegrityError:
+        # 并发上传相同内容时由唯一约束兜底
+        await db.rollback()
+        existing = await get_document_by_content_hash(db, content_hash) if content_hash else None
+        if existing is None:
+            raise
+        return await add_document_reference(db, existing, title, tags)
     await db.refresh(db_document)
     return db_document
 
+async def create_documents_bulk(db: AsyncSession, documents: List[Dict]) -> List[Document]:
+    """
+    在一个事务中批量创建文档（insert ... returning，SQLite下一次 executemany）
+
+    参数:
+        documents: 每项包含 title/description/content/tags/file_path/file_type/content_hash
+
+    返回:
+        与输入顺序一致的文档列表；content_hash 与已有文档或本批中前面的文档相同时，
+        返回已有文档并把标题/标签合并进其 tag_string（与 create_document 的 upsert 语义一致）
+    """
+    hashes = {doc["content_hash"] for doc in documents if doc.get("content_hash")}
+    existing: Dict[str, Document] = {}
+    if hashes:
+        result = await db.execute(select(Document).where(Document.content_hash.in_(hashes)))
+        existing = {doc.content_hash: doc for doc in result.scalars()}
+
+    rows = []
+    new_rows: Dict[str, Dict] = {}
+    # 每个输入对应的已有文档或待插入行，插入后据此按输入顺序返回
+    slots = []
+    for doc in documents:
+        content_hash = doc.get("content_hash")
+        title, tags = doc.get("title", ""), doc.get("tags", "")
+        if content_hash in existing:
+            target = existing[content_hash]
+            extra_title = title if title and title != target.title else ""
+            target.tag_string = merge_tag_string(target.tag_string, tags, extra_title)
+            slots.append(target)
+            continue
+        if content_hash in new_rows:
+            row = new_rows[content_hash]
+            extra_title = title if title and title != row["title"] else ""
+            row["tag_string"] = merge_tag_string(row["tag_string"], tags, extra_title)
+            slots.append(row)
+            continue
+        row = {
+            "title": title,
+            "description": doc.get("description", ""),
+            "content": doc.get("content", ""),
+            "tag_string": tags,
+            "file_path": doc.get("file_path"),
+            "file_type": doc.get("file_type"),
+            "content_hash": content_hash
+        }
+        rows.append(row)
+        slots.append(row)
+        if content_hash:
+            new_rows[content_hash] = row
+
+    created: List[Document] = []
+    try:
+        if rows:
+            result = await db.scalars(insert(Document).returning(Document, sort_by_parameter_order=True), rows)
+            created = list(result.all())
+            await write_document_bigrams(db, created)
+        await db.commit()
+    except IntegrityError:
+        # 并发写入了相同内容，整批回滚后逐条走 create_document 的 upsert 逻辑
+        await db.rollback()
+        logger.warning("批量创建文档时内容哈希冲突，改为逐条创建")
+        return [
+            await create_document(
+                db, doc.get("title", ""), doc.get("description", ""), doc.get("content", ""),
+                doc.get("tags", ""), doc.get("file_path"), doc.get("file_type"), doc.get("content_hash")
+            )
+            for doc in documents
+        ]
+
+    created_by_row = {id(row): doc for row, doc in zip(rows, created)}
+    return [created_by_row.get(id(slot), slot) for slot in slots]
+
 async def search_documents(db: AsyncSession, query: str, skip: int = 0, limit: int = 10):
     # 构建搜索条件，在三个字段中进行模糊搜索
     search_conditions = []
@@ -101,6 +234,12 @@ async def get_document_by_file_path(db: AsyncSession, file_path: str):
     result = await db.execute(stmt)
     return result.scalar_one_or_none()
 
+async def get_document_by_content_hash(db: AsyncSession, content_hash: str):
+    """通过文件内容哈希查询文档"""
+    stmt = select(Document).where(Document.content_hash == content_hash)
+    result = await db.execute(stmt)
+    return result.scalar_one_or_none()
+
 async def update_document(db: AsyncSession, doc_id: int, **kwargs):
     """
     优化点：
@@ -139,6 +278,11 @@ async def update_document(db: AsyncSession, doc_id: int, **kwargs):
             logger.info(f"文档 {doc_id} 无变更，无需更新")
             return document
 
+        if valid_kwargs.keys() & {"title", "description", "content"}:
+            # 触发器已在更新时删除旧的两字组，这里写入新文本的两字组
+            await db.flush()
+            await write_document_bigrams(db, [document])
+
         # 数据库事务提交
         await db.commit()
         await db.refresh(document)
@@ -203,12 +347,104 @@ async def mark_document_parsed(db: AsyncSession, doc_id: int):
 
 
 
+DOCUMENT_FTS_TABLE_NAMES = {"documents_fts", "documents_bigram"}
+# 已存在的全文索引表；全部建好后每个进程只检查一次，未建好（create_document_fts 之前）时每次重新检查
+_document_fts_tables: Optional[set] = None
+
+async def get_document_fts_tables(db: AsyncSession) -> set:
+    global _document_fts_tables
+    if _document_fts_tables is not None:
+        return _document_fts_tables
+    if db.bind.dialect.name != "sqlite":
+        _document_fts_tables = set()
+        return _document_fts_tables
+    result = await db.execute(
+        text(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name IN ('documents_fts', 'documents_bigram')"
+        )
+    )
+    tables = {row[0] for row in result}
+    if tables == DOCUMENT_FTS_TABLE_NAMES:
+        _document_fts_tables = tables
+    return tables
+
+def quote_fts_phrase(phrase: str) -> str:
+    return '"' + phrase.replace('"', '""') + '"'
+
+def build_fts_match(query: str) -> Optional[str]:
+    """
+    将用户输入转换为 trigram 索引的 MATCH 表达式，各词按短语匹配并取交集
+
+    trigram 分词要求每个词至少3个字符，更短的词返回None
+    """
+    terms = query.split()
+    if not terms or any(len(term) < 3 for term in terms):
+        return None
+    return " AND ".join(quote_fts_phrase(term) for term in terms)
+
+def build_bigram_match(query: str) -> Optional[str]:
+    """
+    将用户输入转换为二元索引 documents_bigram 的 MATCH 表达式：每个词切成相邻两字组，
+    按短语（相邻两字组依次出现）匹配，等价于子串匹配
+
+    含单个字符的词（单字无法用两字组表示）返回None
+    """
+    terms = query.split()
+    if not terms:
+        return None
+    phrases = []
+    for term in terms:
+        runs = WORD_RUN_PATTERN.findall(term)
+        if not runs or any(len(run) < 2 for run in runs):
+            return None
+        phrases.extend(quote_fts_phrase(cjk_bigrams(run)) for run in runs)
+    return " AND ".join(phrases)
+
+async def search_documents_fts(
+    db: AsyncSession, match: str, offset: int, limit: int, table: str = "documents_fts"
+) -> schemas.PaginationResult:
+    """通过全文索引检索，按 bm25 相关度排序（标题权重最高）"""
+    result = await db.execute(
+        text(f"SELECT count(*) FROM {table} WHERE {table} MATCH :match"),
+        {"match": match}
+    )
+    total = result.scalar()
+
+    result = await db.execute(
+        text(
+            f"SELECT rowid FROM {table} WHERE {table} MATCH :match "
+            f"ORDER BY bm25({table}, 10.0, 3.0, 1.0) LIMIT :limit OFFSET :offset"
+        ),
+        {"match": match, "limit": limit, "offset": offset}
+    )
+    ids = [row[0] for row in result]
+    if not ids:
+        return schemas.PaginationResult(total=total, items=[])
+
+    result = await db.execute(select(Document).where(Document.id.in_(ids)))
+    documents = {doc.id: doc for doc in result.scalars().all()}
+    items = [documents[doc_id] for doc_id in ids if doc_id in documents]
+    return schemas.PaginationResult(total=total, items=items)
+
 async def search_documents_with_pagination(
     db: AsyncSession, 
     query: str, 
     offset: int, 
     limit: int
 ) -> schemas.PaginationResult:
+    # 优先走全文索引：各词都不少于3个字符时用 trigram 索引，含两个字的词时用二元索引；
+    # 含单字的词或没有全文索引时退回模糊匹配
+    if query:
+        fts_tables = await get_document_fts_tables(db)
+        match = build_fts_match(query)
+        if match and "documents_fts" in fts_tables:
+            return await search_documents_fts(db, match, offset, limit)
+        match = build_bigram_match(query)
+        if match and "documents_bigram" in fts_tables:
+            return await search_documents_fts(db, match, offset, limit, table="documents_bigram")
+        logger.debug(f"搜索词无法使用全文索引，退回模糊匹配: {query}")
+
     # 构建搜索条件
     search_conditions = []
     if query:
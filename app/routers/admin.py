@@ -5,8 +5,10 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 from app import base_crud, dbmodels, schemas
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.routers.auth import get_current_active_user
+from app.utils.cache_utils import create_cache
+from config import HOMEPAGE_CACHE_TTL
 from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter()
@@ -18,44 +20,53 @@ async def get_current_admin_user(current_user: dbmodels.User = Depends(get_curre
     return current_user
 
 
+# 首页统计数据缓存，短时间内的重复访问不再查库
+homepage_cache = create_cache("homepage", maxsize=1, ttl=HOMEPAGE_CACHE_TTL)
+
 # 新接口：返回首页所需数据
 @router.get("/homepage-data", response_model=schemas.HomepageData)
 async def get_homepage_data(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
 ):
+    cached = await homepage_cache.get("data")
+    if cached is not None:
+        return cached
+
+    data = await compute_homepage_data(db)
+    await homepage_cache.set("data", data)
+    return data
+
+async def compute_homepage_data(db: AsyncSession) -> dict:
+    """查询首页统计数据（用户总数、近30天每日签到人数）"""
     # 获取总用户数
     stmt_total_users = select(func.count()).select_from(dbmodels.User)
     result_total_users = await db.execute(stmt_total_users)
     total_users = result_total_users.scalar()
 
-    # 获取今日签到人数，去重处理
+    # 最近30天每日签到人数（去重），一次 GROUP BY 查询完成，依赖 timestamp 索引做范围扫描
     today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    tomorrow = today + timedelta(days=1)
-    stmt_today_attendance = select(func.count(func.distinct(dbmodels.AttendanceRecord.user_id))).select_from(dbmodels.AttendanceRecord).where(
-        dbmodels.AttendanceRecord.timestamp >= today,
-        dbmodels.AttendanceRecord.timestamp < tomorrow
-    )
-    result_today_attendance = await db.execute(stmt_today_attendance)
-    today_attendance = result_today_attendance.scalar()
-
-    # 计算签到率
-    attendance_rate = (today_attendance / total_users) * 100 if total_users > 0 else 0
+    start_date = today - timedelta(days=29)
+    day = func.date(dbmodels.AttendanceRecord.timestamp).label("day")
+    stmt_daily_attendance = select(
+        day, func.count(func.distinct(dbmodels.AttendanceRecord.user_id))
+    ).where(
+        dbmodels.AttendanceRecord.timestamp >= start_date
+    ).group_by(day)
+    result_daily_attendance = await db.execute(stmt_daily_attendance)
+    daily_counts = {str(row[0])[:10]: row[1] for row in result_daily_attendance}
 
-    # 获取最近一个月的签到人数，去重处理
-    one_month_ago = datetime.now() - timedelta(days=29)
     dates = []
     counts = []
     for i in range(30):
-        current_date = one_month_ago + timedelta(days=i)
-        next_date = current_date + timedelta(days=1)
-        stmt_daily_attendance = select(func.count(func.distinct(dbmodels.AttendanceRecord.user_id))).select_from(dbmodels.AttendanceRecord).where(
-            dbmodels.AttendanceRecord.timestamp >= current_date,
-            dbmodels.AttendanceRecord.timestamp < next_date
-        )
-        result_daily_attendance = await db.execute(stmt_daily_attendance)
-        daily_attendance = result_daily_attendance.scalar()
+        current_date = start_date + timedelta(days=i)
         dates.append(f"{current_date.month}/{current_date.day}")
-        counts.append(daily_attendance)
+        counts.append(daily_counts.get(current_date.strftime("%Y-%m-%d"), 0))
+
+    # 今日签到人数即最后一天的统计
+    today_attendance = counts[-1]
+
+    # 计算签到率
+    attendance_rate = (today_attendance / total_users) * 100 if total_users > 0 else 0
 
     return {
         "total_users": total_users,
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 import jwt
-from sqlalchemy.orm import Session
+import logging
+from sqlalchemy import DateTime
+from sqlalchemy.orm import Session, make_transient_to_detached
 from datetime import datetime, timedelta
 from typing import Optional
 from app import base_crud, dbmodels, schemas
 from app.database import get_db
-from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.utils.cache_utils import create_cache
+from config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL
 from fastapi.security import OAuth2PasswordBearer
 from app.database import AsyncSessionLocal, get_db
 import config
@@ -14,6 +17,50 @@ import config
 router = APIRouter()
 # 定义 oauth2_scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
+logger = logging.getLogger(__name__)
+
+# 已认证用户缓存：用户名 -> 用户列快照（不含人脸编码，读取见 restore_user），命中时认证不再查库
+principal_cache = create_cache("principal", maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+PRINCIPAL_EXCLUDED_COLUMNS = {"face_encoding"}
+
+def snapshot_user(user: dbmodels.User) -> dict:
+    """提取用户的列值快照（时间转为ISO字符串，便于存入Redis）"""
+    snapshot = {}
+    for column in dbmodels.User.__table__.columns:
+        if column.key in PRINCIPAL_EXCLUDED_COLUMNS:
+            continue
+        value = getattr(user, column.key)
+        snapshot[column.key] = value.isoformat() if isinstance(value, datetime) else value
+    return snapshot
+
+async def restore_user(db, snapshot: dict) -> dbmodels.User:
+    """
+    由快照重建用户并挂到当前会话（merge load=False 不查库）
+
+    未缓存的列（PRINCIPAL_EXCLUDED_COLUMNS）不在对象上，异步会话中直接访问会抛出 MissingGreenlet，
+    需要时用 await user.awaitable_attrs.face_encoding 读取；赋值、提交不受影响
+    """
+    values = {}
+    for column in dbmodels.User.__table__.columns:
+        if column.key not in snapshot:
+            continue
+        value = snapshot[column.key]
+        if isinstance(column.type, DateTime) and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        values[column.key] = value
+    user = dbmodels.User(**values)
+    make_transient_to_detached(user)
+    return await db.merge(user, load=False)
+
+async def invalidate_principal(*usernames: Optional[str]):
+    """用户信息变更、删除或启用状态变化后调用，使缓存的认证信息失效"""
+    for username in usernames:
+        if not username:
+            continue
+        try:
+            await principal_cache.delete(username)
+        except Exception as e:
+            logger.warning(f"清除用户缓存 {username} 失败: {str(e)}")
 
 # 模拟验证密码
 def verify_password(plain_password, hashed_password):
@@ -64,10 +111,22 @@ async def get_current_user(
     except jwt.PyJWTError:
         raise credentials_exception
     
+    try:
+        snapshot = await principal_cache.get(token_data.username)
+    except Exception as e:
+        logger.warning(f"读取用户缓存失败: {str(e)}")
+        snapshot = None
+    if snapshot is not None:
+        return await restore_user(db, snapshot)
+
     # 这里添加 await 关键字
     current_user = await base_crud.get_user_by_username(db, username=token_data.username)
     if current_user is None:
         raise credentials_exception
+    try:
+        await principal_cache.set(token_data.username, snapshot_user(current_user))
+    except Exception as e:
+        logger.warning(f"写入用户缓存失败: {str(e)}")
     return current_user
 
 async def get_current_active_user(
@@ -1,17 +1,28 @@
 # routers/document.py
-from typing import List
+from typing import List, Optional
 from fastapi import APIRouter, Depends, Request, UploadFile, File, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
 from app import doc_crud, schemas
-from app.database import get_db
-from app.utils.es_utils import enhanced_search
+from app.database import get_db, get_read_db
+from app.utils.es_utils import async_cursor_search, async_enhanced_search, SEARCH_GENERATION
+from app.utils.cache_utils import create_cache, get_generation
+from app.utils.parse_progress import get_parse_progress
+from app.utils.utils import check_upload_size, save_upload_stream
+from config import UPLOAD_FOLDER, ES_INDEX_LAYOUT, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
 from pydantic import BaseModel
 from datetime import datetime
+import asyncio
 import hashlib
+import json
+import logging
 import os
 import uuid
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# 搜索结果缓存（高频查询如 洪涝、干旱 直接命中）
+search_cache = create_cache("search", maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
 
 # 索引名称
 INDEX_NAME = "pdf_fragments"
@@ -28,43 +39,30 @@ async def upload_batch_documents(
     files: list[UploadFile] = File(...),
     db: AsyncSession = Depends(get_db)
 ):
-    uploaded_documents = []
+    # 先按已知大小整体校验，避免批次中途因超限失败
     for file in files:
-        # 读取文件内容
-        file_content = await file.read()
+        check_upload_size(file)
 
-        # 计算文件内容的哈希值
-        file_hash = hashlib.sha256(file_content).hexdigest()
+    new_documents = []
+    for file in files:
+        # 分块写入临时文件并计算哈希，完成后原子重命名到上传目录
+        file_path, file_hash, _ = await save_upload_stream(file, UPLOAD_FOLDER)
 
         # 获取文件扩展名
         file_ext = os.path.splitext(file.filename)[1]
 
-        # 构造新的文件名
-        file_name = f"{file_hash}{file_ext}"
-        # 确保上传目录存在
-        upload_dir = "static/documents"
-        os.makedirs(upload_dir, exist_ok=True)
-        # 构建新的文件路径
-        file_path = os.path.join(upload_dir, file_name)
-
-        # 保存文件
-        with open(file_path, "wb") as f:
-            f.write(file_content)
-
-        content = f"文件内容提取占位符: {file.filename}"
-
-        document = await doc_crud.create_document(
-            db,
-            title=file.filename,
-            description="",
-            content=content,
-            tags="",
-            file_path=file_path,
-            file_type=file_ext[1:]
-        )
-        uploaded_documents.append(document)
+        new_documents.append({
+            "title": file.filename,
+            "description": "",
+            "content": f"文件内容提取占位符: {file.filename}",
+            "tags": "",
+            "file_path": file_path,
+            "file_type": file_ext[1:],
+            "content_hash": file_hash
+        })
 
-    return uploaded_documents
+    # 整批在一个事务中写入
+    return await doc_crud.create_documents_bulk(db, new_documents)
 
 # 定义搜索请求模型
 class SearchQuery(BaseModel):
@@ -72,6 +70,8 @@ class SearchQuery(BaseModel):
     page_size: int = 10
     page_number: int = 1
     search_in: List[str] = ["fragments.content", "document.content"]  # 指定搜索范围
+    use_cursor: bool = False  # 使用游标分页（深分页/导出全部结果）
+    cursor: Optional[str] = None  # 上一页返回的 next_cursor
 
 @router.get("/documents/{document_id}")
 async def get_document_detail(document_id: int, db: AsyncSession = Depends(get_db), request: Request = None):
@@ -110,59 +110,158 @@ async def get_document_detail(document_id: int, db: AsyncSession = Depends(get_d
 async def recreate_es_index():
     from app.utils.es_utils import create_index
     try:
-        create_index(force_recreate=True)
+        await asyncio.to_thread(create_index, force_recreate=True)
         return {"message": "ES索引重建成功"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"索引重建失败: {str(e)}")
 
+@router.post("/validate_es_schema")
+async def validate_es_schema():
+    """重新校验ES索引映射（映射变更后由管理员触发）"""
+    from app.utils.es_utils import validate_index_schema, MAPPING_VERSION
+    try:
+        await asyncio.to_thread(validate_index_schema, force=True)
+        return {"message": "ES索引映射校验完成", "mapping_version": MAPPING_VERSION}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"索引映射校验失败: {str(e)}")
+
+@router.get("/parse_progress")
+async def parse_progress():
+    """所有正在解析（及最近解析完成）文档的 MinerU 进度与吞吐"""
+    try:
+        documents = await get_parse_progress()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"解析进度不可用: {str(e)}")
+    parsing = [doc for doc in documents if doc["status"] == "parsing"]
+    return {
+        "documents": documents,
+        "parsing": len(parsing),
+        "pages_per_sec": round(sum(doc["pages_per_sec"] for doc in parsing), 3)
+    }
+
+@router.get("/parse_progress/{document_id}")
+async def parse_progress_detail(document_id: int):
+    """单个文档的解析进度（含各分片）"""
+    try:
+        documents = await get_parse_progress(str(document_id))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"解析进度不可用: {str(e)}")
+    if not documents:
+        raise HTTPException(status_code=404, detail="没有该文档的解析进度")
+    return documents[0]
+
+def process_search_results(results):
+    """将ES搜索结果整理为接口返回结构"""
+    hits = results['hits']['hits']
+    processed_results = []
+    
+    for hit in hits:
+        source = hit['_source']
+        highlight = hit.get('highlight', {})
+        
+        # 文档高亮
+        doc_highlight = highlight.get('document.content', [])
+        
+        # 片段高亮
+        matched_fragments = []
+        if 'inner_hits' in hit and 'fragments' in hit['inner_hits']:
+            for frag_hit in hit['inner_hits']['fragments']['hits']['hits']:
+                frag_source = frag_hit['_source']
+                frag_highlight = frag_hit.get('highlight', {})
+                frag_content = frag_highlight.get('fragments.content', [frag_source['content']])[0]
+                
+                matched_fragments.append({
+                    "content": frag_source['content'],
+                    "page_idx": frag_source['page_idx'],
+                    "bbox": frag_source['bbox'],
+                    "spans": frag_source.get('spans', []),
+                    "highlight": frag_content
+                })
+        
+        processed_results.append({
+            "document_id": source['document_id'],
+            "document_title": source['document']['title'],
+            "document_highlight": doc_highlight[0] if doc_highlight else source['document']['content'][:200] + "...",
+            "matched_fragments": matched_fragments,
+            "score": hit['_score']
+        })
+    
+    return {
+        "total": results['hits']['total']['value'],
+        "results": processed_results
+    }
+
+
+def build_search_cache_key(query, search_in, page_size, page_number, document_id, generation):
+    """缓存键：规范化后的查询词 + 搜索范围 + 分页 + 索引代数"""
+    normalized_query = " ".join(query.split()).lower()
+    payload = json.dumps(
+        [normalized_query, sorted(search_in), page_size, page_number, document_id, ES_INDEX_LAYOUT, generation],
+        ensure_ascii=False
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+async def cached_search(query, search_in, page_size, page_number, document_id=None):
+    """带结果缓存的ES搜索，索引代数变化（文档写入/删除）后旧缓存自动失效"""
+    try:
+        generation = await get_generation(SEARCH_GENERATION)
+        cache_key = build_search_cache_key(query, search_in, page_size, page_number, document_id, generation)
+        cached = await search_cache.get(cache_key)
+    except Exception as e:
+        logger.warning(f"读取搜索缓存失败: {str(e)}")
+        cache_key, cached = None, None
+    if cached is not None:
+        return cached
+
+    results = await async_enhanced_search(
+        query=query,
+        search_in=search_in,
+        page_size=page_size,
+        page_number=page_number,
+        document_id=document_id
+    )
+    processed = process_search_results(results)
+
+    # ES出错时返回的空结果不缓存
+    if cache_key and "error" not in results:
+        try:
+            await search_cache.set(cache_key, processed)
+        except Exception as e:
+            logger.warning(f"写入搜索缓存失败: {str(e)}")
+    return processed
+
+
+async def cursor_search(query, search_in, page_size, cursor=None, document_id=None):
+    """游标分页搜索，point-in-time 结果随会话变化，不走缓存"""
+    try:
+        results, next_cursor = await async_cursor_search(
+            query=query,
+            search_in=search_in,
+            page_size=page_size,
+            cursor=cursor,
+            document_id=document_id
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    processed = process_search_results(results)
+    processed["next_cursor"] = next_cursor
+    return processed
+
+
 @router.post("/es_search_related")
-def es_search_related(query: SearchQuery):
+async def es_search_related(query: SearchQuery):
     try:
-        results = enhanced_search(
+        if query.use_cursor or query.cursor:
+            return await cursor_search(query.query, query.search_in, query.page_size, query.cursor)
+        return await cached_search(
             query=query.query,
             search_in=query.search_in,
             page_size=query.page_size,
             page_number=query.page_number
         )
-        
-        hits = results['hits']['hits']
-        processed_results = []
-        
-        for hit in hits:
-            source = hit['_source']
-            highlight = hit.get('highlight', {})
-            
-            # 文档高亮
-            doc_highlight = highlight.get('document.content', [])
-            
-            # 片段高亮
-            matched_fragments = []
-            if 'inner_hits' in hit and 'fragments' in hit['inner_hits']:
-                for frag_hit in hit['inner_hits']['fragments']['hits']['hits']:
-                    frag_source = frag_hit['_source']
-                    frag_highlight = frag_hit.get('highlight', {})
-                    frag_content = frag_highlight.get('fragments.content', [frag_source['content']])[0]
-                    
-                    matched_fragments.append({
-                        "content": frag_source['content'],
-                        "page_idx": frag_source['page_idx'],
-                        "bbox": frag_source['bbox'],
-                        "highlight": frag_content
-                    })
-            
-            processed_results.append({
-                "document_id": source['document_id'],
-                "document_title": source['document']['title'],
-                "document_highlight": doc_highlight[0] if doc_highlight else source['document']['content'][:200] + "...",
-                "matched_fragments": matched_fragments,
-                "score": hit['_score']
-            })
-        
-        return {
-            "total": results['hits']['total']['value'],
-            "results": processed_results
-        }
-    
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"搜索处理错误: {str(e)}")
     
@@ -175,63 +274,32 @@ class DocumentSearchQuery(BaseModel):
     page_size: int = 10
     page_number: int = 1
     search_in: List[str] = ["fragments.content", "document.content"]  # 指定搜索范围
+    use_cursor: bool = False  # 使用游标分页（深分页/导出全部结果）
+    cursor: Optional[str] = None  # 上一页返回的 next_cursor
 
 @router.post("/es_search_document")
 async def es_search_document(query: DocumentSearchQuery):
     """在指定文档内进行ES搜索"""
     try:
-        # 调用增强搜索函数，传入文档ID过滤条件
-        results = enhanced_search(
+        # 传入文档ID过滤条件
+        if query.use_cursor or query.cursor:
+            return await cursor_search(
+                query.query, query.search_in, query.page_size, query.cursor, query.document_id
+            )
+        return await cached_search(
             query=query.query,
             search_in=query.search_in,
             page_size=query.page_size,
             page_number=query.page_number,
-            document_id=query.document_id  # 新增文档ID参数
+            document_id=query.document_id
         )
-        
-        hits = results['hits']['hits']
-        processed_results = []
-        
-        for hit in hits:
-            source = hit['_source']
-            highlight = hit.get('highlight', {})
-            
-            # 文档高亮
-            doc_highlight = highlight.get('document.content', [])
-            
-            # 片段高亮
-            matched_fragments = []
-            if 'inner_hits' in hit and 'fragments' in hit['inner_hits']:
-                for frag_hit in hit['inner_hits']['fragments']['hits']['hits']:
-                    frag_source = frag_hit['_source']
-                    frag_highlight = frag_hit.get('highlight', {})
-                    frag_content = frag_highlight.get('fragments.content', [frag_source['content']])[0]
-                    
-                    matched_fragments.append({
-                        "content": frag_source['content'],
-                        "page_idx": frag_source['page_idx'],
-                        "bbox": frag_source['bbox'],
-                        "highlight": frag_content
-                    })
-            
-            processed_results.append({
-                "document_id": source['document_id'],
-                "document_title": source['document']['title'],
-                "document_highlight": doc_highlight[0] if doc_highlight else source['document']['content'][:200] + "...",
-                "matched_fragments": matched_fragments,
-                "score": hit['_score']
-            })
-        
-        return {
-            "total": results['hits']['total']['value'],
-            "results": processed_results
-        }
-    
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"文档内搜索错误: {str(e)}")
     
 @router.get("/default_search")
-async def search_documents(query: str = "", db: AsyncSession = Depends(get_db), page_size: int = 10, page_number: int = 1):
+async def search_documents(query: str = "", db: AsyncSession = Depends(get_read_db), page_size: int = 10, page_number: int = 1):
     # 计算偏移量
     offset = (page_number - 1) * page_size
     # 执行搜索并获取分页结果
@@ -1,6 +1,6 @@
 import logging
 from app.utils import utils
-from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status, Cookie, Response
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status, Cookie, Response, Request
 from sqlalchemy import func, select
 from app import base_crud, dbmodels, schemas
 from app.dbmodels import User
@@ -12,7 +12,6 @@ from app.database import AsyncSessionLocal, get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Response, Cookie
 from sqlalchemy.orm import Session
-from docxtpl import DocxTemplate
 
 import tempfile
 import string
@@ -22,6 +21,8 @@ import io
 import os
 from fastapi.responses import FileResponse
 from pathlib import Path
+from app.utils.report_engine import OUTPUT_DIR, generate_report, report_etag
+from app.utils.report_jobs import get_report_job, job_zip_path, submit_report_job
 
 router = APIRouter()
 
@@ -36,73 +37,93 @@ class PingGuBase(BaseModel):
     disasterType: str="FLOOD"
     selectAll: bool = False
 
+
+class BatchPingGuBase(PingGuBase):
+    # 为空时使用 disasterType
+    disasterTypes: Optional[List[str]] = None
+
 # 文件服务器路由 - 用于下载生成的文件
 @router.get("/download/{filename}")
-async def download_file(filename: str):
-    file_path = Path("static/output/zqpg") / filename
+async def download_file(filename: str, request: Request):
+    file_path = Path(OUTPUT_DIR) / filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="文件不存在")
-    return FileResponse(file_path, filename=filename)
+    # 报告内容由文件名中的缓存键唯一确定，客户端已有相同版本时返回304
+    etag = report_etag(filename)
+    if etag and request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    headers = {"ETag": etag} if etag else None
+    return FileResponse(file_path, filename=filename, headers=headers)
 
 
 @router.post("/makeword")
-async def makezqpgword(pinggu: PingGuBase):
+async def makezqpgword(pinggu: PingGuBase, response: Response):
     """
     根据template.json参数填充Word模板并生成新文件
     返回新生成Word文件的HTTP下载URL
+
+    相同模板版本、灾情类型、时间范围、地区和数据的报告只渲染一次，渲染在进程池中进行
     """
     print("request:", pinggu)
-    json_path = "static/template.json"
 
     try:
-        # 解析JSON参数
-        with open(json_path, 'r', encoding='utf-8') as f:
-            params = json.load(f)['data']
-        if pinggu.disasterType == "FLOOD":
-            from app.utils import kg_flood
-            template_path = "static/FLOOD_TEMPLETE.docx"
-            doc = DocxTemplate(template_path)
-            params['startdate'] = params['startDate']
-            params['enddate'] = params['endDate']
-            params['publicdate'] = datetime.now().strftime('%Y年%m月%d日')
-            params['zqzs'] = kg_flood.get_zhgk(params)
-            params['slgcssssqk'] = kg_flood.get_slgcssssqk(params)
-            params['zdslgcsgqk'] = kg_flood.get_zdslgcsgqk(params)
-            params['czsyqk'] = kg_flood.get_czsyqk(params)
-            params['khqxjszcqk'] = kg_flood.get_khqxjszcqk(params)
-            params['shzhfyqk'] = kg_flood.get_shzhfyqk(params)
-            params['zdszdqfx'] = kg_flood.get_zdszdqfx(params)
-        elif pinggu.disasterType == "DROUGHT":
-            from app.utils import kg_drought
-            # 灾情类型，枚举值：FLOOD（洪涝灾害）、DROUGHT（干旱灾害）
-            template_path = "static/DROUGHT_TEMPLETE.docx"
-            doc = DocxTemplate(template_path)
-            params['startdate'] = params['startDate']
-            params['enddate'] = params['endDate']
-            params['publicdate'] = datetime.now().strftime('%Y年%m月%d日')
-            params['zqzs'] = kg_drought.get_zqzs(params)
-            params['dqnyhqzk'] = kg_drought.get_dqnyhqzk(params)
-            params['slgcxssyzk'] = kg_drought.get_slgcxssyzk(params)
-            params['khtrzzqk'] = kg_drought.get_khtrzzqk(params)
-            params['khcxjzxy'] = kg_drought.get_khcxjzxy(params)
-            params['zdshdqqk'] = kg_drought.get_zdshdqqk(params)
-        # 渲染模板
-        doc.render(params)
-        # 确保输出目录存在
-        output_dirpath = "static/output/zqpg"
-        output_dir = Path(output_dirpath)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        filename = f"灾情评估报告_{params['startdate']}_{params['enddate']}.docx"
-        file_path = output_dir / filename
-        
-        # 保存新文件
-        doc.save(str(file_path))
-        download_url = f"{output_dirpath}/{filename}"
-        return {"message": "文件生成成功", "download_url": download_url}
-    
+        file_path, etag, cached = await generate_report(
+            pinggu.disasterType, pinggu.startdate, pinggu.enddate, pinggu.regions
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"文件生成失败：{str(e)}"
-        )
\ No newline at end of file
+        )
+    response.headers["ETag"] = etag
+    download_url = f"{OUTPUT_DIR}/{os.path.basename(file_path)}"
+    return {"message": "文件生成成功", "download_url": download_url, "cached": cached}
+
+
+@router.post("/makeword_batch", status_code=202)
+async def make_batch_word(pinggu: BatchPingGuBase):
+    """
+    批量生成灾情评估报告：每个地区 × 灾情类型一份，selectAll 为真时生成榆林市全部县（市、区）
+
+    立即返回任务ID，通过 /report_jobs/{job_id} 查询进度，完成后从 download_url 下载全部报告的zip
+    """
+    try:
+        job = await submit_report_job(
+            pinggu.disasterTypes or [pinggu.disasterType],
+            pinggu.startdate, pinggu.enddate, pinggu.regions, pinggu.selectAll
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "total": job["total"],
+        "status_url": f"/api/kgapi/report_jobs/{job['job_id']}"
+    }
+
+
+@router.get("/report_jobs/{job_id}")
+async def report_job_status(job_id: str):
+    job = await get_report_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return job
+
+
+@router.get("/report_jobs/{job_id}/download")
+async def download_report_job(job_id: str):
+    job = await get_report_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"任务尚未完成: {job['status']}")
+    zip_path = job_zip_path(job_id)
+    if not os.path.exists(zip_path):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    return FileResponse(
+        zip_path,
+        media_type="application/zip",
+        filename=f"灾情评估报告_{job['period']}.zip"
+    )
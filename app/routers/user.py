@@ -8,22 +8,22 @@ from app.dbmodels import User
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from typing import List, Optional
-from PIL import Image, ImageDraw, ImageFont, ImageFilter
 from app.database import AsyncSessionLocal, get_db
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import APIRouter, Response, Cookie
 from sqlalchemy.orm import Session
 import tempfile
 import hashlib
-import string
 import secrets
 import jwt
-import io
 
-from app.routers.auth import get_current_active_user
+from app.routers.auth import get_current_active_user, invalidate_principal
+from app.utils.cache_utils import create_cache
+from app.utils.captcha import captcha_pool
+from config import CAPTCHA_TTL, CAPTCHA_CACHE_SIZE
 
-# 示例缓存（生产环境请替换为Redis等持久化缓存）
-cache = {}
+# 验证码存储：过期自动清除、条目数有上限；CACHE_BACKEND=redis 时多个worker共享
+captcha_cache = create_cache("captcha", maxsize=CAPTCHA_CACHE_SIZE, ttl=CAPTCHA_TTL)
 
 # 新增Pydantic模型
 class UserBase(BaseModel):
@@ -60,46 +60,6 @@ ALGORITHM = "HS256"
 router = APIRouter()
 
 
-def generate_captcha_text(length=4):
-    chars = string.ascii_uppercase + string.digits
-    return ''.join(secrets.choice(chars) for _ in range(length))
-
-
-def create_captcha_image(text):
-    width, height = 160, 60
-    image = Image.new('RGB', (width, height), (255, 255, 255))
-    try:
-        font = ImageFont.truetype('arial.ttf', 36)
-    except IOError:
-        font = ImageFont.load_default()  # 回退到默认字体
-    draw = ImageDraw.Draw(image)
-    
-    # 随机字符位置和扭曲
-    for i, char in enumerate(text):
-        x = 10 + i * 30 + secrets.randbelow(10)
-        y = 5 + secrets.randbelow(15)
-        angle = secrets.randbelow(30) - 15
-        rotated_char = Image.new('RGBA', (50, 50), (255, 255, 255, 0))
-        char_draw = ImageDraw.Draw(rotated_char)
-        char_draw.text((0, 0), char, font=font, fill=(0, 0, 0))
-        rotated_char = rotated_char.rotate(angle, expand=1)
-        image.paste(rotated_char, (x, y), rotated_char)
-    
-    # 添加干扰线和噪点
-    for _ in range(5):
-        x1 = secrets.randbelow(width)
-        y1 = secrets.randbelow(height)
-        x2 = secrets.randbelow(width)
-        y2 = secrets.randbelow(height)
-        draw.line([(x1, y1), (x2, y2)], fill=(secrets.randbelow(200), secrets.randbelow(200), secrets.randbelow(200)), width=1)
-    for _ in range(100):
-        x = secrets.randbelow(width)
-        y = secrets.randbelow(height)
-        draw.point((x, y), fill=(secrets.randbelow(255), secrets.randbelow(255), secrets.randbelow(255)))
-    
-    image = image.filter(ImageFilter.SMOOTH)
-    return image
-
 @router.post("/upload-avatar")
 async def upload_avatar(
     file: UploadFile = File(...),
@@ -122,44 +82,44 @@ async def upload_avatar(
     db.add(current_user)
     await db.commit()
     await db.refresh(current_user)
+    await invalidate_principal(current_user.username)
     return {"message": "头像上传成功", "photo_filename": photo_filename, "photo_path": photo_path}
 
 @router.get("/captcha")
 async def get_captcha(response: Response):
-    captcha_text = generate_captcha_text()
+    # 从预渲染池中取出验证码图片，不在事件循环中渲染
+    captcha_text, image_bytes = await captcha_pool.get()
     captcha_key = secrets.token_urlsafe(16)  # 生成唯一键
     
-    # 存储验证码（示例使用内存缓存，生产需用Redis等）
-    cache[captcha_key] = captcha_text
-    # 将键通过Cookie返回客户端
-    response.set_cookie(key="captcha_key", value=captcha_key, max_age=300, httponly=True)
-    
-    # 生成图片
-    image = create_captcha_image(captcha_text)
-    byte_stream = io.BytesIO()
-    image.save(byte_stream, format="PNG")
-    byte_stream.seek(0)
+    # 存储验证码，到期自动失效
+    await captcha_cache.set(captcha_key, captcha_text)
     
-    resp = Response(content=byte_stream.getvalue(), media_type="image/png")
+    resp = Response(content=image_bytes, media_type="image/png")
+    # 将键通过Cookie返回客户端
     resp.set_cookie(
         key="captcha_key", 
         value=captcha_key, 
         httponly=True,
-        max_age=300,  # 5 分钟
+        max_age=CAPTCHA_TTL,  # 与验证码有效期一致
         path="/"
     )
     return resp
 
 
+@router.get("/captcha/stats")
+async def get_captcha_stats():
+    """验证码预渲染池命中率与补充耗时"""
+    return captcha_pool.stats()
+
+
 @router.post("/verify")
 async def verify_captcha(user_input: str, captcha_key: Optional[str] = Cookie(None)):
     if not captcha_key:
         return {"status": "error", "message": "Missing captcha key"}
-    stored_text = cache.get(captcha_key)
+    # 取出即删除，每个验证码只能验证一次
+    stored_text = await captcha_cache.pop(captcha_key)
     if not stored_text:
         return {"status": "error", "message": "Invalid or expired captcha"}
-    # 验证后删除缓存
-    del cache[captcha_key]
     if user_input.upper() == stored_text:
         return {"status": "success"}
     else:
@@ -177,7 +137,8 @@ async def register(user: UserReister,
     if not captcha_key:
         return {"success":False, "message": "验证码已过期或未生成"}
     
-    stored_text = cache.get(captcha_key)
+    # 取出即删除，防止重复使用（输错也需重新获取验证码）
+    stored_text = await captcha_cache.pop(captcha_key)
     
     if not stored_text:
         return {"success":False, "message": "验证码已过期或无效"}
@@ -185,9 +146,6 @@ async def register(user: UserReister,
     if stored_text != user.captcha:
         return {"success":False, "message": "验证码输入错误"}
     
-    # 验证后立即删除缓存，防止重复使用
-    del cache[captcha_key]
-    
     # 检查用户名是否已存在
     existing_user = await db.execute(select(User).where(User.username == user.username))
     existing_user = existing_user.scalar_one_or_none()
@@ -316,6 +274,7 @@ async def update_user(
     db_user = await db.get(User, user_id)
     if not db_user:
         raise HTTPException(status_code=404, detail="用户不存在")
+    old_username = db_user.username
     
     if user.username:
         db_user.username = user.username
@@ -336,6 +295,7 @@ async def update_user(
         db_user.hashed_password = hashlib.sha256(user.password.encode()).hexdigest()
     
     await db.commit()
+    await invalidate_principal(old_username, db_user.username)
     return {"data": db_user, "success": True, "code": 200}
 
 
@@ -347,6 +307,7 @@ async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
     
     await db.delete(user)
     await db.commit()
+    await invalidate_principal(user.username)
     return {"message": "用户删除成功"}
 
 
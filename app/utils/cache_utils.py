@@ -0,0 +1,259 @@
+# cache_utils.py
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_DB, CACHE_BACKEND
+
+try:
+    import redis
+    import redis.asyncio as aioredis
+except ImportError:  # 未安装redis时只能使用内存缓存
+    redis = None
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """进程内LRU缓存，条目带过期时间，超过容量时淘汰最久未使用的条目"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (ttl if ttl is not None else self.ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.pop(key, None)
+        if item is None or item[1] < time.monotonic():
+            return default
+        return item[0]
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def items(self, prefix: str = "") -> List[Tuple[str, Any]]:
+        """返回未过期的条目（按键前缀过滤）"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                (key, value) for key, (value, expires_at) in self._data.items()
+                if expires_at >= now and key.startswith(prefix)
+            ]
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MemoryCache:
+    """TTLCache 的异步包装，接口与 RedisCache 一致"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.store = TTLCache(maxsize, ttl)
+
+    async def get(self, key: str) -> Any:
+        return self.store.get(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.store.set(key, value, ttl)
+
+    async def pop(self, key: str) -> Any:
+        return self.store.pop(key)
+
+    async def delete(self, key: str):
+        self.store.delete(key)
+
+    async def clear(self):
+        self.store.clear()
+
+    async def items(self, prefix: str = "") -> List[Tuple[str, Any]]:
+        return self.store.items(prefix)
+
+    async def hset(self, key: str, field: str, value: Any, ttl: Optional[float] = None):
+        """设置键下的一个字段，并刷新整个键的过期时间"""
+        fields = self.store.get(key) or {}
+        fields[field] = value
+        self.store.set(key, fields, ttl)
+
+    async def hgetall(self, key: str) -> Dict[str, Any]:
+        return dict(self.store.get(key) or {})
+
+    async def hdel(self, key: str, *fields: str):
+        current = self.store.get(key)
+        for field in fields:
+            if current:
+                current.pop(field, None)
+
+
+class RedisCache:
+    """基于Redis的共享缓存（多进程/多worker共享），值以JSON存储"""
+
+    def __init__(self, namespace: str, ttl: float = 300):
+        self.namespace = namespace
+        self.ttl = ttl
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    async def get(self, key: str) -> Any:
+        raw = await get_async_redis().get(self._key(key))
+        return json.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await get_async_redis().set(
+            self._key(key),
+            json.dumps(value, ensure_ascii=False, default=str),
+            ex=int(ttl if ttl is not None else self.ttl)
+        )
+
+    async def pop(self, key: str) -> Any:
+        raw = await get_async_redis().getdel(self._key(key))
+        return json.loads(raw) if raw is not None else None
+
+    async def delete(self, key: str):
+        await get_async_redis().delete(self._key(key))
+
+    async def clear(self):
+        client = get_async_redis()
+        async for key in client.scan_iter(match=f"{self.namespace}:*"):
+            await client.delete(key)
+
+    async def items(self, prefix: str = "") -> List[Tuple[str, Any]]:
+        client = get_async_redis()
+        keys = [key async for key in client.scan_iter(match=f"{self._key(prefix)}*")]
+        if not keys:
+            return []
+        values = await client.mget(keys)
+        offset = len(self.namespace) + 1
+        return [(key[offset:], json.loads(raw)) for key, raw in zip(keys, values) if raw is not None]
+
+    async def hset(self, key: str, field: str, value: Any, ttl: Optional[float] = None):
+        """设置哈希中的一个字段，并刷新整个键的过期时间"""
+        async with get_async_redis().pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(key), field, json.dumps(value, ensure_ascii=False, default=str))
+            pipe.expire(self._key(key), int(ttl if ttl is not None else self.ttl))
+            await pipe.execute()
+
+    async def hgetall(self, key: str) -> Dict[str, Any]:
+        raw = await get_async_redis().hgetall(self._key(key))
+        return {field: json.loads(value) for field, value in raw.items()}
+
+    async def hdel(self, key: str, *fields: str):
+        if fields:
+            await get_async_redis().hdel(self._key(key), *fields)
+
+
+def create_cache(namespace: str, maxsize: int = 1024, ttl: float = 300, backend: Optional[str] = None):
+    """
+    按配置创建缓存
+
+    参数:
+        namespace: Redis键前缀
+        maxsize: 内存缓存容量上限（Redis由自身的淘汰策略控制）
+        ttl: 默认过期秒数
+        backend: memory / redis，默认取 CACHE_BACKEND
+    """
+    backend = backend or CACHE_BACKEND
+    if backend == "redis":
+        if aioredis is None:
+            logger.warning(f"未安装redis，缓存 {namespace} 退回到内存")
+        else:
+            return RedisCache(namespace, ttl)
+    return MemoryCache(maxsize, ttl)
+
+
+_redis_client = None
+_async_redis_client = None
+_async_redis_loop = None
+
+
+def get_redis():
+    """同步Redis客户端（用于Celery等同步代码）"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis(
+            host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD, db=REDIS_DB,
+            decode_responses=True, socket_timeout=2
+        )
+    return _redis_client
+
+
+def get_async_redis():
+    """异步Redis客户端，连接池与事件循环绑定，每个事件循环各建一个"""
+    global _async_redis_client, _async_redis_loop
+    loop = asyncio.get_running_loop()
+    if _async_redis_client is None or _async_redis_loop is not loop:
+        _async_redis_client = aioredis.Redis(
+            host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD, db=REDIS_DB,
+            decode_responses=True, socket_timeout=2
+        )
+        _async_redis_loop = loop
+    return _async_redis_client
+
+
+async def close_async_redis():
+    """关闭当前事件循环的异步Redis客户端；Celery任务每次 asyncio.run 结束前、API进程退出时调用"""
+    global _async_redis_client, _async_redis_loop
+    client, loop = _async_redis_client, _async_redis_loop
+    _async_redis_client = None
+    _async_redis_loop = None
+    # 其他（已结束的）事件循环创建的客户端无法在当前循环中关闭，只丢弃引用
+    if client is not None and loop is asyncio.get_running_loop():
+        await client.aclose()
+
+
+# 代数计数器：数据变更时递增，缓存键带上当前代数，旧条目自然失效
+# 递增发生在Celery worker、读取发生在API进程，所以无论 CACHE_BACKEND 取值，代数都保存在Redis中；
+# Redis不可用时退回本进程计数（只能使本进程内的缓存失效）
+_local_generations = {}
+
+
+def bump_generation(name: str):
+    """递增代数（同步，可在Celery任务中调用）"""
+    _local_generations[name] = _local_generations.get(name, 0) + 1
+    if redis is None:
+        return
+    try:
+        get_redis().incr(f"generation:{name}")
+    except Exception as e:
+        logger.warning(f"更新代数 {name} 失败: {str(e)}")
+
+
+async def get_generation(name: str) -> int:
+    """读取当前代数（跨进程共享）"""
+    if aioredis is not None:
+        try:
+            return int(await get_async_redis().get(f"generation:{name}") or 0)
+        except Exception as e:
+            logger.warning(f"读取代数 {name} 失败: {str(e)}")
+    return _local_generations.get(name, 0)
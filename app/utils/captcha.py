@@ -0,0 +1,168 @@
+# captcha.py
+import asyncio
+import io
+import logging
+import secrets
+import string
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from PIL import Image, ImageDraw, ImageFont, ImageFilter
+
+from config import CAPTCHA_FONT, CAPTCHA_POOL_SIZE, CAPTCHA_RENDER_WORKERS
+
+logger = logging.getLogger(__name__)
+
+WIDTH, HEIGHT = 160, 60
+
+
+def generate_captcha_text(length=4):
+    chars = string.ascii_uppercase + string.digits
+    return ''.join(secrets.choice(chars) for _ in range(length))
+
+
+@lru_cache(maxsize=1)
+def load_font():
+    """字体只加载一次"""
+    try:
+        return ImageFont.truetype(CAPTCHA_FONT, 36)
+    except IOError:
+        return ImageFont.load_default()  # 回退到默认字体
+
+
+def create_captcha_image(text):
+    image = Image.new('RGB', (WIDTH, HEIGHT), (255, 255, 255))
+    font = load_font()
+    draw = ImageDraw.Draw(image)
+
+    # 随机字符位置和扭曲
+    for i, char in enumerate(text):
+        x = 10 + i * 30 + secrets.randbelow(10)
+        y = 5 + secrets.randbelow(15)
+        angle = secrets.randbelow(30) - 15
+        rotated_char = Image.new('RGBA', (50, 50), (255, 255, 255, 0))
+        char_draw = ImageDraw.Draw(rotated_char)
+        char_draw.text((0, 0), char, font=font, fill=(0, 0, 0))
+        rotated_char = rotated_char.rotate(angle, expand=1)
+        image.paste(rotated_char, (x, y), rotated_char)
+
+    # 添加干扰线和噪点
+    for _ in range(5):
+        x1 = secrets.randbelow(WIDTH)
+        y1 = secrets.randbelow(HEIGHT)
+        x2 = secrets.randbelow(WIDTH)
+        y2 = secrets.randbelow(HEIGHT)
+        draw.line([(x1, y1), (x2, y2)], fill=(secrets.randbelow(200), secrets.randbelow(200), secrets.randbelow(200)), width=1)
+    for _ in range(100):
+        x = secrets.randbelow(WIDTH)
+        y = secrets.randbelow(HEIGHT)
+        draw.point((x, y), fill=(secrets.randbelow(255), secrets.randbelow(255), secrets.randbelow(255)))
+
+    image = image.filter(ImageFilter.SMOOTH)
+    return image
+
+
+def render_captcha() -> Tuple[str, bytes]:
+    """生成一张验证码，返回 (答案, PNG字节)"""
+    text = generate_captcha_text()
+    byte_stream = io.BytesIO()
+    create_captcha_image(text).save(byte_stream, format="PNG")
+    return text, byte_stream.getvalue()
+
+
+class CaptchaPool:
+    """
+    预渲染验证码池
+
+    图片在线程池中渲染，请求只从池中取出一张；池中数量低于一半时后台补充，
+    池空时当场渲染（同样在线程池中，不阻塞事件循环）
+    """
+
+    def __init__(self, size: int = CAPTCHA_POOL_SIZE, workers: int = CAPTCHA_RENDER_WORKERS):
+        self.size = size
+        self.workers = workers
+        self._items: deque = deque()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._refill_task: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+        self.rendered = 0
+        self.render_seconds = 0.0
+        self.last_refill_seconds = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="captcha")
+        return self._executor
+
+    async def _render(self) -> Tuple[str, bytes]:
+        start = time.perf_counter()
+        item = await asyncio.get_running_loop().run_in_executor(self._get_executor(), render_captcha)
+        self.rendered += 1
+        self.render_seconds += time.perf_counter() - start
+        return item
+
+    async def _refill(self):
+        start = time.perf_counter()
+        try:
+            while len(self._items) < self.size:
+                batch = min(self.workers, self.size - len(self._items))
+                self._items.extend(await asyncio.gather(*(self._render() for _ in range(batch))))
+        except Exception as e:
+            logger.error(f"补充验证码池失败: {str(e)}")
+        finally:
+            self.last_refill_seconds = time.perf_counter() - start
+
+    def ensure_refill(self):
+        """池中数量不足时启动后台补充（同一时间只有一个补充任务）"""
+        if len(self._items) >= self.size // 2:
+            return
+        if self._refill_task is None or self._refill_task.done():
+            self._refill_task = asyncio.get_running_loop().create_task(self._refill())
+
+    async def start(self):
+        """应用启动时预填充"""
+        self.ensure_refill()
+
+    async def get(self) -> Tuple[str, bytes]:
+        """取出一张验证码 (答案, PNG字节)，每张只使用一次"""
+        try:
+            item = self._items.popleft()
+            self.hits += 1
+        except IndexError:
+            self.misses += 1
+            item = await self._render()
+        self.ensure_refill()
+        return item
+
+    async def close(self):
+        if self._refill_task is not None:
+            self._refill_task.cancel()
+            try:
+                await self._refill_task
+            except asyncio.CancelledError:
+                pass
+            self._refill_task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {
+            "pool_size": len(self._items),
+            "capacity": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 4) if requests else 0.0,
+            "rendered": self.rendered,
+            "avg_render_ms": round(self.render_seconds * 1000 / self.rendered, 2) if self.rendered else 0.0,
+            "last_refill_ms": round(self.last_refill_seconds * 1000, 2),
+            "refilling": self._refill_task is not None and not self._refill_task.done()
+        }
+
+
+captcha_pool = CaptchaPool()
@@ -1,13 +1,135 @@
 # es_utils.py
 import json
-from typing import Optional
-from elasticsearch import Elasticsearch, helpers
-from config import ES_HOST, ES_PORT, ES_USERNAME, ES_PASSWORD
+import time
+import asyncio
+import base64
+import logging
+from typing import Iterable, Iterator, List, Optional, Tuple
+from elasticsearch import AsyncElasticsearch, Elasticsearch, NotFoundError, helpers
+from app.utils.mineru_utils import merge_fragments
+from app.utils.cache_utils import bump_generation
+from config import (
+    ES_HOST, ES_PORT, ES_USERNAME, ES_PASSWORD,
+    ES_BULK_CHUNK_SIZE, ES_BULK_MAX_BYTES, ES_BULK_MAX_RETRIES,
+    ES_BULK_INITIAL_BACKOFF, ES_BULK_MAX_BACKOFF, ES_BULK_TIMEOUT,
+    ES_INDEX_LAYOUT, ES_CONNECTIONS_PER_NODE, ES_REQUEST_TIMEOUT, ES_MAX_RETRIES,
+    ES_PIT_KEEP_ALIVE
+)
+
+logger = logging.getLogger(__name__)
 
 # ES连接配置
 es = Elasticsearch([{'scheme': 'http', 'host': ES_HOST, 'port': ES_PORT}], basic_auth=(ES_USERNAME, ES_PASSWORD))
 
+# 异步客户端，供FastAPI请求路径使用，在应用 lifespan 中创建和关闭
+async_es: Optional[AsyncElasticsearch] = None
+
+def init_async_es() -> AsyncElasticsearch:
+    """创建异步ES客户端（带连接池）"""
+    global async_es
+    if async_es is None:
+        async_es = AsyncElasticsearch(
+            [{'scheme': 'http', 'host': ES_HOST, 'port': ES_PORT}],
+            basic_auth=(ES_USERNAME, ES_PASSWORD),
+            connections_per_node=ES_CONNECTIONS_PER_NODE,
+            request_timeout=ES_REQUEST_TIMEOUT,
+            max_retries=ES_MAX_RETRIES,
+            retry_on_timeout=True
+        )
+    return async_es
+
+async def close_async_es():
+    """关闭异步ES客户端，释放连接池"""
+    global async_es
+    if async_es is not None:
+        await async_es.close()
+        async_es = None
+
 INDEX_NAME = "pdf_fragments"
+# 索引内容变更时递增的代数名，搜索结果缓存以此失效
+SEARCH_GENERATION = "es_index"
+# 块级索引：每个文本块一个ES文档
+BLOCK_INDEX_NAME = "pdf_blocks"
+
+# 索引分词器配置
+INDEX_SETTINGS = {
+    "analysis": {
+        "analyzer": {
+            "ik_smart_analyzer": {
+                "type": "custom",
+                "tokenizer": "ik_smart"
+            },
+            "ik_max_analyzer": {
+                "type": "custom",
+                "tokenizer": "ik_max_word"
+            }
+        }
+    }
+}
+
+# 映射版本号，修改下方映射时递增，启动时据此判断是否需要更新索引映射
+MAPPING_VERSION = 2
+
+# nested 布局映射（确保fragments为nested类型）
+INDEX_MAPPINGS = {
+    "_meta": {"mapping_version": MAPPING_VERSION},
+    "properties": {
+        "document_id": {"type": "keyword"},
+        "document": {
+            "type": "object",
+            "properties": {
+                "title": {
+                    "type": "text",
+                    "analyzer": "ik_max_analyzer",  # 索引时细粒度分词
+                    "search_analyzer": "ik_smart_analyzer"  # 搜索时粗粒度分词
+                },
+                "content": {
+                    "type": "text",
+                    "analyzer": "ik_max_analyzer",
+                    "search_analyzer": "ik_smart_analyzer"
+                },
+                "metadata": {"type": "object"}
+            }
+        },
+        "fragments": {
+            "type": "nested",
+            "properties": {
+                "page_idx": {"type": "integer"},
+                "content": {
+                    "type": "text",
+                    "analyzer": "ik_max_analyzer",
+                    "search_analyzer": "ik_smart_analyzer"
+                },
+                "bbox": {"type": "float"},
+                # span偏移映射只用于回显，不建索引
+                "spans": {"type": "object", "enabled": False}
+            }
+        }
+    }
+}
+
+# 块级布局映射（扁平字段，无nested）
+BLOCK_INDEX_MAPPINGS = {
+    "_meta": {"mapping_version": MAPPING_VERSION},
+    "properties": {
+        "document_id": {"type": "keyword"},
+        "title": {
+            "type": "text",
+            "analyzer": "ik_max_analyzer",
+            "search_analyzer": "ik_smart_analyzer"
+        },
+        "page_idx": {"type": "integer"},
+        "block_id": {"type": "keyword"},
+        "bbox": {"type": "float"},
+        "content": {
+            "type": "text",
+            "analyzer": "ik_max_analyzer",
+            "search_analyzer": "ik_smart_analyzer"
+        },
+        "spans": {"type": "object", "enabled": False},
+        "metadata": {"type": "object"}
+    }
+}
 
 # 创建索引（确保正确定义nested类型）
 def create_index(force_recreate=False):
@@ -20,74 +142,93 @@ def create_index(force_recreate=False):
     
     if not index_exists:
         mapping = {
-            "settings": {
-                "analysis": {
-                    "analyzer": {
-                        "ik_smart_analyzer": {
-                            "type": "custom",
-                            "tokenizer": "ik_smart"
-                        },
-                        "ik_max_analyzer": {
-                            "type": "custom",
-                            "tokenizer": "ik_max_word"
-                        }
-                    }
-                }
-            },
-            "mappings": {
-                "properties": {
-                    "document_id": {"type": "keyword"},
-                    "document": {
-                        "type": "object",
-                        "properties": {
-                            "title": {
-                                "type": "text",
-                                "analyzer": "ik_max_analyzer",  # 索引时细粒度分词
-                                "search_analyzer": "ik_smart_analyzer"  # 搜索时粗粒度分词
-                            },
-                            "content": {
-                                "type": "text",
-                                "analyzer": "ik_max_analyzer",
-                                "search_analyzer": "ik_smart_analyzer"
-                            },
-                            "metadata": {"type": "object"}
-                        }
-                    },
-                    "fragments": {
-                        "type": "nested",
-                        "properties": {
-                            "page_idx": {"type": "integer"},
-                            "content": {
-                                "type": "text",
-                                "analyzer": "ik_max_analyzer",
-                                "search_analyzer": "ik_smart_analyzer"
-                            },
-                            "bbox": {"type": "float"}
-                        }
-                    }
-                }
-            }
+            "settings": INDEX_SETTINGS,
+            "mappings": INDEX_MAPPINGS
         }
         es.indices.create(index=INDEX_NAME, body=mapping)
         print(f"索引 {INDEX_NAME} 创建成功")
     elif not force_recreate:
         print(f"索引 {INDEX_NAME} 已存在")
 
+    if ES_INDEX_LAYOUT == "block":
+        create_block_index(force_recreate)
+
+    if force_recreate:
+        # 重建后需要重新校验
+        reset_schema_cache()
+        bump_generation(SEARCH_GENERATION)
+
+# 已校验通过的映射版本，None 表示尚未校验；搜索路径只读取该缓存，不再访问ES
+_validated_mapping_version: Optional[int] = None
+
+def reset_schema_cache():
+    global _validated_mapping_version
+    _validated_mapping_version = None
+
+def schema_validated() -> bool:
+    return _validated_mapping_version == MAPPING_VERSION
 
-def enhanced_search(query, search_in, page_size=10, page_number=1, document_id: Optional[int] = None):
-    # 检查索引是否存在且映射正确
-    if not es.indices.exists(index=INDEX_NAME):
-        create_index()
-        return {"hits": {"hits": [], "total": {"value": 0}}}
+def _sync_index_mapping(index_name, mappings, current=None):
+    """索引映射版本落后时增量更新映射，无法兼容更新时提示重建"""
+    if current is None:
+        current = es.indices.get_mapping(index=index_name)[index_name]['mappings']
+    index_version = current.get('_meta', {}).get('mapping_version')
+    if index_version == MAPPING_VERSION:
+        return
+    try:
+        es.indices.put_mapping(index=index_name, body=mappings)
+        print(f"索引 {index_name} 映射已由版本 {index_version} 更新到 {MAPPING_VERSION}")
+    except Exception as e:
+        logger.warning(f"索引 {index_name} 映射无法增量更新到版本 {MAPPING_VERSION}，请通过 /recreate_es_index 重建: {str(e)}")
+
+def validate_index_schema(force=False) -> bool:
+    """
+    校验索引映射并缓存结果
+
+    只在应用启动、管理员手动触发（force=True）或映射版本变化时访问ES，
+    搜索请求命中缓存后不再产生额外的 exists / get_mapping 请求
+    """
+    global _validated_mapping_version
+    if not force and schema_validated():
+        return True
+
+    create_index()  # 索引不存在时创建
+    # 验证fragments字段是否为nested类型
+    mapping = es.indices.get_mapping(index=INDEX_NAME)
+    fragments_type = mapping[INDEX_NAME]['mappings']['properties'].get('fragments', {}).get('type')
+    if fragments_type != 'nested':
+        print(f"警告: fragments字段类型错误({fragments_type})，重建索引...")
+        create_index(force_recreate=True)
     else:
-        # 验证fragments字段是否为nested类型
-        mapping = es.indices.get_mapping(index=INDEX_NAME)
-        fragments_type = mapping[INDEX_NAME]['mappings']['properties'].get('fragments', {}).get('type')
-        
-        if fragments_type != 'nested':
-            print(f"警告: fragments字段类型错误({fragments_type})，重建索引...")
-            create_index(force_recreate=True)
+        _sync_index_mapping(INDEX_NAME, INDEX_MAPPINGS, mapping[INDEX_NAME]['mappings'])
+
+    if ES_INDEX_LAYOUT == "block":
+        _sync_index_mapping(BLOCK_INDEX_NAME, BLOCK_INDEX_MAPPINGS)
+
+    _validated_mapping_version = MAPPING_VERSION
+    return True
+
+# 创建块级索引（扁平字段，无nested）
+def create_block_index(force_recreate=False):
+    index_exists = es.indices.exists(index=BLOCK_INDEX_NAME)
+    if force_recreate and index_exists:
+        es.indices.delete(index=BLOCK_INDEX_NAME)
+        index_exists = False
+        print(f"已删除并准备重建索引 {BLOCK_INDEX_NAME}")
 
+    if not index_exists:
+        mapping = {
+            "settings": INDEX_SETTINGS,
+            "mappings": BLOCK_INDEX_MAPPINGS
+        }
+        es.indices.create(index=BLOCK_INDEX_NAME, body=mapping)
+        print(f"索引 {BLOCK_INDEX_NAME} 创建成功")
+    elif not force_recreate:
+        print(f"索引 {BLOCK_INDEX_NAME} 已存在")
+
+
+def build_search_query(query, search_in, page_size=10, page_number=1, document_id: Optional[int] = None):
+    """构建 nested 布局的搜索请求体"""
     # 构建基础查询
     es_query = {
         "query": {
@@ -149,25 +290,254 @@ def enhanced_search(query, search_in, page_size=10, page_number=1, document_id:
             # 添加高亮字段
             es_query["highlight"]["fields"][field] = {}
 
-    # 输出查询
-    print(json.dumps(es_query, indent=2))
+    logger.debug(json.dumps(es_query, indent=2, ensure_ascii=False))
+    return es_query
+
+
+def enhanced_search(
+    query,
+    search_in,
+    page_size=10,
+    page_number=1,
+    document_id: Optional[int] = None,
+    layout: Optional[str] = None
+):
+    if (layout or ES_INDEX_LAYOUT) == "block":
+        return search_blocks(query, search_in, page_size, page_number, document_id)
+
+    # 映射只在首次搜索（或启动）时校验一次，之后命中缓存
+    validate_index_schema()
+
+    es_query = build_search_query(query, search_in, page_size, page_number, document_id)
     # 执行搜索
     try:
         results = es.search(index=INDEX_NAME, body=es_query)
         return results
     except Exception as e:
         print(f"ES搜索错误: {str(e)}")
-        return {"hits": {"hits": [], "total": {"value": 0}}}
+        return {"hits": {"hits": [], "total": {"value": 0}}, "error": str(e)}
 
-# 索引文档（带片段）
-def index_document_with_fragments(document_id, title, fragments, metadata=None):
+
+async def async_enhanced_search(
+    query,
+    search_in,
+    page_size=10,
+    page_number=1,
+    document_id: Optional[int] = None,
+    layout: Optional[str] = None
+):
+    """enhanced_search 的异步版本，不阻塞事件循环，并发搜索可以重叠执行"""
+    client = async_es or init_async_es()
+    if (layout or ES_INDEX_LAYOUT) == "block":
+        if not schema_validated():
+            await asyncio.to_thread(validate_index_schema)
+        es_query = build_block_search_query(query, search_in, page_size, page_number, document_id)
+        try:
+            results = await client.search(index=BLOCK_INDEX_NAME, body=es_query)
+        except Exception as e:
+            logger.error(f"ES搜索错误: {str(e)}")
+            # 带上 error，调用方据此不缓存失败结果
+            return {"hits": {"hits": [], "total": {"value": 0}}, "error": str(e)}
+        return normalize_block_results(results)
+
+    # 映射只在首次搜索（或启动）时校验一次，之后命中缓存
+    if not schema_validated():
+        await asyncio.to_thread(validate_index_schema)
+
+    es_query = build_search_query(query, search_in, page_size, page_number, document_id)
+    try:
+        return await client.search(index=INDEX_NAME, body=es_query)
+    except Exception as e:
+        logger.error(f"ES搜索错误: {str(e)}")
+        return {"hits": {"hits": [], "total": {"value": 0}}, "error": str(e)}
+
+def encode_cursor(pit_id: str, search_after: list) -> str:
+    """游标对调用方不透明：point-in-time ID + 上一页最后一条的排序值"""
+    payload = json.dumps({"pit": pit_id, "after": search_after}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return payload["pit"], payload["after"]
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+async def async_cursor_search(
+    query,
+    search_in,
+    page_size=10,
+    cursor: Optional[str] = None,
+    document_id: Optional[int] = None
+):
+    """
+    基于 point-in-time + search_after 的深分页搜索，每页开销与页码无关
+
+    参数:
+        cursor: 上一页返回的 next_cursor，为空表示第一页（新开 point-in-time）
+
+    返回:
+        (ES搜索结果, next_cursor)，没有下一页时 next_cursor 为 None
+    """
+    if ES_INDEX_LAYOUT == "block":
+        # 折叠查询只能按折叠字段排序后才能配合 search_after，按相关度分页不可用
+        raise ValueError("块级索引布局暂不支持游标分页")
+
+    client = async_es or init_async_es()
+    if not schema_validated():
+        await asyncio.to_thread(validate_index_schema)
+
+    if cursor:
+        pit_id, search_after = decode_cursor(cursor)
+    else:
+        pit = await client.open_point_in_time(index=INDEX_NAME, keep_alive=ES_PIT_KEEP_ALIVE)
+        pit_id, search_after = pit["id"], None
+
+    es_query = build_search_query(query, search_in, page_size, 1, document_id)
+    es_query.pop("from", None)
+    es_query["pit"] = {"id": pit_id, "keep_alive": ES_PIT_KEEP_ALIVE}
+    # _shard_doc 作为同分时的唯一排序键，保证翻页稳定
+    es_query["sort"] = [{"_score": "desc"}, {"_shard_doc": "asc"}]
+    if search_after:
+        es_query["search_after"] = search_after
+
+    try:
+        results = await client.search(body=es_query)
+    except NotFoundError:
+        raise ValueError("分页游标已过期，请重新搜索")
+
+    hits = results['hits']['hits']
+    pit_id = results.get('pit_id', pit_id)
+    if len(hits) < page_size:
+        # 已到最后一页，释放 point-in-time
+        await client.close_point_in_time(id=pit_id)
+        return results, None
+    return results, encode_cursor(pit_id, hits[-1]['sort'])
+
+
+# 块级索引搜索：按 document_id 折叠，结果转换为与 nested 布局相同的结构
+def search_blocks(query, search_in, page_size=10, page_number=1, document_id: Optional[int] = None):
+    es_query = build_block_search_query(query, search_in, page_size, page_number, document_id)
+    try:
+        results = es.search(index=BLOCK_INDEX_NAME, body=es_query)
+    except Exception as e:
+        print(f"ES搜索错误: {str(e)}")
+        return {"hits": {"hits": [], "total": {"value": 0}}, "error": str(e)}
+    return normalize_block_results(results)
+
+
+def build_block_search_query(query, search_in, page_size=10, page_number=1, document_id: Optional[int] = None):
+    """构建块级布局的折叠搜索请求体"""
+    # nested 布局的字段名映射到块级索引的扁平字段
+    fields = []
+    for field in search_in:
+        target = "title" if field == "document.title" else "content"
+        if target not in fields:
+            fields.append(target)
+
+    es_query = {
+        "query": {
+            "bool": {
+                "should": [
+                    {
+                        "match": {
+                            field: {
+                                "query": query,
+                                "operator": "and",
+                                "analyzer": "ik_smart_analyzer"
+                            }
+                        }
+                    }
+                    for field in fields
+                ],
+                "minimum_should_match": 1
+            }
+        },
+        "collapse": {
+            "field": "document_id",
+            "inner_hits": {
+                "name": "fragments",
+                "size": 5,
+                "_source": ["content", "page_idx", "bbox", "block_id", "spans"],
+                "highlight": {
+                    "pre_tags": ["<mark>"],
+                    "post_tags": ["</mark>"],
+                    "fields": {"content": {}}
+                }
+            }
+        },
+        "_source": ["document_id", "title", "content"],
+        "from": (page_number - 1) * page_size,
+        "size": page_size,
+        "highlight": {
+            "pre_tags": ["<mark>"],
+            "post_tags": ["</mark>"],
+            "fields": {"content": {}}
+        },
+        "aggs": {
+            "total_documents": {"cardinality": {"field": "document_id"}}
+        }
+    }
+
+    if document_id is not None:
+        es_query["query"]["bool"]["filter"] = [
+            {"term": {"document_id": f"doc_{document_id}"}}
+        ]
+    return es_query
+
+
+def normalize_block_results(results):
+    """将块级索引的折叠结果转换为 nested 布局的返回结构，调用方无需区分布局"""
+    hits = []
+    for hit in results['hits']['hits']:
+        source = hit['_source']
+        fragment_hits = []
+        inner_hits = hit.get('inner_hits', {}).get('fragments', {}).get('hits', {}).get('hits', [])
+        for inner_hit in inner_hits:
+            inner_source = inner_hit['_source']
+            fragment_hit = {
+                "_source": {
+                    "content": inner_source.get('content', ''),
+                    "page_idx": inner_source.get('page_idx', 0),
+                    "bbox": inner_source.get('bbox', []),
+                    "block_id": inner_source.get('block_id'),
+                    "spans": inner_source.get('spans', [])
+                }
+            }
+            inner_highlight = inner_hit.get('highlight', {}).get('content')
+            if inner_highlight:
+                fragment_hit["highlight"] = {"fragments.content": inner_highlight}
+            fragment_hits.append(fragment_hit)
+
+        hits.append({
+            "_id": source['document_id'],
+            "_score": hit['_score'],
+            "_source": {
+                "document_id": source['document_id'],
+                "document": {
+                    "title": source.get('title', ''),
+                    "content": source.get('content', '')
+                }
+            },
+            "highlight": {"document.content": hit.get('highlight', {}).get('content', [])},
+            "inner_hits": {"fragments": {"hits": {"hits": fragment_hits}}}
+        })
+
+    total = results.get('aggregations', {}).get('total_documents', {}).get('value', len(hits))
+    return {"hits": {"hits": hits, "total": {"value": total}}}
+
+
+# 构建ES文档主体
+def build_document(document_id, title, fragments, metadata=None):
     if metadata is None:
         metadata = {}
     
     # 构建文档全文内容
     document_content = " ".join(frag['content'] for frag in fragments)
     
-    doc = {
+    return {
         "document_id": document_id,
         "document": {
             "title": title,
@@ -177,12 +547,152 @@ def index_document_with_fragments(document_id, title, fragments, metadata=None):
         },
         "fragments": fragments
     }
-    
+
+# 索引文档（带片段）
+def index_document_with_fragments(document_id, title, fragments, metadata=None):
+    doc = build_document(document_id, title, fragments, metadata)
     es.index(index=INDEX_NAME, id=document_id, body=doc)
+    bump_generation(SEARCH_GENERATION)
     return True
 
+# 批量索引文档
+def bulk_index_documents(
+    documents: Iterable[dict],
+    chunk_size: int = ES_BULK_CHUNK_SIZE,
+    max_chunk_bytes: int = ES_BULK_MAX_BYTES,
+    max_retries: int = ES_BULK_MAX_RETRIES,
+    initial_backoff: float = ES_BULK_INITIAL_BACKOFF,
+    max_backoff: float = ES_BULK_MAX_BACKOFF
+):
+    """
+    基于 helpers.streaming_bulk 的批量索引，按 chunk_size / max_chunk_bytes 分批提交，
+    遇到 429 时按指数退避重试
+
+    参数:
+        documents: 可迭代的文档参数，每项包含 document_id、title、fragments、metadata
+        chunk_size: 每批最多文档数
+        max_chunk_bytes: 每批请求体最大字节数
+        max_retries: 429 重试次数
+        initial_backoff: 首次重试等待秒数（之后每次翻倍）
+        max_backoff: 最大等待秒数
+
+    返回:
+        {"success": 成功数, "failed": 失败数, "errors": 失败详情, "elapsed": 耗时秒数}
+    """
+    def generate_actions():
+        for item in documents:
+            yield {
+                "_index": INDEX_NAME,
+                "_id": item["document_id"],
+                "_source": build_document(
+                    item["document_id"],
+                    item["title"],
+                    item["fragments"],
+                    item.get("metadata")
+                )
+            }
+
+    return run_streaming_bulk(
+        generate_actions(),
+        chunk_size=chunk_size,
+        max_chunk_bytes=max_chunk_bytes,
+        max_retries=max_retries,
+        initial_backoff=initial_backoff,
+        max_backoff=max_backoff
+    )
+
+def run_streaming_bulk(
+    actions: Iterable[dict],
+    chunk_size: int = ES_BULK_CHUNK_SIZE,
+    max_chunk_bytes: int = ES_BULK_MAX_BYTES,
+    max_retries: int = ES_BULK_MAX_RETRIES,
+    initial_backoff: float = ES_BULK_INITIAL_BACKOFF,
+    max_backoff: float = ES_BULK_MAX_BACKOFF
+):
+    """执行 streaming_bulk 并统计每个 action 的成功/失败数"""
+    stats = {"success": 0, "failed": 0, "errors": [], "elapsed": 0.0}
+    start = time.perf_counter()
+    for ok, result in helpers.streaming_bulk(
+        es.options(request_timeout=ES_BULK_TIMEOUT),
+        actions,
+        chunk_size=chunk_size,
+        max_chunk_bytes=max_chunk_bytes,
+        max_retries=max_retries,
+        initial_backoff=initial_backoff,
+        max_backoff=max_backoff,
+        raise_on_error=False,
+        raise_on_exception=False
+    ):
+        if ok:
+            stats["success"] += 1
+        else:
+            stats["failed"] += 1
+            # 失败项可能携带完整文档(data)，只保留错误信息
+            error = {
+                op: {k: v for k, v in info.items() if k != "data"}
+                for op, info in result.items()
+            }
+            stats["errors"].append(error)
+            logger.error(f"批量索引失败: {error}")
+    stats["elapsed"] = time.perf_counter() - start
+    if stats["success"]:
+        bump_generation(SEARCH_GENERATION)
+    return stats
+
+def build_block_documents(
+    document_id,
+    title,
+    page_fragments: Iterable[Tuple[int, List[dict]]],
+    metadata=None
+) -> Iterator[dict]:
+    """
+    将逐页片段按 block_id 聚合为块级ES文档
+
+    参数:
+        page_fragments: 逐页产出的 (page_idx, 片段列表)，见 mineru_utils.iter_page_fragments
+    """
+    for page_idx, fragments in page_fragments:
+        for block in merge_fragments(fragments, level="block"):
+            yield {
+                "document_id": document_id,
+                "title": title,
+                "page_idx": page_idx,
+                "block_id": block['block_id'],
+                "bbox": block['bbox'],
+                "content": block['content'],
+                "spans": block['spans'],
+                "metadata": metadata or {}
+            }
+
+def bulk_index_blocks(document_id, title, page_fragments: Iterable[Tuple[int, List[dict]]], metadata=None, **bulk_options):
+    """
+    按块级布局索引文档：先删除该文档已有的块，再逐页流式写入
+
+    page_fragments 为生成器时，内存中同时只保留一页的片段
+    """
+    es.options(ignore_status=404).delete_by_query(
+        index=BLOCK_INDEX_NAME,
+        query={"term": {"document_id": document_id}},
+        refresh=True
+    )
+    actions = (
+        {
+            "_index": BLOCK_INDEX_NAME,
+            "_id": f"{document_id}_{block['block_id']}",
+            "_source": block
+        }
+        for block in build_block_documents(document_id, title, page_fragments, metadata)
+    )
+    return run_streaming_bulk(actions, **bulk_options)
+
 # 删除文档
 def delete_document_from_es(doc_id):
     """删除文档索引"""
     es.delete(index=INDEX_NAME, id=doc_id, ignore=[404])
+    if ES_INDEX_LAYOUT == "block":
+        es.options(ignore_status=404).delete_by_query(
+            index=BLOCK_INDEX_NAME,
+            query={"term": {"document_id": doc_id}}
+        )
+    bump_generation(SEARCH_GENERATION)
     return True
@@ -1,33 +1,86 @@
+from app.utils.kg_stats import fmt, get_stats, total
+
+AGRI = "agriDisasterDroughtResistList"
+RESIST = "agriDroughtResistList"
+DYNAMIC = "agriDroughtDynamicList"
 
 
 def get_zqzs(params: dict):
-    result = "[时间段]，[地区名称]遭受严重干旱灾害影响。根据农业灾情及抗旱情况统计，本年度累计播种面积[具体数字]千公顷，其中粮食作物[具体数字]千公顷，经济作物[具体数字]千公顷。作物累计受旱面积达[具体数字]千公顷，作物累计受灾面积[具体数字]千公顷，其中成灾面积[具体数字]千公顷，绝收面积[具体数字]千公顷。累计因旱造成人畜饮水困难，涉及人口[具体数字]万人，大牲畜[具体数字]万头。本次干旱灾害造成本年度粮食总产量[具体数字]万吨，粮食因旱损失[具体数字]万吨，经济作物因旱损失[具体数字]亿元，对当地农业生产和群众生活造成严重影响。"
+    stats = get_stats(params)
+    regions = [r for r in stats["agri_regions"].index if r]
+    area = params.get('regionName') or "、".join(regions[:3]) or "榆林市"
+
+    def v(field):
+        return fmt(total(params, AGRI, field))
+
+    result = f"{params['startdate']}至{params['enddate']}，{area}遭受严重干旱灾害影响。根据农业灾情及抗旱情况统计，本年度累计播种面积{v('sown_area')}千公顷，其中粮食作物{v('grain_sown_area')}千公顷，经济作物{v('cash_sown_area')}千公顷。作物累计受旱面积达{v('drought_area')}千公顷，作物累计受灾面积{v('affected_area')}千公顷，其中成灾面积{v('disaster_area')}千公顷，绝收面积{v('failure_area')}千公顷。累计因旱造成人畜饮水困难，涉及人口{v('drinking_population')}万人，大牲畜{v('drinking_livestock')}万头。本次干旱灾害造成本年度粮食总产量{v('grain_output')}万吨，粮食因旱损失{v('grain_loss')}万吨，经济作物因旱损失{v('cash_crop_loss')}亿元，对当地农业生产和群众生活造成严重影响。"
     return result
 
 def get_dqnyhqzk(params: dict):
-    p1 = "根据农业旱情及抗旱情况统计数据，本季作物实际播种面积[具体数字]千公顷，本季作物最大受旱面积[具体数字]千公顷，当前作物受旱面积[具体数字]千公顷。当前受旱作物中，轻旱面积[具体数字]千公顷，中旱面积[具体数字]千公顷，重旱面积[具体数字]千公顷，特旱面积[具体数字]千公顷。待播耕地缺水缺墒面积[具体数字]千公顷，其中水田缺水[具体数字]千公顷，旱地缺墒[具体数字]千公顷。"
-    p2 = "根据农业旱情动态统计数据，在田作物面积[具体数字]千公顷，作物受旱面积[具体数字]千公顷，其中无抗旱条件面积[具体数字]千公顷。受旱作物按旱情程度分类，轻旱面积[具体数字]千公顷，重旱面积[具体数字]千公顷，干枯面积[具体数字]千公顷。缺水缺墒情况表现为水田缺水[具体数字]千公顷，旱地缺墒[具体数字]千公顷。牧区受旱面积[具体数字]万平方公里。" 
-    p3 = "当前因旱人畜饮水困难涉及人口[具体数字]万人，大牲畜[具体数字]万头。饮水困难主要集中在[具体地区]，问题突出表现在水源短缺、供水设施不足等方面。"
+    def v(field):
+        return fmt(total(params, DYNAMIC, field))
+
+    p1 = f"根据农业旱情及抗旱情况统计数据，本季作物实际播种面积{v('season_sown_area')}千公顷，本季作物最大受旱面积{v('max_drought_area')}千公顷，当前作物受旱面积{v('drought_area')}千公顷。当前受旱作物中，轻旱面积{v('light_area')}千公顷，中旱面积{v('moderate_area')}千公顷，重旱面积{v('severe_area')}千公顷，特旱面积{v('extreme_area')}千公顷。待播耕地缺水缺墒面积{fmt(total(params, DYNAMIC, 'paddy_shortage') + total(params, DYNAMIC, 'dryland_shortage'))}千公顷，其中水田缺水{v('paddy_shortage')}千公顷，旱地缺墒{v('dryland_shortage')}千公顷。"
+    p2 = f"根据农业旱情动态统计数据，在田作物面积{v('field_crop_area')}千公顷，作物受旱面积{v('drought_area')}千公顷，其中无抗旱条件面积{v('no_resist_area')}千公顷。受旱作物按旱情程度分类，轻旱面积{v('light_area')}千公顷，重旱面积{v('severe_area')}千公顷，干枯面积{v('dried_area')}千公顷。缺水缺墒情况表现为水田缺水{v('paddy_shortage')}千公顷，旱地缺墒{v('dryland_shortage')}千公顷。牧区受旱面积{v('pasture_area')}万平方公里。"
+
+    # 饮水困难人口最多的地区
+    regions = get_stats(params)["drought_regions"].sort_values("drinking_population", ascending=False)
+    regions = [r for r, value in regions["drinking_population"].items() if r and value > 0][:3]
+    p3 = f"当前因旱人畜饮水困难涉及人口{v('drinking_population')}万人，大牲畜{v('drinking_livestock')}万头。饮水困难主要集中在{'、'.join(regions) or '[具体地区]'}，问题突出表现在水源短缺、供水设施不足等方面。"
     return p1 + "\n" + p2 + "\n "+ p3
 
 def get_slgcxssyzk(params: dict):
-    result = "根据农业旱情动态统计数据，当前水利工程蓄水总量[具体数字]亿立方米，比多年同期增减[具体数字]%。水源紧缺状况突出表现在河道断流[具体数字]条，水库干涸[具体数字]座，机电井出水不足[具体数字]眼。"
+    def v(field):
+        return fmt(total(params, DYNAMIC, field))
+
+    # 蓄水增减率按各地区平均
+    frame = get_stats(params)["frames"][DYNAMIC]
+    storage_change = fmt(frame["storage_change"].mean()) if len(frame) else 0
+    result = f"根据农业旱情动态统计数据，当前水利工程蓄水总量{v('storage')}亿立方米，比多年同期增减{storage_change}%。水源紧缺状况突出表现在河道断流{v('dry_rivers')}条，水库干涸{v('dry_reservoirs')}座，机电井出水不足{v('short_wells')}眼。"
     return result
 
 def get_khtrzzqk(params: dict):
-    p1 = "根据农业灾情及抗旱情况统计，本年度投入抗旱人数[具体数字]万人。根据农业抗旱情况统计，统计时段投入抗旱人数[具体数字]万人。"
-    p2 = "本年度投入抗旱设施包括机电井[具体数字]万眼，泵站[具体数字]处，机动抗旱设备[具体数字]万台套，机动运水车辆[具体数字]辆。统计时段投入的抗旱设施中，机电井[具体数字]万眼，泵站[具体数字]处，机动抗旱设备[具体数字]万台套，装机容量[具体数字]万千瓦，机动运水车辆[具体数字]万辆。这些抗旱设施设备的投入使用，有效缓解了部分地区的旱情，为农业抗旱和应急供水发挥了重要作用。"
-    p3 = "累计投入抗旱资金[具体数字]万元，其中中央拨款[具体数字]万元，各级财政拨款[具体数字]万元。统计时段投入抗旱资金[具体数字]万元，资金来源包括中央拨款[具体数字]万元，省级财政拨款[具体数字]万元，地县级财政拨款[具体数字]万元，群众自筹[具体数字]万元。抗旱用电[具体数字]万度，抗旱用油[具体数字]吨。"
+    def a(field):
+        return fmt(total(params, AGRI, field))
+
+    def r(field):
+        return fmt(total(params, RESIST, field))
+
+    p1 = f"根据农业灾情及抗旱情况统计，本年度投入抗旱人数{a('resist_population')}万人。根据农业抗旱情况统计，统计时段投入抗旱人数{r('resist_population')}万人。"
+    p2 = f"本年度投入抗旱设施包括机电井{a('wells')}万眼，泵站{a('pumps')}处，机动抗旱设备{a('equipment')}万台套，机动运水车辆{a('vehicles')}辆。统计时段投入的抗旱设施中，机电井{r('wells')}万眼，泵站{r('pumps')}处，机动抗旱设备{r('equipment')}万台套，装机容量{r('installed_capacity')}万千瓦，机动运水车辆{r('vehicles')}万辆。这些抗旱设施设备的投入使用，有效缓解了部分地区的旱情，为农业抗旱和应急供水发挥了重要作用。"
+    p3 = f"累计投入抗旱资金{a('funds')}万元，其中中央拨款{a('central_funds')}万元，各级财政拨款{a('local_funds')}万元。统计时段投入抗旱资金{r('funds')}万元，资金来源包括中央拨款{r('central_funds')}万元，省级财政拨款{r('provincial_funds')}万元，地县级财政拨款{r('local_funds')}万元，群众自筹{r('self_raised_funds')}万元。抗旱用电{r('electricity')}万度，抗旱用油{r('oil')}吨。"
     return p1 + "\n" + p2 + "\n "+ p3
 
 
 def get_khcxjzxy(params: dict):
-    p1 = "累计完成抗旱浇灌面积[具体数字]千公顷，浇灌次数达[具体数字]千公顷次。"
-    p2 = "累计解决因旱人畜饮水困难人口[具体数字]万人，大牲畜[具体数字]万头。临时解决人畜饮水困难人口[具体数字]万人，大牲畜[具体数字]万头。"
-    p3 = "全年抗旱减灾效益达[具体数字]亿元，其中挽回粮食损失[具体数字]万吨，挽回经济作物损失[具体数字]亿元。"
+    def v(field):
+        return fmt(total(params, AGRI, field))
+
+    p1 = f"累计完成抗旱浇灌面积{v('irrigated_area')}千公顷，浇灌次数达{v('irrigation_times')}千公顷次。"
+    p2 = f"累计解决因旱人畜饮水困难人口{v('solved_population')}万人，大牲畜{v('solved_livestock')}万头。临时解决人畜饮水困难人口{v('temp_solved_population')}万人，大牲畜{v('temp_solved_livestock')}万头。"
+    p3 = f"全年抗旱减灾效益达{v('benefit')}亿元，其中挽回粮食损失{v('recovered_grain')}万吨，挽回经济作物损失{v('recovered_cash')}亿元。"
     return p1 + "\n" + p2 + "\n "+ p3
 
 def get_zdshdqqk(params: dict):
-    result = "根据统计数据分析，[地区名称]、[地区名称]、[地区名称]等地区旱情相对严重。[地区名称]受旱面积[具体数字]千公顷，因旱饮水困难人口[具体数字]万人，投入抗旱资金[具体数字]万元；[地区名称]成灾面积[具体数字]千公顷，绝收面积[具体数字]千公顷，粮食损失[具体数字]万吨；[地区名称]牧区受旱面积[具体数字]万平方公里，大牲畜饮水困难[具体数字]万头。"
-    return result
+    stats = get_stats(params)
+    dynamic = stats["drought_regions"]
+    agri = stats["agri_regions"]
+    # 受旱面积排序优先取旱情动态，没有时取农业灾情统计
+    ranking = dynamic["drought_area"] if dynamic["drought_area"].sum() > 0 else agri["drought_area"].sort_values(ascending=False)
+    regions = [r for r, value in ranking.items() if r and value > 0][:3]
+    if not regions:
+        return "根据统计数据分析，暂无各地区旱情数据。"
+
+    def value(table, region, column):
+        return fmt(table.loc[region, column]) if region in table.index else 0
 
+    details = []
+    for i, region in enumerate(regions):
+        if i == 0:
+            details.append(f"{region}受旱面积{fmt(ranking[region])}千公顷，因旱饮水困难人口{value(dynamic, region, 'drinking_population')}万人，投入抗旱资金{value(agri, region, 'funds')}万元")
+        elif i == 1:
+            details.append(f"{region}成灾面积{value(agri, region, 'disaster_area')}千公顷，绝收面积{value(agri, region, 'failure_area')}千公顷，粮食损失{value(agri, region, 'grain_loss')}万吨")
+        else:
+            details.append(f"{region}牧区受旱面积{value(dynamic, region, 'pasture_area')}万平方公里，大牲畜饮水困难{value(dynamic, region, 'drinking_livestock')}万头")
+    result = f"根据统计数据分析，{'、'.join(regions)}等地区旱情相对严重。{'；'.join(details)}。"
+    return result
@@ -1,3 +1,15 @@
+from app.utils.kg_stats import count_of, first_record, fmt, get_stats, lookup, percent, text, total
+
+FLOOD_INFO = "daFloodDisasterStatisticsInfo"
+DAMAGE = "daWaterEngineeringDamageList"
+RESERVOIR_CLASSES = ["大(1)型", "大(2)型", "中型", "小(1)型", "小(2)型"]
+LEVEE_CLASSES = ["1级", "2级", "3级及以下"]
+# 水利工程设施受损情况第三段列出的工程类别及量词
+FACILITY_UNITS = [("水闸", "座"), ("塘坝", "座"), ("灌排设施", "处"), ("水文测站", "个"), ("机电井", "座"),
+                  ("机电泵站", "座"), ("水电站", "座"), ("淤地坝", "座"), ("人饮基础设施", "处"),
+                  ("供水工程设施", "处"), ("其他", "处")]
+
+
 def get_zhgk(params: dict):
     """_summary_ 灾情综述
 
@@ -7,28 +19,69 @@ def get_zhgk(params: dict):
     Returns:
         _type_: _description_
     """
-    result = f"{params['startdate']}至{params['enddate']}，[榆阳区]遭受严重洪涝灾害袭击。据统计，本次洪涝灾害共涉及[2]个县（市、区）、[3]个乡（镇、街道），受灾人口达[4]万人，农作物受灾面积[40]千公顷。灾害造成[5]个城镇受淹，因灾死亡[3000]人，失踪[300]人，紧急转移安置人口[50]人。本次洪涝灾害直接经济损失总计[30]亿元，其中水利工程设施直接经济损失[20]亿元。"
+    stats = get_stats(params)
+    regions = [r for r in stats["frames"][FLOOD_INFO]["region"].unique() if r]
+    area = params.get('regionName') or "、".join(regions[:3]) or "榆林市"
+
+    def v(field):
+        return fmt(total(params, FLOOD_INFO, field))
+
+    result = f"{params['startdate']}至{params['enddate']}，{area}遭受严重洪涝灾害袭击。据统计，本次洪涝灾害共涉及{v('affected_counties')}个县（市、区）、{v('affected_towns')}个乡（镇、街道），受灾人口达{v('affected_population')}万人，农作物受灾面积{v('crop_affected_area')}千公顷。灾害造成{v('flooded_towns')}个城镇受淹，因灾死亡{v('death_count')}人，失踪{v('missing_count')}人，紧急转移安置人口{v('relocated_population')}人。本次洪涝灾害直接经济损失总计{v('economic_loss')}亿元，其中水利工程设施直接经济损失{v('water_engineering_loss')}亿元。"
 
     return result
 
 
 def get_slgcssssqk(params: dict):
     """_summary_ 水利工程设施受损情况
-    
-    """
 
-    p1 = "此次洪涝灾害共造成[5]座水库不同程度受损，其中大(1)型水库[1]座、大(2)型水库[1]座、中型水库[1]座、小(1)型水库[2]座、小(2)型水库[3]座，直接经济损失合计[5000]万元。特别严重的是发生了[2]座水库垮坝事件，涉及大(1)型水库[2]座、大(2)型水库[2]座、中型水库[3]座、小(1)型水库[12]座、小(2)型水库[12]座。"
-    p2 = "洪涝灾害导致堤防设施大面积受损，共计[10]处堤防受损，其中1级堤防[2]处、2级堤防[3]处、3级及以下堤防[5]处，受损长度分别为[6]米、[60]米、[21]米，造成直接经济损失[6000]万元。更为严重的是出现了[10]处堤防决口，涉及1级堤防[4]处、2级堤防[3]处、3级及以下堤防[3]处，决口长度分别为[10]米、[5]米、[8]米。大中型护岸[12]处受损，小型护岸[12]处受损，直接经济损失[1000]万元。"    
-    p3 = "水闸设施共[5]座受损，直接损失[6]万元。塘坝工程[6]座受损，损失[3]万元。灌排设施[12]处受损，损失[1211]万元。水文测站[5]个受损，损失[12]万元。机电井[11]座受损，损失[6000]万元。机电泵站[8]座受损，损失[1600]万元。水电站[8]座受损，损失[500]万元。淤地坝[6]座受损，直接损失[1200]万元。人饮基础设施[12]处受损，直接损失[3]万元。供水工程设施[3]处受损，直接损失[5] 万元其他水利工程设施[7]处受损，损失[6000]万元。"
+    """
+    stats = get_stats(params)
+    by_category = stats["damage_by_category"]
+    reservoir = stats["reservoir_damage_by_class"]
+    levee = stats["levee_damage_by_class"]
+    revetment = stats["revetment_damage_by_class"]
+    breach = stats["reservoir_breach_by_class"]
+    levee_breach = stats["levee_breach_by_class"]
+
+    reservoir_classes = "、".join(f"{c}水库{fmt(count_of(reservoir, c))}座" for c in RESERVOIR_CLASSES)
+    breach_classes = "、".join(f"{c}水库{fmt(lookup(breach, c))}座" for c in RESERVOIR_CLASSES)
+    p1 = f"此次洪涝灾害共造成{fmt(count_of(by_category, '水库'))}座水库不同程度受损，其中{reservoir_classes}，直接经济损失合计{fmt(lookup(by_category, '水库', 'economic_loss'))}万元。特别严重的是发生了{fmt(breach.sum())}座水库垮坝事件，涉及{breach_classes}。"
+
+    levee_counts = "、".join(f"{c}堤防{fmt(count_of(levee, c))}处" for c in LEVEE_CLASSES)
+    levee_lengths = "、".join(f"{fmt(lookup(levee, c, 'damage_length'))}米" for c in LEVEE_CLASSES)
+    breach_counts = "、".join(f"{c}堤防{fmt(lookup(levee_breach, c, 'records'))}处" for c in LEVEE_CLASSES)
+    breach_widths = "、".join(f"{fmt(lookup(levee_breach, c, 'breach_width'))}米" for c in LEVEE_CLASSES)
+    p2 = f"洪涝灾害导致堤防设施大面积受损，共计{fmt(count_of(by_category, '堤防'))}处堤防受损，其中{levee_counts}，受损长度分别为{levee_lengths}，造成直接经济损失{fmt(lookup(by_category, '堤防', 'economic_loss'))}万元。更为严重的是出现了{fmt(levee_breach['records'].sum())}处堤防决口，涉及{breach_counts}，决口长度分别为{breach_widths}。大中型护岸{fmt(count_of(revetment, '大中型'))}处受损，小型护岸{fmt(count_of(revetment, '小型'))}处受损，直接经济损失{fmt(lookup(by_category, '护岸', 'economic_loss'))}万元。"
+
+    p3 = "。".join(
+        f"{name}{fmt(count_of(by_category, name))}{unit}受损，直接损失{fmt(lookup(by_category, name, 'economic_loss'))}万元"
+        for name, unit in FACILITY_UNITS
+    ) + "。"
     return p1 + "\n" + p2 + "\n "+ p3
 
 def get_zdslgcsgqk(params: dict):
     """_summary_ 重大水利工程事故详情
-    
+
     """
-    p1 = "本次洪涝灾害期间发生水库垮坝事故[10]起。其中[水库名称]位于[水系名称]，为[大型水库]，总库容[10]万立方米，[大坝类型]，坝高[10]米，由[佳县水利局]管理。该水库于[年-月-日-时]在[垮坝位置]发生垮坝，垮坝原因为[具体原因]，垮坝形式为[具体形式]，造成[10]人受灾。[其他水库垮坝情况类似描述]"
-    p2 = "洪涝灾害期间共发生堤防决口事故[10]起。[堤防名称]位于[水系名称]，为[堤防级别]，由[佳县水利局]管理。该堤防于[年-月-日-时]在[决口位置]（起始桩号[具体桩号]）发生决口，决口宽度[10]米，决口原因为[具体原因]，决口形式为[具体形式]，造成[10]人受灾。[其他堤防决口情况类似描述]"
-    p3 = "本次洪涝灾害造成较大水毁工程[10]处。[工程名称]为[工程类型]，工程级别为[具体级别]，由[佳县水利局]管理，位于[具体位置]。该工程水毁等级为[具体等级]，损毁情况为[损毁描述]，损毁原因为[具体原因]，造成直接经济损失[10]万元。[其他较大水毁工程情况类似描述]"
+    frames = get_stats(params)["frames"]
+
+    reservoir = first_record(params, "reservoirBreachRecordList")
+    if reservoir is None:
+        p1 = "本次洪涝灾害期间未发生水库垮坝事故。"
+    else:
+        p1 = f"本次洪涝灾害期间发生水库垮坝事故{len(frames['reservoirBreachRecordList'])}起。其中{text(reservoir['name'], '[水库名称]')}位于{text(reservoir['river'], '[水系名称]')}，为{text(reservoir['dam_class'], '[水库类型]')}水库，总库容{fmt(reservoir['capacity'])}万立方米，{text(reservoir['dam_type'], '[大坝类型]')}，坝高{fmt(reservoir['dam_height'])}米，由{text(reservoir['manager'], '[管理单位]')}管理。该水库于{text(reservoir['occurred_time'], '[垮坝时间]')}在{text(reservoir['location'], '[垮坝位置]')}发生垮坝，垮坝原因为{text(reservoir['cause'], '[具体原因]')}，垮坝形式为{text(reservoir['form'], '[具体形式]')}，造成{fmt(reservoir['affected_population'])}人受灾。"
+
+    levee = first_record(params, "leveeBreachRecordList")
+    if levee is None:
+        p2 = "洪涝灾害期间未发生堤防决口事故。"
+    else:
+        p2 = f"洪涝灾害期间共发生堤防决口事故{len(frames['leveeBreachRecordList'])}起。{text(levee['name'], '[堤防名称]')}位于{text(levee['river'], '[水系名称]')}，为{text(levee['levee_class'], '[堤防级别]')}堤防，由{text(levee['manager'], '[管理单位]')}管理。该堤防于{text(levee['occurred_time'], '[决口时间]')}在{text(levee['location'], '[决口位置]')}（起始桩号{text(levee['stake'], '[具体桩号]')}）发生决口，决口宽度{fmt(levee['breach_width'])}米，决口原因为{text(levee['cause'], '[具体原因]')}，决口形式为{text(levee['form'], '[具体形式]')}，造成{fmt(levee['affected_population'])}人受灾。"
+
+    damage = first_record(params, "majorWaterDamageRecordList")
+    if damage is None:
+        p3 = "本次洪涝灾害未造成较大水毁工程。"
+    else:
+        p3 = f"本次洪涝灾害造成较大水毁工程{len(frames['majorWaterDamageRecordList'])}处。{text(damage['name'], '[工程名称]')}为{text(damage['engineering_type'], '[工程类型]')}，工程级别为{text(damage['engineering_class'], '[具体级别]')}，由{text(damage['manager'], '[管理单位]')}管理，位于{text(damage['location'], '[具体位置]')}。该工程水毁等级为{text(damage['damage_level'], '[具体等级]')}，损毁情况为{text(damage['damage_desc'], '[损毁描述]')}，损毁原因为{text(damage['cause'], '[具体原因]')}，造成直接经济损失{fmt(damage['economic_loss'])}万元。"
     return p1 + "\n" + p2 + "\n "+ p3
 
 
@@ -41,19 +94,27 @@ def get_czsyqk(params: dict):
     Returns:
         _type_: _description_
     """
-    result = "洪涝灾害期间，共有[10]个城镇不同程度受淹。其中[城镇名称]受淹面积[10]平方公里，占城镇总面积的[10]%，进水时代表站水位[10]米，进水时间为[月-日-时]，淹没历时[10]小时，主要街区最大水深达[10]米。[其他受淹城镇情况类似描述]"
+    towns = get_stats(params)["frames"]["urbanFloodStatisticsList"]
+    if towns.empty:
+        return "洪涝灾害期间，未发生城镇受淹。"
+    # 以受淹面积最大的城镇为代表
+    town = towns.loc[towns["flooded_area"].idxmax()]
+    result = f"洪涝灾害期间，共有{len(towns)}个城镇不同程度受淹。其中{text(town['town'], '[城镇名称]')}受淹面积{fmt(town['flooded_area'])}平方公里，占城镇总面积的{fmt(town['flooded_ratio'])}%，进水时代表站水位{fmt(town['station_level'])}米，进水时间为{text(town['flood_time'], '[进水时间]')}，淹没历时{fmt(town['duration'])}小时，主要街区最大水深达{fmt(town['max_depth'])}米。"
     return result
 
 
 def get_khqxjszcqk(params: dict):
     """_summary_ 抗洪抢险技术支撑情况
-    
+
     Args:
         params (_type_): _description_
     """
-    p1 = "各级政府高度重视抗洪抢险工作，组织开展了大规模的巡堤查险活动，巡堤查险[10]人天。派出省级专家组[10]人天、市级[10]人天、县级[10]人天指导抢险，为抗洪抢险提供技术支撑。"
-    p2 = "省级及以下各级政府总计投入抗洪抢险资金[10]万元，其中水利救灾资金投入[10]万元，技术支撑投入[10]万元，有力保障了抗洪抢险工作的顺利开展。"   
-    p3 = "通过积极有效的防汛抗洪措施，取得了显著的防洪减灾效益。减少受灾人口[10]万人，减淹耕地[10]千公顷，避免县级以上城镇受淹[10]座，防洪减灾经济效益达[10]亿元。"
+    def v(field):
+        return fmt(total(params, "floodResponseTechSupportList", field))
+
+    p1 = f"各级政府高度重视抗洪抢险工作，组织开展了大规模的巡堤查险活动，巡堤查险{v('patrol_person_days')}人天。派出省级专家组{v('provincial_expert_days')}人天、市级{v('city_expert_days')}人天、县级{v('county_expert_days')}人天指导抢险，为抗洪抢险提供技术支撑。"
+    p2 = f"省级及以下各级政府总计投入抗洪抢险资金{v('total_funds')}万元，其中水利救灾资金投入{v('relief_funds')}万元，技术支撑投入{v('tech_funds')}万元，有力保障了抗洪抢险工作的顺利开展。"
+    p3 = f"通过积极有效的防汛抗洪措施，取得了显著的防洪减灾效益。减少受灾人口{v('reduced_population')}万人，减淹耕地{v('reduced_flooded_area')}千公顷，避免县级以上城镇受淹{v('avoided_towns')}座，防洪减灾经济效益达{v('benefit')}亿元。"
     return p1 + "\n" + p2 + "\n "+ p3
 
 
@@ -65,8 +126,18 @@ def get_shzhfyqk(params: dict):
     Returns:
         _type_: _description_
     """
-    p1 = "山洪灾害防御期间，共有[10]个县发布山洪灾害预警，发布山洪灾害预警[10]次，发布预警[10]次。向责任人发布预警短信[10]万条，向社会公众发布预警短信[10]万条，启动预警广播[10]站次，预警发布服务人数达[10]人，成功转移人口[10]万人。"
-    p2 = "本次洪涝灾害期间共发生山洪灾害事件[10]起。[发生时间：年-月-日-时]在[县（市、区）-乡（镇、街道）-村（社区）]发生山洪灾害，造成死亡[10]人，失踪[10]人。当时实测降雨量为1小时[10]毫米、3小时[10]毫米、6小时[10]毫米、24小时[10]毫米，灾害类型为[灾害类型]，[是]发布预警。该事件造成受灾人口[10]人，倒塌房屋[10]间，直接经济损失[10]万元。[暂无]"   
+    def v(field):
+        return fmt(total(params, "mountainFloodDefenseList", field))
+
+    p1 = f"山洪灾害防御期间，共有{v('warning_counties')}个县发布山洪灾害预警，发布山洪灾害预警{v('warnings')}次。向责任人发布预警短信{v('sms_officials')}万条，向社会公众发布预警短信{v('sms_public')}万条，启动预警广播{v('broadcasts')}站次，预警发布服务人数达{v('served_population')}人，成功转移人口{v('transferred_population')}万人。"
+
+    events = get_stats(params)["frames"]["mountainFloodEventList"]
+    event = first_record(params, "mountainFloodEventList")
+    if event is None:
+        p2 = "本次洪涝灾害期间未发生山洪灾害事件。"
+    else:
+        location = "-".join(part for part in (event['county'], event['town'], event['village']) if part) or "[发生地点]"
+        p2 = f"本次洪涝灾害期间共发生山洪灾害事件{len(events)}起。{text(event['occurred_time'], '[发生时间]')}在{location}发生山洪灾害，造成死亡{fmt(event['death_count'])}人，失踪{fmt(event['missing_count'])}人。当时实测降雨量为1小时{fmt(event['rain_1h'])}毫米、3小时{fmt(event['rain_3h'])}毫米、6小时{fmt(event['rain_6h'])}毫米、24小时{fmt(event['rain_24h'])}毫米，灾害类型为{text(event['disaster_type'], '[灾害类型]')}，{text(event['alert'], '[是否]')}发布预警。该事件造成受灾人口{fmt(event['affected_population'])}人，倒塌房屋{fmt(event['collapsed_homes'])}间，直接经济损失{fmt(event['economic_loss'])}万元。"
     return p1 + "\n" + p2
 
 def get_zdszdqfx(params: dict):
@@ -78,5 +149,15 @@ def get_zdszdqfx(params: dict):
     Returns:
         _type_: _description_
     """
-    result = "根据统计数据分析，[地区名称]、[地区名称]、[地区名称]等地区受灾相对较重。其中[地区名称]受损[设施类型][10]座（处），损失[10]万元，占该地区水利设施损失的[10]%；[地区名称]受损[设施类型][10]座（处），损失[10]万元，占该地区水利设施损失的[10]%。[地区名称][具体受损情况]受损[10]处，损失[10]万元，占该地区水利设施损失的[10]%。"
+    stats = get_stats(params)
+    region_loss = stats["region_loss"]
+    top = stats["region_top_category"]
+    regions = [r for r in region_loss.index if r][:3]
+    if not regions:
+        return "根据统计数据分析，暂无各地区水利设施受损数据。"
+    details = "；".join(
+        f"{region}受损{top.loc[region, 'category']}{fmt(count_of(top, region))}座（处），损失{fmt(top.loc[region, 'economic_loss'])}万元，占该地区水利设施损失的{percent(top.loc[region, 'share'])}%"
+        for region in regions
+    )
+    result = f"根据统计数据分析，{'、'.join(regions)}等地区受灾相对较重。其中{details}。"
     return result
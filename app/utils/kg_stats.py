@@ -0,0 +1,378 @@
+# kg_stats.py
+"""
+灾情评估报告统计层
+
+把 template.json 中的各类台账列表一次性转换为 pandas DataFrame，按地区、工程类别、
+工程规模（水库类型、堤防级别）分组汇总，kg_flood / kg_drought 各段文字直接读取汇总结果。
+
+台账字段名以接口实际返回为准，这里为每个统计项列出候选字段名，取第一个存在的列；
+数值列统一转为数字（无法解析的记为0），缺失的列按0（文本列按空字符串）处理。
+数值单位按报告模板中的单位填报，不做换算。
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# 统计结果缓存在 params 中的键，同一份报告数据只计算一次
+STATS_KEY = "_kg_stats"
+
+REGION = ("text", ("regionName", "locationCounty", "countyName", "county"))
+MANAGER = ("text", ("managementUnit", "manageUnit", "managementUnitName", "managementAgency"))
+RIVER = ("text", ("riverSystem", "riverName", "waterSystem", "basinName"))
+CAUSE = ("text", ("breachCause", "breachReason", "damageCause", "damageReason", "cause"))
+AFFECTED_POPULATION = ("num", ("affectedPopulation", "affectedPeople"))
+ECONOMIC_LOSS = ("num", ("directEconomicLoss", "economicLoss", "loss"))
+DRINKING_POPULATION = ("num", ("drinkingDifficultyPopulation", "drinkingWaterDifficultyPopulation"))
+DRINKING_LIVESTOCK = ("num", ("drinkingDifficultyLivestock", "drinkingWaterDifficultyLivestock"))
+
+# 台账列表 -> {统计项: (类型, 候选字段名)}
+FIELD_SPECS: Dict[str, Dict[str, Tuple[str, Tuple[str, ...]]]] = {
+    "daFloodDisasterStatisticsInfo": {
+        "region": REGION,
+        "affected_counties": ("num", ("affectedCounties", "affectedCountyCount")),
+        "affected_towns": ("num", ("affectedTownships", "affectedTowns", "affectedTownCount")),
+        "affected_population": AFFECTED_POPULATION,
+        "crop_affected_area": ("num", ("cropAffectedArea", "affectedCropArea")),
+        "flooded_towns": ("num", ("floodedTowns", "floodedCityCount", "inundatedTowns")),
+        "death_count": ("num", ("deathCount", "deaths")),
+        "missing_count": ("num", ("missingCount", "missing")),
+        "relocated_population": ("num", ("relocatedPopulation", "evacuatedPopulation", "transferredPopulation")),
+        "economic_loss": ECONOMIC_LOSS,
+        "water_engineering_loss": ("num", ("waterEngineeringLoss", "waterConservancyLoss")),
+    },
+    "daWaterEngineeringDamageList": {
+        "region": REGION,
+        "engineering_type": ("text", ("engineeringType", "projectType", "facilityType", "engineeringName")),
+        "engineering_class": ("text", ("engineeringGrade", "engineeringScale", "reservoirType", "leveeGrade", "grade", "scale")),
+        "damage_count": ("num", ("damageCount", "damagedCount", "count", "quantity")),
+        "damage_length": ("num", ("damageLength", "damagedLength", "length")),
+        "economic_loss": ECONOMIC_LOSS,
+    },
+    "reservoirBreachRecordList": {
+        "region": REGION,
+        "name": ("text", ("reservoirName", "name")),
+        "river": RIVER,
+        "dam_class": ("text", ("reservoirType", "reservoirScale", "damClass", "scale")),
+        "capacity": ("num", ("totalCapacity", "totalStorage", "capacity")),
+        "dam_type": ("text", ("damType",)),
+        "dam_height": ("num", ("damHeight",)),
+        "manager": MANAGER,
+        "occurred_time": ("text", ("breachTime", "occurredTime")),
+        "location": ("text", ("breachLocation", "location")),
+        "cause": CAUSE,
+        "form": ("text", ("breachForm", "breachMode", "breachType")),
+        "affected_population": AFFECTED_POPULATION,
+    },
+    "leveeBreachRecordList": {
+        "region": REGION,
+        "name": ("text", ("leveeName", "name")),
+        "river": RIVER,
+        "levee_class": ("text", ("leveeGrade", "leveeLevel", "leveeClass", "grade")),
+        "manager": MANAGER,
+        "occurred_time": ("text", ("breachTime", "occurredTime")),
+        "location": ("text", ("breachLocation", "location")),
+        "stake": ("text", ("startStake", "startPileNumber", "stakeNumber")),
+        "breach_width": ("num", ("breachWidth", "breachLength", "width")),
+        "cause": CAUSE,
+        "form": ("text", ("breachForm", "breachMode", "breachType")),
+        "affected_population": AFFECTED_POPULATION,
+    },
+    "majorWaterDamageRecordList": {
+        "region": REGION,
+        "name": ("text", ("engineeringName", "projectName", "name")),
+        "engineering_type": ("text", ("engineeringType", "projectType")),
+        "engineering_class": ("text", ("engineeringGrade", "engineeringLevel", "grade")),
+        "manager": MANAGER,
+        "location": ("text", ("location", "address")),
+        "damage_level": ("text", ("damageLevel", "damageGrade")),
+        "damage_desc": ("text", ("damageDescription", "damageSituation", "damageDesc")),
+        "cause": CAUSE,
+        "economic_loss": ECONOMIC_LOSS,
+    },
+    "urbanFloodStatisticsList": {
+        "region": REGION,
+        "town": ("text", ("townName", "cityName", "name")),
+        "flooded_area": ("num", ("floodedArea", "inundatedArea")),
+        "flooded_ratio": ("num", ("floodedAreaRatio", "inundatedRatio", "floodedRatio")),
+        "station_level": ("num", ("stationWaterLevel", "representativeStationLevel", "waterLevel")),
+        "flood_time": ("text", ("floodTime", "inundationTime", "occurredTime")),
+        "duration": ("num", ("floodDuration", "inundationDuration", "duration")),
+        "max_depth": ("num", ("maxWaterDepth", "maxDepth")),
+    },
+    "floodResponseTechSupportList": {
+        "region": REGION,
+        "patrol_person_days": ("num", ("patrolPersonDays", "leveePatrolPersonDays")),
+        "provincial_expert_days": ("num", ("provincialExpertDays", "provincialExpertPersonDays")),
+        "city_expert_days": ("num", ("cityExpertDays", "municipalExpertDays", "cityExpertPersonDays")),
+        "county_expert_days": ("num", ("countyExpertDays", "countyExpertPersonDays")),
+        "total_funds": ("num", ("totalFunds", "rescueFunds", "totalInvestment")),
+        "relief_funds": ("num", ("waterReliefFunds", "reliefFunds")),
+        "tech_funds": ("num", ("techSupportFunds", "technicalSupportFunds")),
+        "reduced_population": ("num", ("reducedAffectedPopulation", "reducedPopulation")),
+        "reduced_flooded_area": ("num", ("reducedFloodedFarmland", "reducedFloodedArea")),
+        "avoided_towns": ("num", ("avoidedFloodedTowns", "avoidedTowns")),
+        "benefit": ("num", ("floodControlBenefit", "disasterReductionBenefit", "benefit")),
+    },
+    "mountainFloodDefenseList": {
+        "region": REGION,
+        "warning_counties": ("num", ("warningCounties", "warningCountyCount")),
+        "warnings": ("num", ("warningCount", "warningTimes")),
+        "sms_officials": ("num", ("smsToOfficials", "warningSmsToResponsible")),
+        "sms_public": ("num", ("smsToPublic", "warningSmsToPublic")),
+        "broadcasts": ("num", ("broadcastStations", "warningBroadcastCount")),
+        "served_population": ("num", ("servedPopulation", "warningServedPopulation")),
+        "transferred_population": ("num", ("transferredPopulation", "relocatedPopulation")),
+    },
+    "mountainFloodEventList": {
+        "region": REGION,
+        "county": ("text", ("locationCounty",)),
+        "town": ("text", ("locationTown", "township")),
+        "village": ("text", ("locationVillage", "village")),
+        "occurred_time": ("text", ("occurredTime",)),
+        "death_count": ("num", ("deathCount",)),
+        "missing_count": ("num", ("missingCount",)),
+        "rain_1h": ("num", ("maxRainfall1h",)),
+        "rain_3h": ("num", ("maxRainfall3h",)),
+        "rain_6h": ("num", ("maxRainfall6h",)),
+        "rain_24h": ("num", ("maxRainfall24h",)),
+        "disaster_type": ("text", ("disasterType",)),
+        "alert": ("text", ("isAlertIssued",)),
+        "affected_population": AFFECTED_POPULATION,
+        "collapsed_homes": ("num", ("collapsedHomes",)),
+        "economic_loss": ECONOMIC_LOSS,
+    },
+    "agriDisasterDroughtResistList": {
+        "region": REGION,
+        "sown_area": ("num", ("sownArea", "totalSownArea")),
+        "grain_sown_area": ("num", ("grainSownArea", "grainCropArea")),
+        "cash_sown_area": ("num", ("cashCropSownArea", "economicCropArea")),
+        "drought_area": ("num", ("cropDroughtArea", "droughtAffectedArea")),
+        "affected_area": ("num", ("cropAffectedArea", "affectedArea")),
+        "disaster_area": ("num", ("cropDisasterArea", "disasterArea")),
+        "failure_area": ("num", ("cropFailureArea", "failureArea")),
+        "drinking_population": DRINKING_POPULATION,
+        "drinking_livestock": DRINKING_LIVESTOCK,
+        "grain_output": ("num", ("grainOutput", "totalGrainOutput")),
+        "grain_loss": ("num", ("grainLoss", "droughtGrainLoss")),
+        "cash_crop_loss": ("num", ("cashCropLoss", "economicCropLoss")),
+        "resist_population": ("num", ("droughtResistPopulation", "investedPopulation")),
+        "wells": ("num", ("wellCount", "electromechanicalWells")),
+        "pumps": ("num", ("pumpStations", "pumpStationCount")),
+        "equipment": ("num", ("mobileEquipment", "mobileDroughtEquipment")),
+        "vehicles": ("num", ("waterTransportVehicles", "mobileWaterVehicles")),
+        "funds": ("num", ("droughtResistFunds", "totalFunds")),
+        "central_funds": ("num", ("centralFunds",)),
+        "local_funds": ("num", ("localFinanceFunds", "financeFunds")),
+        "irrigated_area": ("num", ("irrigatedArea", "droughtIrrigationArea")),
+        "irrigation_times": ("num", ("irrigationTimes", "irrigationAreaTimes")),
+        "solved_population": ("num", ("solvedDrinkingPopulation",)),
+        "solved_livestock": ("num", ("solvedDrinkingLivestock",)),
+        "temp_solved_population": ("num", ("tempSolvedDrinkingPopulation",)),
+        "temp_solved_livestock": ("num", ("tempSolvedDrinkingLivestock",)),
+        "benefit": ("num", ("droughtReliefBenefit", "benefit")),
+        "recovered_grain": ("num", ("recoveredGrainLoss",)),
+        "recovered_cash": ("num", ("recoveredCashCropLoss",)),
+    },
+    "agriDroughtResistList": {
+        "region": REGION,
+        "resist_population": ("num", ("droughtResistPopulation", "investedPopulation")),
+        "wells": ("num", ("wellCount", "electromechanicalWells")),
+        "pumps": ("num", ("pumpStations", "pumpStationCount")),
+        "equipment": ("num", ("mobileEquipment", "mobileDroughtEquipment")),
+        "installed_capacity": ("num", ("installedCapacity",)),
+        "vehicles": ("num", ("waterTransportVehicles", "mobileWaterVehicles")),
+        "funds": ("num", ("droughtResistFunds", "totalFunds")),
+        "central_funds": ("num", ("centralFunds",)),
+        "provincial_funds": ("num", ("provincialFunds",)),
+        "local_funds": ("num", ("cityCountyFunds", "localFunds")),
+        "self_raised_funds": ("num", ("selfRaisedFunds", "massSelfRaisedFunds")),
+        "electricity": ("num", ("droughtElectricity", "electricityUsage")),
+        "oil": ("num", ("droughtOil", "oilUsage")),
+    },
+    "agriDroughtDynamicList": {
+        "region": REGION,
+        "season_sown_area": ("num", ("seasonSownArea", "actualSownArea")),
+        "max_drought_area": ("num", ("maxDroughtArea",)),
+        "drought_area": ("num", ("currentDroughtArea", "droughtArea")),
+        "light_area": ("num", ("lightDroughtArea",)),
+        "moderate_area": ("num", ("moderateDroughtArea",)),
+        "severe_area": ("num", ("severeDroughtArea",)),
+        "extreme_area": ("num", ("extremeDroughtArea",)),
+        "dried_area": ("num", ("driedArea", "witheredArea")),
+        "field_crop_area": ("num", ("fieldCropArea", "inFieldCropArea")),
+        "no_resist_area": ("num", ("noResistConditionArea",)),
+        "paddy_shortage": ("num", ("paddyWaterShortageArea", "paddyShortage")),
+        "dryland_shortage": ("num", ("drylandMoistureShortageArea", "drylandShortage")),
+        "pasture_area": ("num", ("pastoralDroughtArea", "pastureDroughtArea")),
+        "drinking_population": DRINKING_POPULATION,
+        "drinking_livestock": DRINKING_LIVESTOCK,
+        "storage": ("num", ("waterStorage", "totalStorage")),
+        "storage_change": ("num", ("storageChangeRate", "storageChange")),
+        "dry_rivers": ("num", ("driedRivers", "cutoffRivers")),
+        "dry_reservoirs": ("num", ("driedReservoirs",)),
+        "short_wells": ("num", ("insufficientWells",)),
+    },
+}
+
+# 水利工程类别（按工程类型名称匹配，先匹配先得）
+ENGINEERING_CATEGORIES = [
+    ("水库", "水库"), ("堤防", "堤防|堤坝"), ("护岸", "护岸"), ("水闸", "水闸"), ("塘坝", "塘坝"),
+    ("灌排设施", "灌排|灌溉|排水"), ("水文测站", "水文|测站"), ("机电井", "机电井|机井"), ("机电泵站", "泵站"),
+    ("水电站", "水电站"), ("淤地坝", "淤地坝"), ("人饮基础设施", "人饮"), ("供水工程设施", "供水"),
+]
+RESERVOIR_CLASSES = [("大(1)型", r"大\(1\)|大1|大一"), ("大(2)型", r"大\(2\)|大2|大二"), ("中型", "中"),
+                     ("小(1)型", r"小\(1\)|小1|小一"), ("小(2)型", r"小\(2\)|小2|小二")]
+LEVEE_CLASSES = [("1级", "^1|一"), ("2级", "^2|二")]
+
+
+def build_frame(records: Optional[List[dict]], spec: Dict[str, Tuple[str, Tuple[str, ...]]]) -> pd.DataFrame:
+    """把一个台账列表转换为列名统一的 DataFrame"""
+    raw = pd.DataFrame.from_records([r for r in (records or []) if isinstance(r, dict)])
+    frame = pd.DataFrame(index=raw.index)
+    for field, (kind, candidates) in spec.items():
+        column = next((c for c in candidates if c in raw.columns), None)
+        if kind == "num":
+            frame[field] = (pd.to_numeric(raw[column], errors="coerce").fillna(0.0)
+                            if column is not None else 0.0)
+        else:
+            frame[field] = map_unique(raw[column].fillna("").astype(str), lambda u: u.str.strip()) if column is not None else ""
+    return frame
+
+
+def map_unique(series: pd.Series, func) -> pd.Series:
+    """
+    文本列取值种类很少（地区、工程类型、级别），只对去重后的取值做字符串处理，
+    再按编码映射回整列
+    """
+    codes, uniques = pd.factorize(series)
+    if not len(uniques):
+        return pd.Series("", index=series.index, dtype=object)
+    mapped = np.asarray(func(pd.Series(uniques, dtype=object)), dtype=object)
+    return pd.Series(mapped[codes], index=series.index)
+
+
+def classify(series: pd.Series, rules: List[Tuple[str, str]], default: Optional[str] = None) -> pd.Series:
+    """按正则规则把文本列映射为类别（先匹配先得），default 为 None 时不匹配的保留原值"""
+    def label(values: pd.Series):
+        text = values.str.replace("（", "(", regex=False).str.replace("）", ")", regex=False)
+        conditions = [text.str.contains(pattern, regex=True) for _, pattern in rules]
+        return np.select(conditions, [label for label, _ in rules], values if default is None else default)
+
+    return map_unique(series, label)
+
+
+def group_sum(frame: pd.DataFrame, by, columns: List[str]) -> pd.DataFrame:
+    """按列分组求和并附加记录数"""
+    grouped = frame.groupby(by)[columns].sum()
+    grouped["records"] = frame.groupby(by).size()
+    return grouped
+
+
+def compute_stats(params: dict) -> dict:
+    """一次性构建各台账的 DataFrame 并计算报告所需的全部汇总"""
+    frames = {key: build_frame(params.get(key), spec) for key, spec in FIELD_SPECS.items()}
+    # 每个台账所有数值列的合计
+    totals = {
+        key: frame.select_dtypes("number").sum()
+        for key, frame in frames.items()
+    }
+
+    damage = frames["daWaterEngineeringDamageList"]
+    damage["category"] = classify(damage["engineering_type"], ENGINEERING_CATEGORIES, "其他")
+    damage["reservoir_class"] = classify(damage["engineering_class"], RESERVOIR_CLASSES, "")
+    damage["levee_class"] = classify(damage["engineering_class"], LEVEE_CLASSES, "3级及以下")
+    damage["revetment_class"] = np.where(damage["engineering_class"].str.contains("小"), "小型", "大中型")
+    value_columns = ["damage_count", "damage_length", "economic_loss"]
+
+    reservoirs = frames["reservoirBreachRecordList"]
+    reservoirs["dam_class"] = classify(reservoirs["dam_class"], RESERVOIR_CLASSES)
+    levees = frames["leveeBreachRecordList"]
+    levees["levee_class"] = classify(levees["levee_class"], LEVEE_CLASSES, "3级及以下")
+
+    # 重点受灾地区：按地区汇总水利设施损失，并给出各地区损失最大的工程类别及占比
+    region_loss = damage.groupby("region")["economic_loss"].sum().sort_values(ascending=False)
+    region_category = group_sum(damage, ["region", "category"], value_columns).reset_index()
+    region_category["share"] = (
+        region_category["economic_loss"]
+        / region_category["region"].map(region_loss).replace(0, np.nan)
+    ).fillna(0.0)
+    # “其他”类别不作为地区的主要受损类别，地区只有“其他”类别时才取它
+    region_category["is_other"] = region_category["category"] == "其他"
+    top_category = (region_category.sort_values(["is_other", "economic_loss"], ascending=[True, False])
+                     .drop_duplicates("region").drop(columns="is_other").set_index("region"))
+
+    drought = frames["agriDroughtDynamicList"]
+    drought_regions = group_sum(
+        drought, "region", ["drought_area", "drinking_population", "pasture_area", "drinking_livestock"]
+    ).sort_values("drought_area", ascending=False)
+    agri = frames["agriDisasterDroughtResistList"]
+    agri_regions = group_sum(
+        agri, "region", ["drought_area", "disaster_area", "failure_area", "grain_loss", "funds", "drinking_population"]
+    )
+
+    return {
+        "frames": frames,
+        "totals": totals,
+        "damage_by_category": group_sum(damage, "category", value_columns),
+        "reservoir_damage_by_class": group_sum(damage[damage["category"] == "水库"], "reservoir_class", value_columns),
+        "levee_damage_by_class": group_sum(damage[damage["category"] == "堤防"], "levee_class", value_columns),
+        "revetment_damage_by_class": group_sum(damage[damage["category"] == "护岸"], "revetment_class", value_columns),
+        "reservoir_breach_by_class": reservoirs["dam_class"].value_counts(),
+        "levee_breach_by_class": group_sum(levees, "levee_class", ["breach_width"]),
+        "region_loss": region_loss,
+        "region_top_category": top_category,
+        "drought_regions": drought_regions,
+        "agri_regions": agri_regions,
+    }
+
+
+def get_stats(params: dict) -> dict:
+    """取报告数据的统计结果，首次调用时计算并缓存在 params 中"""
+    stats = params.get(STATS_KEY)
+    if stats is None:
+        stats = compute_stats(params)
+        params[STATS_KEY] = stats
+    return stats
+
+
+def total(params: dict, list_key: str, field: str) -> float:
+    """某台账某数值统计项的合计，缺失时为0"""
+    return float(get_stats(params)["totals"][list_key].get(field, 0.0))
+
+
+def lookup(table, key, column: Optional[str] = None) -> float:
+    """从分组结果中取值，分组不存在时为0"""
+    if key not in table.index or (column is not None and column not in table.columns):
+        return 0.0
+    value = table.loc[key] if column is None else table.loc[key, column]
+    return float(value)
+
+
+def count_of(table, key) -> int:
+    """分组的数量（座、处等，取整）：有填报数量时取数量合计，否则取记录数"""
+    count = lookup(table, key, "damage_count") if "damage_count" in table.columns else 0.0
+    return int(round(count or lookup(table, key, "records")))
+
+
+def fmt(value, digits: int = 2):
+    """数字转为报告中的写法：整数不带小数点，其余最多保留两位小数"""
+    value = 0.0 if value is None or pd.isna(value) else float(value)
+    if value.is_integer():
+        return int(value)
+    return float(f"{value:.{digits}f}")
+
+
+def percent(value) -> str:
+    return f"{fmt(value * 100, 1)}"
+
+
+def first_record(params: dict, list_key: str) -> Optional[pd.Series]:
+    frame = get_stats(params)["frames"][list_key]
+    return frame.iloc[0] if len(frame) else None
+
+
+def text(value, placeholder: str) -> str:
+    """文本字段为空时使用占位说明"""
+    value = str(value).strip() if value is not None else ""
+    return value or placeholder
@@ -0,0 +1,187 @@
+# mineru_utils.py
+import json
+import logging
+from itertools import groupby
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from config import FRAGMENT_MERGE_LEVEL
+
+import ijson
+
+logger = logging.getLogger(__name__)
+
+
+def iter_middle_json_pages(middle_json_path: str) -> Iterator[dict]:
+    """
+    逐页读取 MinerU 生成的 *_middle.json 中的 pdf_info
+
+    使用 ijson 增量解析，内存中同时只保留一页的数据
+    """
+    with open(middle_json_path, 'rb') as f:
+        yield from ijson.items(f, 'pdf_info.item', use_float=True)
+
+
+def get_pdf_page_count(pdf_path: str) -> Optional[int]:
+    """读取PDF页数（pypdfium2 随 MinerU 一起安装），无法读取时返回 None"""
+    try:
+        import pypdfium2
+    except ImportError:
+        logger.warning("未安装pypdfium2，无法获取PDF页数")
+        return None
+    try:
+        pdf = pypdfium2.PdfDocument(pdf_path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    except Exception as e:
+        logger.warning(f"读取PDF页数失败 {pdf_path}: {str(e)}")
+        return None
+
+
+def merge_middle_json(shards: List[Tuple[int, str]], output_path: str) -> int:
+    """
+    按页码范围分片解析后，合并各分片的 middle.json
+
+    参数:
+        shards: (起始页, 分片middle.json路径) 列表
+        output_path: 合并后的 middle.json 路径
+
+    返回:
+        合并后的总页数；各分片逐页流式写出，page_idx 改写为全局页码
+    """
+    total_pages = 0
+    with open(output_path, 'w', encoding='utf-8') as out:
+        out.write('{"pdf_info": [')
+        for start_page, shard_path in sorted(shards):
+            for local_idx, page in enumerate(iter_middle_json_pages(shard_path)):
+                page['page_idx'] = start_page + local_idx
+                if total_pages:
+                    out.write(',')
+                json.dump(page, out, ensure_ascii=False)
+                total_pages += 1
+        out.write(']}')
+    return total_pages
+
+
+def extract_page_fragments(page: dict) -> List[dict]:
+    """提取单页中所有非空span（无span的行取行内容）作为片段"""
+    fragments = []
+    page_idx = page.get('page_idx', 0)
+
+    # 优先处理 preproc_blocks
+    blocks = page.get('preproc_blocks', [])
+    if not blocks:
+        # 如果没有 preproc_blocks，尝试使用 para_blocks
+        blocks = page.get('para_blocks', [])
+
+    for block_idx, block in enumerate(blocks):
+        block_id = f"p{page_idx}_b{block_idx}"
+
+        # 处理区块中的行
+        for line_idx, line in enumerate(block.get('lines', [])):
+            line_id = f"{block_id}_l{line_idx}"
+            spans = line.get('spans', [])
+
+            # 如果行内没有span，尝试从行对象直接提取内容
+            if not spans:
+                content = line.get('content', '')
+                if content:
+                    fragments.append({
+                        "page_idx": page_idx,
+                        "content": content,
+                        "bbox": line.get('bbox', []),
+                        "block_id": block_id,
+                        "line_id": line_id,
+                        "span_id": f"{line_id}_s0"
+                    })
+                continue
+
+            # 处理行内的每个span
+            for span_idx, span in enumerate(spans):
+                content = span.get('content', '')
+                if content:
+                    fragments.append({
+                        "page_idx": page_idx,
+                        "content": content,
+                        "bbox": span.get('bbox', []),
+                        "block_id": block_id,
+                        "line_id": line_id,
+                        "span_id": f"{line_id}_s{span_idx}"
+                    })
+    return fragments
+
+
+def iter_page_fragments(middle_json_path: str) -> Iterator[Tuple[int, List[dict]]]:
+    """逐页产出 (page_idx, 片段列表)，供索引端按页消费"""
+    for page in iter_middle_json_pages(middle_json_path):
+        yield page.get('page_idx', 0), extract_page_fragments(page)
+
+
+def union_bbox(bboxes: Iterable[List[float]]) -> List[float]:
+    """计算多个 bbox 的外接矩形"""
+    valid = [b for b in bboxes if b and len(b) == 4]
+    if not valid:
+        return []
+    return [
+        min(b[0] for b in valid),
+        min(b[1] for b in valid),
+        max(b[2] for b in valid),
+        max(b[3] for b in valid)
+    ]
+
+
+def _needs_space(left: str, right: str) -> bool:
+    """两段西文/数字相接时补空格，中文直接拼接"""
+    return bool(left) and bool(right) and left[-1].isascii() and left[-1].isalnum() \
+        and right[0].isascii() and right[0].isalnum()
+
+
+def merge_fragments(fragments: List[dict], level: str = FRAGMENT_MERGE_LEVEL) -> List[dict]:
+    """
+    将span级片段合并为行级或块级片段
+
+    参数:
+        fragments: extract_page_fragments 产出的span级片段（同一页，按阅读顺序）
+        level: span（不合并）/ line（按行合并）/ block（按块合并）
+
+    返回:
+        合并后的片段，bbox 为外接矩形，spans 记录每个原始span在 content 中的偏移，
+        用于把高亮位置映射回页面上的精确坐标
+    """
+    if level not in ("line", "block"):
+        return fragments
+
+    key = "line_id" if level == "line" else "block_id"
+    merged = []
+    for _, group in groupby(fragments, key=lambda frag: (frag.get('page_idx'), frag.get(key))):
+        group = list(group)
+        content = ""
+        spans = []
+        previous_line = None
+        for frag in group:
+            text = frag['content']
+            # 换行处按需补空格，行内span直接拼接
+            if previous_line is not None and frag.get('line_id') != previous_line and _needs_space(content, text):
+                content += " "
+            start = len(content)
+            content += text
+            spans.append({
+                "span_id": frag.get('span_id'),
+                "start": start,
+                "end": len(content),
+                "bbox": frag.get('bbox', [])
+            })
+            previous_line = frag.get('line_id')
+
+        first = group[0]
+        merged.append({
+            "page_idx": first.get('page_idx', 0),
+            "content": content,
+            "bbox": union_bbox(frag.get('bbox') for frag in group),
+            "block_id": first.get('block_id'),
+            "line_id": first.get('line_id'),
+            "span_id": first.get('span_id'),
+            "spans": spans
+        })
+    return merged
@@ -0,0 +1,133 @@
+# parse_cache.py
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Optional
+
+from config import PARSE_CACHE_DIR, PARSE_CACHE_MAX_BYTES, PARSE_CACHE_MIN_AGE
+
+logger = logging.getLogger(__name__)
+
+MIDDLE_JSON_NAME = "middle.json"
+
+# 淘汰过程串行执行，避免多个线程同时删除同一目录；固定/释放条目也在此锁内进行
+_evict_lock = threading.Lock()
+# 本进程正在使用的缓存条目（键 -> 引用计数），淘汰时跳过
+_pinned: Dict[str, int] = {}
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """分块计算文件的sha256，不把整个文件读入内存"""
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def parse_cache_key(file_hash: str, mineru_version: str, mode: str) -> str:
+    """缓存键：文件内容哈希 + MinerU版本/模式，版本或模式变化时自动重新解析"""
+    variant = hashlib.sha1(f"{mineru_version}|{mode}".encode("utf-8")).hexdigest()[:12]
+    return f"{file_hash}_{variant}"
+
+
+def pin_cache_entry(key: str):
+    """标记条目正在使用（查找缓存之前调用），用完后调用 unpin_cache_entry"""
+    with _evict_lock:
+        _pinned[key] = _pinned.get(key, 0) + 1
+
+
+def unpin_cache_entry(key: str):
+    with _evict_lock:
+        count = _pinned.get(key, 0) - 1
+        if count > 0:
+            _pinned[key] = count
+        else:
+            _pinned.pop(key, None)
+
+
+def get_cached_middle_json(key: str) -> Optional[str]:
+    """命中时返回缓存的 middle.json 路径，并刷新访问时间用于LRU淘汰"""
+    entry_dir = os.path.join(PARSE_CACHE_DIR, key)
+    middle_json = os.path.join(entry_dir, MIDDLE_JSON_NAME)
+    if not os.path.exists(middle_json):
+        return None
+    try:
+        os.utime(entry_dir)
+    except OSError:
+        pass
+    return middle_json
+
+
+def store_middle_json(key: str, source_path: str) -> str:
+    """
+    将 MinerU 输出的 middle.json 移入缓存目录
+
+    先写入临时目录再整体重命名，其他进程不会读到写了一半的文件
+    """
+    os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+    entry_dir = os.path.join(PARSE_CACHE_DIR, key)
+    tmp_dir = os.path.join(PARSE_CACHE_DIR, f".tmp_{key}_{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+    shutil.move(source_path, os.path.join(tmp_dir, MIDDLE_JSON_NAME))
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        # 其他进程已写入同一条目，保留已有结果
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    evict_parse_cache(exclude=(key,))
+    return os.path.join(entry_dir, MIDDLE_JSON_NAME)
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def evict_parse_cache(max_bytes: int = PARSE_CACHE_MAX_BYTES, exclude: Iterable[str] = (),
+                      min_age: float = PARSE_CACHE_MIN_AGE) -> int:
+    """
+    超出磁盘预算时按最近使用时间从旧到新删除缓存条目，返回删除的条目数
+
+    exclude 中的条目、本进程正在使用的条目以及最近 min_age 秒内写入或命中过的条目不删除
+    """
+    if not os.path.isdir(PARSE_CACHE_DIR):
+        return 0
+    protected_after = time.time() - min_age
+    with _evict_lock:
+        skip = set(exclude) | set(_pinned)
+        entries = []
+        total = 0
+        for name in os.listdir(PARSE_CACHE_DIR):
+            path = os.path.join(PARSE_CACHE_DIR, name)
+            if name.startswith(".tmp_") or not os.path.isdir(path):
+                continue
+            try:
+                mtime, size = os.path.getmtime(path), _dir_size(path)
+            except OSError:
+                continue
+            # 不可删除的条目也计入占用
+            total += size
+            if name not in skip and mtime < protected_after:
+                entries.append((mtime, size, path))
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"解析缓存超出预算，已淘汰 {removed} 个条目")
+        return removed
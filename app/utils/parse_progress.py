@@ -0,0 +1,156 @@
+# parse_progress.py
+import logging
+import re
+import time
+from typing import Dict, List, Optional
+
+from app.utils.cache_utils import create_cache
+from config import PARSE_PROGRESS_BACKEND, PARSE_PROGRESS_TTL
+
+logger = logging.getLogger(__name__)
+
+# 每个文档一个哈希（键 "doc:{document_id}"），每个 MinerU 进程（分片）一个字段，
+# 字段为 "" 或 "{起始页}-{结束页}"；另用 "documents" 哈希记录有进度的文档，查询全部时不扫描键空间
+progress_store = create_cache(
+    "parse_progress", maxsize=4096, ttl=PARSE_PROGRESS_TTL, backend=PARSE_PROGRESS_BACKEND
+)
+DOCUMENTS_KEY = "documents"
+
+# tqdm 进度行，例如 "Processing pages:  40%|████      | 20/50 [00:10<00:15,  2.00it/s]"
+PROGRESS_PATTERN = re.compile(r'(?:(?P<stage>[^|:]+):\s*)?\d+%\|[^|]*\|\s*(?P<done>\d+)/(?P<total>\d+)')
+# 同一进程两次写入进度之间的最短间隔（秒），避免 tqdm 高频刷新压垮存储
+UPDATE_INTERVAL = 1.0
+
+
+def progress_key(document_id) -> str:
+    return f"doc:{document_id}"
+
+
+def parse_progress_line(line: str) -> Optional[Dict]:
+    """解析一行 tqdm 输出，返回 {"stage", "done", "total"}，不是进度行时返回 None"""
+    match = PROGRESS_PATTERN.search(line)
+    if not match:
+        return None
+    return {
+        "stage": (match.group("stage") or "").strip(),
+        "done": int(match.group("done")),
+        "total": int(match.group("total"))
+    }
+
+
+class ProgressTracker:
+    """
+    记录单个 MinerU 进程的解析进度
+
+    页数以页级阶段（阶段名包含 page）的计数为准，未出现页级阶段时只记录当前阶段
+    """
+
+    def __init__(self, document_id: str, pages_total: Optional[int] = None,
+                 start_page: Optional[int] = None, end_page: Optional[int] = None):
+        self.key = progress_key(document_id)
+        self.field = "" if start_page is None else f"{start_page}-{end_page}"
+        self.record = {
+            "document_id": str(document_id),
+            "start_page": start_page,
+            "end_page": end_page,
+            "status": "parsing",
+            "stage": "",
+            "stage_done": 0,
+            "stage_total": 0,
+            "pages_done": 0,
+            "pages_total": pages_total or 0,
+            "started_at": time.time(),
+            "updated_at": time.time()
+        }
+        self._last_write = 0.0
+
+    async def start(self):
+        try:
+            await progress_store.hset(DOCUMENTS_KEY, self.record["document_id"], self.record["started_at"])
+        except Exception as e:
+            logger.warning(f"登记解析进度失败 {self.key}: {str(e)}")
+        await self._save()
+
+    async def feed(self, line: str) -> bool:
+        """处理一行输出，是进度行时返回 True"""
+        progress = parse_progress_line(line)
+        if progress is None:
+            return False
+        self.record.update(stage=progress["stage"], stage_done=progress["done"], stage_total=progress["total"])
+        if "page" in progress["stage"].lower():
+            self.record["pages_done"] = progress["done"]
+            self.record["pages_total"] = progress["total"]
+        if time.monotonic() - self._last_write >= UPDATE_INTERVAL:
+            await self._save()
+        return True
+
+    async def finish(self, success: bool):
+        self.record["status"] = "done" if success else "failed"
+        if success and self.record["pages_total"]:
+            self.record["pages_done"] = self.record["pages_total"]
+        await self._save()
+
+    async def _save(self):
+        self._last_write = time.monotonic()
+        self.record["updated_at"] = time.time()
+        try:
+            await progress_store.hset(self.key, self.field, self.record)
+        except Exception as e:
+            # 进度只用于展示，存储不可用时不影响解析
+            logger.warning(f"写入解析进度失败 {self.key} {self.field}: {str(e)}")
+
+
+def summarize_progress(document_id: str, records: List[Dict]) -> Dict:
+    """汇总同一文档各分片的进度"""
+    pages_done = sum(r.get("pages_done", 0) for r in records)
+    pages_total = sum(r.get("pages_total", 0) for r in records)
+    started_at = min(r.get("started_at", time.time()) for r in records)
+    updated_at = max(r.get("updated_at", started_at) for r in records)
+    statuses = {r.get("status") for r in records}
+    if "failed" in statuses:
+        status = "failed"
+    elif statuses == {"done"}:
+        status = "done"
+    else:
+        status = "parsing"
+    elapsed = max(updated_at - started_at, 0.0)
+    return {
+        "document_id": document_id,
+        "status": status,
+        "pages_done": pages_done,
+        "pages_total": pages_total,
+        "percent": round(pages_done * 100 / pages_total, 1) if pages_total else 0.0,
+        "pages_per_sec": round(pages_done / elapsed, 3) if elapsed > 0 else 0.0,
+        "elapsed": round(elapsed, 1),
+        "updated_at": updated_at,
+        "shards": sorted(records, key=lambda r: r.get("start_page") or 0)
+    }
+
+
+async def reset_parse_progress(document_id: str):
+    """文档重新解析前清除上一次的进度记录（各分片在同一个键下，一次删除）"""
+    try:
+        await progress_store.delete(progress_key(document_id))
+        await progress_store.hdel(DOCUMENTS_KEY, str(document_id))
+    except Exception as e:
+        logger.warning(f"清除解析进度失败 {document_id}: {str(e)}")
+
+
+async def get_parse_progress(document_id: Optional[str] = None) -> List[Dict]:
+    """查询解析进度；不指定文档时返回所有有记录的文档"""
+    if document_id is not None:
+        document_ids = [str(document_id)]
+    else:
+        document_ids = sorted(await progress_store.hgetall(DOCUMENTS_KEY))
+    results = []
+    expired = []
+    for doc_id in document_ids:
+        records = list((await progress_store.hgetall(progress_key(doc_id))).values())
+        if records:
+            results.append(summarize_progress(doc_id, records))
+        elif document_id is None:
+            expired.append(doc_id)
+    if expired:
+        # 进度记录已过期的文档从登记表中移除
+        await progress_store.hdel(DOCUMENTS_KEY, *expired)
+    return results
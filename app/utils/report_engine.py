@@ -0,0 +1,294 @@
+# report_engine.py
+import asyncio
+import copy
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from config import REPORT_OUTPUT_MAX_BYTES, REPORT_OUTPUT_MAX_FILES, REPORT_OUTPUT_MIN_AGE, REPORT_RENDER_WORKERS
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_JSON_PATH = "static/template.json"
+# 灾情类型，枚举值：FLOOD（洪涝灾害）、DROUGHT（干旱灾害）
+REPORT_TEMPLATES = {
+    "FLOOD": "static/FLOOD_TEMPLETE.docx",
+    "DROUGHT": "static/DROUGHT_TEMPLETE.docx",
+}
+OUTPUT_DIR = "static/output/zqpg"
+# 榆林市各县（市、区），键为接口中使用的地区代码
+YULIN_REGIONS = {
+    "yuyang": "榆阳区",
+    "hengshan": "横山区",
+    "shenmu": "神木市",
+    "fugu": "府谷县",
+    "jingbian": "靖边县",
+    "dingbian": "定边县",
+    "suide": "绥德县",
+    "mizhi": "米脂县",
+    "jiaxian": "佳县",
+    "wubu": "吴堡县",
+    "qingjian": "清涧县",
+    "zizhou": "子洲县",
+}
+# 台账记录中表示所属地区的字段
+REGION_FIELDS = ("regionName", "locationCounty", "countyName", "county")
+# 报告文字生成逻辑（kg_flood / kg_drought / kg_stats）的版本，修改后递增，使已缓存的报告失效
+NARRATIVE_VERSION = 3
+# 报告文件名末尾的缓存键，下载时据此生成 ETag
+REPORT_KEY_PATTERN = re.compile(r"_([0-9a-f]{16})\.docx$")
+
+_file_cache: Dict[str, Tuple[float, int, bytes]] = {}
+_file_cache_lock = threading.Lock()
+_params_cache: Dict[str, Tuple[float, int, dict]] = {}
+_executor: Optional[ProcessPoolExecutor] = None
+# 同一报告正在渲染时，后续相同请求等待同一个结果
+_inflight: Dict[str, asyncio.Future] = {}
+
+
+def read_file_cached(path: str) -> bytes:
+    """按修改时间缓存文件内容，模板文件更新后自动重新读取"""
+    stat = os.stat(path)
+    with _file_cache_lock:
+        cached = _file_cache.get(path)
+        if cached and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+            return cached[2]
+    with open(path, "rb") as f:
+        data = f.read()
+    with _file_cache_lock:
+        _file_cache[path] = (stat.st_mtime, stat.st_size, data)
+    return data
+
+
+def load_template_params() -> dict:
+    """读取 template.json 中的报告数据（解析结果按修改时间缓存，返回副本供调用方修改）"""
+    stat = os.stat(TEMPLATE_JSON_PATH)
+    cached = _params_cache.get(TEMPLATE_JSON_PATH)
+    if not cached or cached[0] != stat.st_mtime or cached[1] != stat.st_size:
+        params = json.loads(read_file_cached(TEMPLATE_JSON_PATH).decode("utf-8"))['data']
+        cached = (stat.st_mtime, stat.st_size, params)
+        _params_cache[TEMPLATE_JSON_PATH] = cached
+    return copy.deepcopy(cached[2])
+
+
+def scope_params_to_region(params: dict, region: str) -> dict:
+    """
+    把报告数据限定到单个县（市、区）：各台账列表只保留该地区的记录，
+    没有地区字段的记录保留；返回新的字典，不修改传入的数据
+    """
+    region_name = YULIN_REGIONS[region]
+    # 台账中可能填写简称（如“榆阳”），按去掉区/县/市后缀的名称匹配
+    short_name = region_name[:-1] if len(region_name) > 2 else region_name
+
+    def in_region(record) -> bool:
+        if not isinstance(record, dict):
+            return True
+        values = [record[field] for field in REGION_FIELDS if record.get(field)]
+        return not values or any(short_name in str(value) for value in values)
+
+    scoped = {
+        key: [record for record in value if in_region(record)] if isinstance(value, list) else copy.deepcopy(value)
+        for key, value in params.items()
+    }
+    scoped['region'] = region
+    scoped['regionName'] = region_name
+    return scoped
+
+
+def build_report_context(disaster_type: str, params: dict) -> dict:
+    """填充报告模板所需的各段文字"""
+    params['startdate'] = params['startDate']
+    params['enddate'] = params['endDate']
+    params.setdefault('publicdate', datetime.now().strftime('%Y年%m月%d日'))
+    if disaster_type == "FLOOD":
+        from app.utils import kg_flood
+        params['zqzs'] = kg_flood.get_zhgk(params)
+        params['slgcssssqk'] = kg_flood.get_slgcssssqk(params)
+        params['zdslgcsgqk'] = kg_flood.get_zdslgcsgqk(params)
+        params['czsyqk'] = kg_flood.get_czsyqk(params)
+        params['khqxjszcqk'] = kg_flood.get_khqxjszcqk(params)
+        params['shzhfyqk'] = kg_flood.get_shzhfyqk(params)
+        params['zdszdqfx'] = kg_flood.get_zdszdqfx(params)
+    elif disaster_type == "DROUGHT":
+        from app.utils import kg_drought
+        params['zqzs'] = kg_drought.get_zqzs(params)
+        params['dqnyhqzk'] = kg_drought.get_dqnyhqzk(params)
+        params['slgcxssyzk'] = kg_drought.get_slgcxssyzk(params)
+        params['khtrzzqk'] = kg_drought.get_khtrzzqk(params)
+        params['khcxjzxy'] = kg_drought.get_khcxjzxy(params)
+        params['zdshdqqk'] = kg_drought.get_zdshdqqk(params)
+    return params
+
+
+def render_report(disaster_type: str, template_bytes: bytes, params: dict, output_path: str) -> str:
+    """在工作进程中生成报告文本并渲染Word模板，先写临时文件再原子重命名"""
+    from docxtpl import DocxTemplate
+
+    context = build_report_context(disaster_type, params)
+    doc = DocxTemplate(io.BytesIO(template_bytes))
+    doc.render(context)
+    tmp_path = f"{output_path}.{uuid.uuid4().hex}.part"
+    try:
+        doc.save(tmp_path)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return output_path
+
+
+def report_cache_key(disaster_type: str, startdate: str, enddate: str, regions: List[str],
+                     params: dict, template_bytes: bytes) -> str:
+    """缓存键：模板版本 + 文字生成版本 + 灾情类型 + 时间范围 + 地区 + 数据"""
+    payload = json.dumps({
+        "template": hashlib.sha1(template_bytes).hexdigest(),
+        "narrative": NARRATIVE_VERSION,
+        "disaster_type": disaster_type,
+        "startdate": startdate,
+        "enddate": enddate,
+        "regions": sorted(regions or []),
+        "data": params,
+    }, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def report_etag(filename: str) -> Optional[str]:
+    """由报告文件名中的缓存键生成 ETag（内容由键唯一确定）"""
+    match = REPORT_KEY_PATTERN.search(filename)
+    return f'"{match.group(1)}"' if match else None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=REPORT_RENDER_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def enforce_output_retention(max_files: int = REPORT_OUTPUT_MAX_FILES,
+                             max_bytes: int = REPORT_OUTPUT_MAX_BYTES,
+                             min_age: float = REPORT_OUTPUT_MIN_AGE) -> int:
+    """
+    报告目录超出文件数或容量上限时，按最近使用时间从旧到新删除报告，返回删除的文件数
+
+    最近 min_age 秒内生成或命中过的报告不删除（可能正在下载或被批量任务打包）
+    """
+    if not os.path.isdir(OUTPUT_DIR):
+        return 0
+    protected_after = time.time() - min_age
+    entries = []
+    for entry in os.scandir(OUTPUT_DIR):
+        # 只管理本模块生成的报告，其它文件不受影响
+        if not entry.is_file() or not REPORT_KEY_PATTERN.search(entry.name):
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    count = len(entries)
+    removed = 0
+    for mtime, size, path in sorted(entries):
+        if count <= max_files and total <= max_bytes:
+            break
+        if mtime >= protected_after:
+            # 按时间排序，之后的文件都在保护期内
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        count -= 1
+        removed += 1
+    if removed:
+        logger.info(f"报告目录超出保留上限，已删除 {removed} 个旧报告")
+    return removed
+
+
+async def generate_report(
+    disaster_type: str,
+    startdate: str,
+    enddate: str,
+    regions: List[str],
+    params: Optional[dict] = None
+) -> Tuple[str, str, bool]:
+    """
+    生成（或复用已缓存的）灾情评估报告
+
+    参数:
+        params: 报告数据，默认读取 template.json
+
+    返回:
+        (文件路径, ETag, 是否命中缓存)
+    """
+    template_path = REPORT_TEMPLATES.get(disaster_type)
+    if template_path is None:
+        raise ValueError(f"不支持的灾情类型: {disaster_type}")
+
+    if params is None:
+        params = await asyncio.to_thread(load_template_params)
+    # 发布日期写入报告正文，也参与缓存键，跨天后重新生成
+    params.setdefault('publicdate', datetime.now().strftime('%Y年%m月%d日'))
+    template_bytes = await asyncio.to_thread(read_file_cached, template_path)
+    key = report_cache_key(disaster_type, startdate, enddate, regions, params, template_bytes)
+    filename = f"灾情评估报告_{params['startDate']}_{params['endDate']}_{key[:16]}.docx"
+    output_path = os.path.join(OUTPUT_DIR, filename)
+    etag = report_etag(filename)
+
+    while True:
+        if os.path.exists(output_path):
+            # 刷新访问时间，保留策略按最近使用淘汰，且不会删除刚返回的文件
+            os.utime(output_path)
+            return output_path, etag, True
+
+        inflight = _inflight.get(key)
+        if inflight is None:
+            break
+        try:
+            await asyncio.shield(inflight)
+            return output_path, etag, True
+        except asyncio.CancelledError:
+            if not inflight.cancelled():
+                raise
+            # 正在渲染的请求被取消（客户端断开、服务关闭），由当前请求重新渲染
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    _inflight[key] = future
+    try:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        await loop.run_in_executor(get_executor(), render_report, disaster_type, template_bytes, params, output_path)
+        future.set_result(output_path)
+    except BaseException as e:
+        # 包括取消在内的任何失败都要结束共享的 future，否则等待同一报告的请求会一直挂起
+        if isinstance(e, asyncio.CancelledError):
+            future.cancel()
+        else:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+    await asyncio.to_thread(enforce_output_retention)
+    return output_path, etag, False
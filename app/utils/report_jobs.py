@@ -0,0 +1,202 @@
+# report_jobs.py
+import asyncio
+import logging
+import os
+import time
+import uuid
+import zipfile
+from datetime import datetime
+from typing import Dict, List, Optional, Set
+
+from app.utils.cache_utils import create_cache
+from app.utils.report_engine import (
+    REPORT_TEMPLATES, YULIN_REGIONS, generate_report, load_template_params, scope_params_to_region
+)
+from config import REPORT_JOB_MAX, REPORT_JOB_TTL
+
+logger = logging.getLogger(__name__)
+
+JOB_OUTPUT_DIR = "static/output/zqpg_jobs"
+DISASTER_TYPE_NAMES = {"FLOOD": "洪涝灾害", "DROUGHT": "干旱灾害"}
+
+# 任务状态存放在Redis中，多个uvicorn worker都能查询进度、下载结果（zip在共享磁盘上）；
+# 任务本身在提交它的进程内执行（未安装redis时退回进程内存）
+report_jobs = create_cache("report_jobs", maxsize=REPORT_JOB_MAX, ttl=REPORT_JOB_TTL, backend="redis")
+# 执行中的任务定期刷新 updated_at；超过 JOB_STALE_AFTER 秒未刷新说明执行它的进程已退出
+JOB_HEARTBEAT_INTERVAL = 30
+JOB_STALE_AFTER = 120
+# 保持后台任务的引用，避免被垃圾回收
+_job_tasks: Set[asyncio.Task] = set()
+
+
+def resolve_regions(regions: List[str], select_all: bool) -> List[str]:
+    """selectAll 时返回全部县（市、区），否则校验并去重地区代码"""
+    if select_all:
+        return list(YULIN_REGIONS)
+    unknown = [region for region in regions if region not in YULIN_REGIONS]
+    if unknown:
+        raise ValueError(f"不支持的地区: {', '.join(unknown)}")
+    if not regions:
+        raise ValueError("未选择地区")
+    return list(dict.fromkeys(regions))
+
+
+def job_archive_name(item: Dict, startdate: str, enddate: str) -> str:
+    return f"{item['regionName']}_{DISASTER_TYPE_NAMES[item['disasterType']]}评估报告_{startdate}_{enddate}.docx"
+
+
+def build_job_zip(job_id: str, files: Dict[str, str]) -> str:
+    """把任务生成的报告打包为一个zip（docx本身已压缩，直接存储），返回zip路径"""
+    os.makedirs(JOB_OUTPUT_DIR, exist_ok=True)
+    zip_path = os.path.join(JOB_OUTPUT_DIR, f"{job_id}.zip")
+    tmp_path = f"{zip_path}.part"
+    try:
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_STORED) as zf:
+            for arcname, file_path in files.items():
+                zf.write(file_path, arcname)
+        os.replace(tmp_path, zip_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return zip_path
+
+
+def cleanup_job_files(max_age: float = REPORT_JOB_TTL) -> int:
+    """删除超过任务保留时间的打包文件"""
+    if not os.path.isdir(JOB_OUTPUT_DIR):
+        return 0
+    removed = 0
+    deadline = time.time() - max_age
+    for entry in os.scandir(JOB_OUTPUT_DIR):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < deadline:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+async def save_job(job: Dict):
+    job["updated_at"] = time.time()
+    await report_jobs.set(job["job_id"], job)
+
+
+async def save_progress(job: Dict):
+    """保存执行中的进度，失败只记录日志，不影响报告生成"""
+    try:
+        await save_job(job)
+    except Exception as e:
+        logger.warning(f"保存报告任务 {job['job_id']} 状态失败: {str(e)}")
+
+
+async def heartbeat(job: Dict):
+    """任务执行期间定期保存状态，查询方据此判断任务是否仍在执行"""
+    while True:
+        await asyncio.sleep(JOB_HEARTBEAT_INTERVAL)
+        await save_progress(job)
+
+
+async def run_report_job(job: Dict):
+    """逐项提交到报告渲染进程池（由进程池控制并发），全部完成后打包"""
+    job["status"] = "running"
+    await save_progress(job)
+    heartbeat_task = asyncio.get_running_loop().create_task(heartbeat(job))
+    try:
+        params = await asyncio.to_thread(load_template_params)
+        startdate, enddate = params['startDate'], params['endDate']
+        job["period"] = f"{startdate}_{enddate}"
+
+        async def render_item(item: Dict):
+            try:
+                file_path, _, _ = await generate_report(
+                    item["disasterType"], job["startdate"], job["enddate"], [item["region"]],
+                    params=scope_params_to_region(params, item["region"])
+                )
+                item["status"] = "done"
+                item["filename"] = os.path.basename(file_path)
+                job["completed"] += 1
+                await save_progress(job)
+                return job_archive_name(item, startdate, enddate), file_path
+            except Exception as e:
+                logger.error(f"报告任务 {job['job_id']} 生成 {item['regionName']} {item['disasterType']} 失败: {str(e)}")
+                item["status"] = "failed"
+                item["error"] = str(e)
+                job["failed"] += 1
+                await save_progress(job)
+                return None
+
+        results = await asyncio.gather(*(render_item(item) for item in job["items"]))
+        files = dict(result for result in results if result is not None)
+        if not files:
+            raise RuntimeError("所有报告均生成失败")
+        zip_path = await asyncio.to_thread(build_job_zip, job["job_id"], files)
+        job["download_url"] = f"/api/kgapi/report_jobs/{job['job_id']}/download"
+        job["size"] = os.path.getsize(zip_path)
+        job["status"] = "done"
+    except Exception as e:
+        logger.error(f"报告任务 {job['job_id']} 失败: {str(e)}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    finally:
+        heartbeat_task.cancel()
+        job["finished_at"] = datetime.now().isoformat()
+        await save_progress(job)
+
+
+async def submit_report_job(
+    disaster_types: List[str],
+    startdate: str,
+    enddate: str,
+    regions: List[str],
+    select_all: bool = False
+) -> Dict:
+    """
+    创建批量报告任务（每个地区 × 灾情类型一份报告），立即返回任务信息，生成在后台进行
+
+    参数错误（灾情类型或地区不支持）时抛出 ValueError
+    """
+    disaster_types = list(dict.fromkeys(disaster_types))
+    if not disaster_types:
+        raise ValueError("未选择灾情类型")
+    unknown = [dt for dt in disaster_types if dt not in REPORT_TEMPLATES]
+    if unknown:
+        raise ValueError(f"不支持的灾情类型: {', '.join(unknown)}")
+    regions = resolve_regions(regions, select_all)
+
+    await asyncio.to_thread(cleanup_job_files)
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "status": "pending",
+        "startdate": startdate,
+        "enddate": enddate,
+        "total": len(regions) * len(disaster_types),
+        "completed": 0,
+        "failed": 0,
+        "created_at": datetime.now().isoformat(),
+        "finished_at": None,
+        "download_url": None,
+        "items": [
+            {"region": region, "regionName": YULIN_REGIONS[region], "disasterType": dt, "status": "pending"}
+            for region in regions for dt in disaster_types
+        ]
+    }
+    await save_job(job)
+    task = asyncio.get_running_loop().create_task(run_report_job(job))
+    _job_tasks.add(task)
+    task.add_done_callback(_job_tasks.discard)
+    return job
+
+
+async def get_report_job(job_id: str) -> Optional[Dict]:
+    """查询任务状态（任意worker均可）；执行进程已退出的任务返回失败"""
+    job = await report_jobs.get(job_id)
+    if job and job["status"] in ("pending", "running") and time.time() - job.get("updated_at", 0) > JOB_STALE_AFTER:
+        job["status"] = "failed"
+        job["error"] = "执行任务的服务进程已退出，请重新提交"
+    return job
+
+
+def job_zip_path(job_id: str) -> str:
+    return os.path.join(JOB_OUTPUT_DIR, f"{job_id}.zip")
@@ -1,9 +1,17 @@
 import os
+import asyncio
+import hashlib
+import uuid
 import numpy as np
 import shutil
 from datetime import datetime
+from typing import Tuple
 from fastapi import UploadFile, HTTPException, status
-from config import UPLOAD_FOLDER
+from starlette.responses import JSONResponse
+from config import UPLOAD_FOLDER, MAX_CONTENT_LENGTH, MAX_REQUEST_SIZE
+
+# 流式保存上传文件时每次读取的字节数
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 
 # 初始化MTCNN和人脸识别模型
 
@@ -33,4 +41,105 @@ def save_uploaded_file(file: UploadFile, directory: str = UPLOAD_FOLDER) -> str:
     return filename
 
 
-    
\ No newline at end of file
+def check_upload_size(file: UploadFile, max_size: int = MAX_CONTENT_LENGTH):
+    """上传文件大小已知时提前校验，超出上限返回413"""
+    if file.size is not None and file.size > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"文件 {file.filename} 超过大小上限 {max_size // (1024 * 1024)}MB"
+        )
+
+
+class RequestSizeLimitMiddleware:
+    """
+    限制请求体大小：框架解析multipart表单时会先把整个请求体写入临时文件，
+    这里在此之前按 Content-Length 直接拒绝超限请求；没有 Content-Length（分块传输）时
+    边接收边计数，超出上限即中断
+    """
+
+    def __init__(self, app, max_size: int = MAX_REQUEST_SIZE):
+        self.app = app
+        self.max_size = max_size
+
+    def _too_large(self) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"请求体超过大小上限 {self.max_size // (1024 * 1024)}MB"
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_size:
+            error = self._too_large()
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    raise self._too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _write_chunk(buffer, hasher, chunk: bytes):
+    hasher.update(chunk)
+    buffer.write(chunk)
+
+
+async def save_upload_stream(
+    file: UploadFile,
+    directory: str = UPLOAD_FOLDER,
+    max_size: int = MAX_CONTENT_LENGTH
+) -> Tuple[str, str, int]:
+    """
+    分块流式保存上传文件，以内容sha256命名
+
+    边读边计算哈希并写入临时文件（磁盘写入放到线程中执行，不阻塞事件循环），
+    完成后原子重命名到目标目录，中途失败或超出大小上限时删除临时文件
+
+    返回:
+        (文件路径, sha256, 文件大小)
+    """
+    check_upload_size(file, max_size)
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".upload_{uuid.uuid4().hex}.part")
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as buffer:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"文件 {file.filename} 超过大小上限 {max_size // (1024 * 1024)}MB"
+                    )
+                await asyncio.to_thread(_write_chunk, buffer, hasher, chunk)
+
+        file_hash = hasher.hexdigest()
+        file_ext = os.path.splitext(file.filename or "")[1]
+        file_path = os.path.join(directory, f"{file_hash}{file_ext}")
+        await asyncio.to_thread(os.replace, tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        await file.close()
+
+    return file_path, file_hash, size
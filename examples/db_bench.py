@@ -0,0 +1,148 @@
+"""
+对比 SQLite 调优前后（默认连接参数+共享连接池 vs 连接参数配置+独立只读连接池）
+在持续写入时默认搜索与首页统计查询的延迟
+
+用法: python -m examples.db_bench [文档数] [并发读协程数] [每轮秒数]
+使用临时SQLite文件，不影响线上数据库
+"""
+import asyncio
+import hashlib
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import dbmodels
+from app.database import (
+    Base, DOCUMENT_FTS_DDL, SQLITE_PRAGMAS, SQLITE_READ_PRAGMAS, create_engine_with_pragmas
+)
+from app.doc_crud import create_documents_bulk, search_documents_with_pagination
+from app.routers.admin import compute_homepage_data
+
+WORDS = ["榆林", "洪涝", "干旱", "水库", "垮坝", "堤防", "决口", "山洪", "灾害", "预警", "转移", "降雨",
+         "水位", "河道", "断流", "抗旱", "灌溉", "损失", "统计", "防汛"]
+QUERIES = ["山洪灾害", "水库垮坝", "抗旱灌溉", "防汛"]
+USERS = 500
+
+
+def make_document(rnd, n):
+    content = "".join(rnd.choice(WORDS) for _ in range(200))
+    return {
+        "title": "".join(rnd.choice(WORDS) for _ in range(4)) + f"{n}",
+        "description": "".join(rnd.choice(WORDS) for _ in range(10)),
+        "content": content,
+        "tags": "",
+        "file_path": f"static/documents/{n}.pdf",
+        "file_type": "pdf",
+        "content_hash": hashlib.sha256(f"doc-{n}".encode()).hexdigest()
+    }
+
+
+async def seed(path, num_docs):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for ddl in DOCUMENT_FTS_DDL:
+            await conn.execute(text(ddl))
+        await conn.execute(insert(dbmodels.User), [
+            {"username": f"user{i}", "full_name": f"用户{i}", "hashed_password": "x"} for i in range(USERS)
+        ])
+        now = datetime.now()
+        rnd = random.Random(0)
+        await conn.execute(insert(dbmodels.AttendanceRecord), [
+            {"user_id": rnd.randint(1, USERS), "timestamp": now - timedelta(days=rnd.random() * 60)}
+            for _ in range(50000)
+        ])
+    session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    rnd = random.Random(1)
+    async with session_factory() as db:
+        for start in range(0, num_docs, 1000):
+            await create_documents_bulk(db, [make_document(rnd, n) for n in range(start, min(start + 1000, num_docs))])
+    await engine.dispose()
+
+
+async def run_profile(write_engine, read_engine, num_readers, seconds):
+    write_sessions = sessionmaker(bind=write_engine, class_=AsyncSession, expire_on_commit=False)
+    read_sessions = sessionmaker(bind=read_engine, class_=AsyncSession, expire_on_commit=False)
+    latencies = {"search": [], "homepage": []}
+    writes = 0
+    deadline = time.perf_counter() + seconds
+
+    async def writer():
+        nonlocal writes
+        rnd = random.Random(2)
+        n = 10 ** 7
+        while time.perf_counter() < deadline:
+            async with write_sessions() as db:
+                await create_documents_bulk(db, [make_document(rnd, n + i) for i in range(20)])
+            n += 20
+            writes += 20
+
+    async def reader(worker):
+        rnd = random.Random(100 + worker)
+        while time.perf_counter() < deadline:
+            kind = "homepage" if rnd.random() < 0.3 else "search"
+            start = time.perf_counter()
+            async with read_sessions() as db:
+                if kind == "search":
+                    await search_documents_with_pagination(db, rnd.choice(QUERIES), 0, 10)
+                else:
+                    await compute_homepage_data(db)
+            latencies[kind].append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(writer(), *(reader(i) for i in range(num_readers)))
+    return latencies, writes
+
+
+def summarize(values):
+    values = sorted(values)
+    if not values:
+        return 0, 0.0, 0.0
+    return len(values), statistics.median(values), values[max(int(len(values) * 0.95) - 1, 0)]
+
+
+async def main(num_docs=20000, num_readers=8, seconds=10):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        seed_path = os.path.join(tmp_dir, "seed.db")
+        await seed(seed_path, num_docs)
+        results = {}
+
+        # 调优前：默认连接参数，仅启动时设置一次WAL，读写共用一个连接池
+        path = os.path.join(tmp_dir, "before.db")
+        shutil.copy(seed_path, path)
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"check_same_thread": False})
+        async with engine.begin() as conn:
+            await conn.execute(text("PRAGMA journal_mode=WAL"))
+        results["before"] = await run_profile(engine, engine, num_readers, seconds)
+        await engine.dispose()
+
+        # 调优后：每个连接执行连接参数配置，读接口使用独立只读连接池
+        path = os.path.join(tmp_dir, "after.db")
+        shutil.copy(seed_path, path)
+        url = f"sqlite+aiosqlite:///{path}"
+        write_engine = create_engine_with_pragmas(url, SQLITE_PRAGMAS)
+        read_engine = create_engine_with_pragmas(url, SQLITE_READ_PRAGMAS, pool_size=num_readers)
+        async with write_engine.begin() as conn:
+            await conn.execute(text("SELECT 1"))
+        results["after"] = await run_profile(write_engine, read_engine, num_readers, seconds)
+        await write_engine.dispose()
+        await read_engine.dispose()
+
+    print(f"文档数 {num_docs}，并发读 {num_readers}，每轮 {seconds}s（同时持续写入）")
+    print(f"{'配置':<8}{'查询':<10}{'次数':>8}{'p50(ms)':>10}{'p95(ms)':>10}{'写入文档':>10}")
+    for name, (latencies, writes) in results.items():
+        for kind, values in latencies.items():
+            count, p50, p95 = summarize(values)
+            print(f"{name:<8}{kind:<10}{count:>8}{p50:>10.1f}{p95:>10.1f}{writes:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(int(arg) for arg in sys.argv[1:4])))
@@ -0,0 +1,70 @@
+"""
+对比逐条 create_document 与批量 create_documents_bulk 的文档写入吞吐
+
+用法: python -m examples.doc_ingest_bench [文档数] [每批文档数]
+使用临时SQLite文件（含全文索引触发器），不影响线上数据库
+"""
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base, DOCUMENT_FTS_DDL
+from app.doc_crud import create_document, create_documents_bulk
+
+
+def make_documents(prefix, count):
+    for n in range(count):
+        content_hash = hashlib.sha256(f"{prefix}-{n}".encode()).hexdigest()
+        yield {
+            "title": f"榆林市防汛资料{prefix}-{n}",
+            "description": f"导入自: /data/archive/{prefix}/{n}.pdf",
+            "content": "",
+            "tags": "",
+            "file_path": f"static/documents/{content_hash}.pdf",
+            "file_type": "pdf",
+            "content_hash": content_hash
+        }
+
+
+async def main(count=2000, batch_size=500):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            for ddl in DOCUMENT_FTS_DDL:
+                await conn.execute(text(ddl))
+        session_factory = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+
+        async with session_factory() as db:
+            start = time.perf_counter()
+            for doc in make_documents("single", count):
+                await create_document(
+                    db, doc["title"], doc["description"], doc["content"], doc["tags"],
+                    doc["file_path"], doc["file_type"], doc["content_hash"]
+                )
+            single_time = time.perf_counter() - start
+
+        async with session_factory() as db:
+            documents = list(make_documents("bulk", count))
+            start = time.perf_counter()
+            for i in range(0, count, batch_size):
+                await create_documents_bulk(db, documents[i:i + batch_size])
+            bulk_time = time.perf_counter() - start
+
+        await engine.dispose()
+
+    print(f"文档数 {count}，批量每批 {batch_size} 条")
+    print(f"{'方式':<10}{'耗时(s)':>10}{'文档/秒':>12}")
+    print(f"{'逐条':<10}{single_time:>10.2f}{count / single_time:>12.1f}")
+    print(f"{'批量':<10}{bulk_time:>10.2f}{count / bulk_time:>12.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(int(arg) for arg in sys.argv[1:3])))
@@ -0,0 +1,84 @@
+"""
+对比 nested 布局（每个PDF一个文档）与 block 布局（每个文本块一个文档）的索引耗时和查询延迟
+
+用法: python -m examples.es_layout_bench [文档数] [每文档页数]
+使用独立的 bench_* 索引，不影响线上索引
+"""
+import random
+import statistics
+import sys
+import time
+
+from app.utils import es_utils
+
+QUERIES = ["洪涝", "干旱", "水库垮坝", "堤防决口", "山洪灾害预警"]
+WORDS = ["榆林", "洪涝", "干旱", "水库", "垮坝", "堤防", "决口", "山洪", "灾害", "预警", "转移", "降雨",
+         "水位", "河道", "断流", "抗旱", "灌溉", "损失", "统计", "防汛"]
+BLOCKS_PER_PAGE = 8
+SPANS_PER_BLOCK = 12
+ROUNDS = 20
+
+
+def make_pages(doc_no, pages):
+    rnd = random.Random(doc_no)
+    for page_idx in range(pages):
+        fragments = []
+        for b in range(BLOCKS_PER_PAGE):
+            block_id = f"p{page_idx}_b{b}"
+            for s in range(SPANS_PER_BLOCK):
+                fragments.append({
+                    "page_idx": page_idx,
+                    "content": "".join(rnd.choice(WORDS) for _ in range(4)),
+                    "bbox": [s * 10.0, b * 20.0, s * 10.0 + 10, b * 20.0 + 15],
+                    "block_id": block_id,
+                    "line_id": f"{block_id}_l0",
+                    "span_id": f"{block_id}_l0_s{s}"
+                })
+        yield page_idx, fragments
+
+
+def timed_queries(layout):
+    latencies = []
+    for _ in range(ROUNDS):
+        for query in QUERIES:
+            start = time.perf_counter()
+            es_utils.enhanced_search(query, ["fragments.content", "document.content"], layout=layout)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+def main(num_docs=50, pages=100):
+    es_utils.INDEX_NAME = "bench_pdf_fragments"
+    es_utils.BLOCK_INDEX_NAME = "bench_pdf_blocks"
+    es_utils.create_index(force_recreate=True)
+    es_utils.create_block_index(force_recreate=True)
+
+    try:
+        start = time.perf_counter()
+        for n in range(num_docs):
+            fragments = [frag for _, page in make_pages(n, pages) for frag in page]
+            es_utils.bulk_index_documents([{
+                "document_id": f"doc_{n}", "title": f"测试文档{n}", "fragments": fragments
+            }])
+        nested_index_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for n in range(num_docs):
+            es_utils.bulk_index_blocks(f"doc_{n}", f"测试文档{n}", make_pages(n, pages))
+        block_index_time = time.perf_counter() - start
+
+        es_utils.es.indices.refresh(index=[es_utils.INDEX_NAME, es_utils.BLOCK_INDEX_NAME])
+        nested_p50, nested_p95 = timed_queries("nested")
+        block_p50, block_p95 = timed_queries("block")
+
+        print(f"文档数 {num_docs}，每文档 {pages} 页，每页 {BLOCKS_PER_PAGE * SPANS_PER_BLOCK} 个span")
+        print(f"{'布局':<8}{'索引耗时(s)':>12}{'查询p50(ms)':>14}{'查询p95(ms)':>14}")
+        print(f"{'nested':<8}{nested_index_time:>12.2f}{nested_p50:>14.1f}{nested_p95:>14.1f}")
+        print(f"{'block':<8}{block_index_time:>12.2f}{block_p50:>14.1f}{block_p95:>14.1f}")
+    finally:
+        es_utils.es.indices.delete(index=[es_utils.INDEX_NAME, es_utils.BLOCK_INDEX_NAME], ignore_unavailable=True)
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -1,71 +1,264 @@
+"""
+批量导入PDF到文档库
+
+用法: python import_pdfs.py <PDF目录路径> [--workers N] [--batch-size N] [--link auto|reflink|hardlink|copy] [--restart]
+
+递归扫描目录，线程池并行处理：每个文件只读一遍，边读边计算sha256；与上传目录在同一文件系统时
+优先使用 reflink（写时复制）或硬链接，否则边读边复制。数据库记录按批提交，每批提交后写入检查点，
+中断后重新运行会跳过已导入的文件。
+"""
+import argparse
+import asyncio
 import hashlib
 import os
-import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from app.database import AsyncSessionLocal, create_table
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import select
+
+from app.database import AsyncSessionLocal, create_table, create_document_fts
 from app.dbmodels import Base, Document
-from app.doc_crud import create_document, get_document_by_file_path  # 需新增查询方法
+from app.doc_crud import create_documents_bulk
 from config import UPLOAD_FOLDER
 
-async def import_pdfs_from_directory(directory: str):
-    """从指定目录导入所有PDF文件到数据库"""
+try:
+    import fcntl
+except ImportError:  # 非Linux平台不支持reflink
+    fcntl = None
+
+# Linux FICLONE ioctl，btrfs/xfs 等支持写时复制的文件系统上可“秒复制”
+FICLONE = 0x40049409
+CHUNK_SIZE = 1024 * 1024
+CHECKPOINT_DIR = "static/output/import_checkpoints"
+
+
+def iter_pdf_files(directory: str):
+    """递归遍历目录下的PDF文件（按路径排序，便于对照检查点）"""
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(".pdf"):
+                yield os.path.join(root, filename)
+
+
+def hash_file(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def copy_and_hash(source_path: str, tmp_path: str) -> str:
+    """边读边写边计算哈希，源文件只读一遍"""
+    sha256 = hashlib.sha256()
+    with open(source_path, "rb") as fsrc, open(tmp_path, "wb") as fdst:
+        for chunk in iter(lambda: fsrc.read(CHUNK_SIZE), b""):
+            sha256.update(chunk)
+            fdst.write(chunk)
+    return sha256.hexdigest()
+
+
+def reflink(source_path: str, target_path: str):
+    """写时复制克隆文件，文件系统不支持时抛出 OSError"""
+    if fcntl is None:
+        raise OSError("当前平台不支持reflink")
+    try:
+        with open(source_path, "rb") as fsrc, open(target_path, "wb") as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except OSError:
+        if os.path.exists(target_path):
+            os.remove(target_path)
+        raise
+
+
+def link_file(source_path: str, target_path: str, link_mode: str) -> Optional[str]:
+    """按 link_mode 尝试 reflink/硬链接，成功时返回使用的方式，均不可用时返回 None"""
+    candidates = ["reflink", "hardlink"] if link_mode == "auto" else [link_mode]
+    for candidate in candidates:
+        try:
+            if candidate == "reflink":
+                reflink(source_path, target_path)
+            elif candidate == "hardlink":
+                os.link(source_path, target_path)
+            else:
+                continue
+            return candidate
+        except OSError:
+            continue
+    return None
+
+
+def ingest_file(source_path: str, link_mode: str, same_device: bool) -> Dict:
+    """
+    把单个文件放入上传目录（以内容哈希命名），返回文档记录所需信息
+
+    同一文件系统上先 reflink/硬链接到临时文件再读一遍算哈希，不复制数据；
+    跨文件系统或链接失败时边读边复制边算哈希，两种情况源数据都只读一遍
+    """
+    size = os.path.getsize(source_path)
+    tmp_path = os.path.join(UPLOAD_FOLDER, f".import_{uuid.uuid4().hex}.part")
+    try:
+        method = link_file(source_path, tmp_path, link_mode) if same_device and link_mode != "copy" else None
+        if method is None:
+            method = "copy"
+            file_hash = copy_and_hash(source_path, tmp_path)
+        else:
+            file_hash = hash_file(tmp_path)
+
+        target_path = os.path.join(UPLOAD_FOLDER, f"{file_hash}.pdf")
+        if os.path.exists(target_path):
+            os.remove(tmp_path)
+            method = "exists"
+        else:
+            os.replace(tmp_path, target_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return {
+        "source_path": source_path,
+        "title": os.path.splitext(os.path.basename(source_path))[0],
+        "content_hash": file_hash,
+        "file_path": target_path,
+        "size": size,
+        "method": method
+    }
+
+
+def checkpoint_path_for(directory: str) -> str:
+    """每个导入目录一个检查点文件"""
+    digest = hashlib.sha1(os.path.abspath(directory).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(CHECKPOINT_DIR, f"import_{digest}.txt")
+
+
+def load_checkpoint(checkpoint_path: str) -> Set[str]:
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def append_checkpoint(checkpoint_path: str, source_paths: List[str]):
+    with open(checkpoint_path, "a", encoding="utf-8") as f:
+        f.writelines(f"{path}\n" for path in source_paths)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def save_batch(records: List[Dict]) -> int:
+    """在一个事务中写入一批文档，已存在的内容只合并标题引用；返回新建文档数"""
+    async with AsyncSessionLocal() as db:
+        hashes = {record["content_hash"] for record in records}
+        existing = set(await db.scalars(select(Document.content_hash).where(Document.content_hash.in_(hashes))))
+        await create_documents_bulk(db, [{
+            "title": record["title"],
+            "description": f"导入自: {record['source_path']}",
+            "content": "",  # 内容由后续解析任务填充
+            "tags": "",
+            "file_path": record["file_path"],
+            "file_type": "pdf",
+            "content_hash": record["content_hash"]
+        } for record in records])
+        return len(hashes - existing)
+
+
+async def import_pdfs_from_directory(
+    directory: str,
+    workers: Optional[int] = None,
+    batch_size: int = 500,
+    link_mode: str = "auto",
+    checkpoint_path: Optional[str] = None,
+    restart: bool = False
+):
+    """从指定目录（递归）导入所有PDF文件到数据库"""
     # 确保上传目录存在
     Path(UPLOAD_FOLDER).mkdir(parents=True, exist_ok=True)
-    
+
     # 初始化数据库表
     await create_table(Base)
-    
-    async with AsyncSessionLocal() as db:
-        # 遍历目录下的PDF文件
-        for filename in os.listdir(directory):
-            if filename.lower().endswith(".pdf"):
-                source_path = os.path.join(directory, filename)
-                # 构造目标路径（避免重名）
-                with open(source_path, "rb") as f:
-                    file_content = f.read()
-                    file_hash = hashlib.sha256(file_content).hexdigest()
-                
-                # 构建新的文件名和路径
-                new_filename = f"{file_hash}.pdf"
-                target_path = os.path.join(UPLOAD_FOLDER, new_filename)
-                    
-                counter = 1
-                while os.path.exists(target_path):
-                    name, ext = os.path.splitext(new_filename)
-                    target_path = os.path.join(UPLOAD_FOLDER, f"{name}_{counter}{ext}")
-                    counter += 1
-                
-                # 检查是否已导入
-                existing_doc = await get_document_by_file_path(db, target_path)
-                if existing_doc:
-                    print(f"已存在: {filename}")
-                    continue
-                
-                # 复制文件到上传目录
-                with open(source_path, "rb") as fsrc, open(target_path, "wb") as fdst:
-                    fdst.write(fsrc.read())
-                
-                # 创建数据库记录
-                doc = await create_document(
-                    db=db,
-                    title=os.path.splitext(filename)[0],
-                    description=f"导入自: {source_path}",
-                    content="",  # 内容由后续解析任务填充
-                    tags="",
-                    file_path=target_path,
-                    file_type="pdf"
-                )
-                print(f"导入成功: {filename} (ID: {doc.id})")
+    await create_document_fts()
+
+    checkpoint_path = checkpoint_path or checkpoint_path_for(directory)
+    os.makedirs(os.path.dirname(checkpoint_path) or ".", exist_ok=True)
+    if restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    done = load_checkpoint(checkpoint_path)
+
+    all_files = list(iter_pdf_files(directory))
+    pending = [path for path in all_files if path not in done]
+    print(f"共 {len(all_files)} 个PDF，已导入 {len(all_files) - len(pending)} 个，待导入 {len(pending)} 个")
+    if not pending:
+        return
+
+    same_device = os.stat(directory).st_dev == os.stat(UPLOAD_FOLDER).st_dev
+    stats = {"files": 0, "bytes": 0, "created": 0, "failed": 0}
+    methods: Dict[str, int] = {}
+    start = time.perf_counter()
+
+    def report(prefix: str):
+        elapsed = max(time.perf_counter() - start, 1e-9)
+        print(
+            f"{prefix}: 已处理 {stats['files']}/{len(pending)}，新建 {stats['created']}，失败 {stats['failed']}，"
+            f"{stats['files'] / elapsed:.1f} 文件/秒，{stats['bytes'] / elapsed / 1024 / 1024:.1f} MB/秒"
+        )
+
+    loop = asyncio.get_running_loop()
+    batch: List[Dict] = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            loop.run_in_executor(executor, ingest_file, path, link_mode, same_device)
+            for path in pending
+        ]
+        for future in asyncio.as_completed(futures):
+            try:
+                record = await future
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"导入失败: {e}")
+                continue
+            batch.append(record)
+            stats["files"] += 1
+            stats["bytes"] += record["size"]
+            methods[record["method"]] = methods.get(record["method"], 0) + 1
+            if len(batch) >= batch_size:
+                stats["created"] += await save_batch(batch)
+                append_checkpoint(checkpoint_path, [r["source_path"] for r in batch])
+                batch = []
+                report("进度")
+        if batch:
+            stats["created"] += await save_batch(batch)
+            append_checkpoint(checkpoint_path, [r["source_path"] for r in batch])
+
+    report("导入完成")
+    print("文件放置方式: " + "，".join(f"{name} {count}" for name, count in sorted(methods.items())))
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) != 2:
-        print(f"用法: {sys.argv[0]} <PDF目录路径>")
-        sys.exit(1)
-    
-    pdf_directory = sys.argv[1]
-    if not os.path.isdir(pdf_directory):
-        print(f"错误: {pdf_directory} 不是有效目录")
-        sys.exit(1)
-    
-    asyncio.run(import_pdfs_from_directory(pdf_directory))
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="递归批量导入PDF到文档库（可断点续传）")
+    parser.add_argument("directory", help="PDF目录路径")
+    parser.add_argument("--workers", type=int, default=None, help="并行处理文件的线程数")
+    parser.add_argument("--batch-size", type=int, default=500, help="每个数据库事务写入的文档数")
+    parser.add_argument(
+        "--link", choices=["auto", "reflink", "hardlink", "copy"], default="auto",
+        help="同一文件系统上的文件放置方式，auto 依次尝试 reflink、硬链接"
+    )
+    parser.add_argument("--checkpoint", default=None, help="检查点文件路径，默认按目录自动生成")
+    parser.add_argument("--restart", action="store_true", help="忽略已有检查点，从头导入")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.directory):
+        print(f"错误: {args.directory} 不是有效目录")
+        raise SystemExit(1)
+
+    asyncio.run(import_pdfs_from_directory(
+        args.directory,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        link_mode=args.link,
+        checkpoint_path=args.checkpoint,
+        restart=args.restart
+    ))
@@ -1,13 +1,16 @@
 import asyncio
 from contextlib import asynccontextmanager
 import os
-from app.utils.es_utils import create_index
+from app.utils.es_utils import validate_index_schema, init_async_es, close_async_es
+from app.utils.cache_utils import close_async_redis
+from app.utils.captcha import captcha_pool
+from app.utils.report_engine import shutdown_executor as shutdown_report_executor
+from app.utils.utils import RequestSizeLimitMiddleware
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from app.database import AsyncSessionLocal, get_db, create_table, insert_data, select_data, engine
+from app.database import AsyncSessionLocal, get_db, create_table, create_document_fts, insert_data, select_data
 import uvicorn
-from sqlalchemy import text
 from app.routers import auth, kgapi, tagapi, user, admin, documentapi
 
 app = FastAPI(title="榆林知识服务系统", description="基于FastAPI的榆林知识服务系统", version="1.0.0")
@@ -20,8 +23,20 @@ origins = [
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 应用启动时的初始化代码（如果有）
+    # 使用lifespan后 on_event("startup") 不再执行，初始化统一放在这里
+    try:
+        # 确保应用启动时索引已创建，并缓存映射校验结果
+        await asyncio.to_thread(validate_index_schema, force=True)
+    except Exception as e:
+        print(f"ES索引初始化失败: {str(e)}")
+    init_async_es()
+    # 预渲染验证码
+    await captcha_pool.start()
     yield
+    await captcha_pool.close()
+    shutdown_report_executor()
+    await close_async_es()
+    await close_async_redis()
 
 app = FastAPI(lifespan=lifespan)  # 将lifespan函数传递给FastAPI实例
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -29,6 +44,9 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 documents_dir = os.path.join(os.path.dirname(__file__), "static", "documents")
 app.mount("/static/documents", StaticFiles(directory=documents_dir), name="documents")
 
+# 上传请求在写入临时文件之前按大小上限拒绝；先于 CORS 注册，使 413 响应也带跨域头
+app.add_middleware(RequestSizeLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://127.0.0.1:8081", "http://localhost:8081"],  # 明确指定允许的源
@@ -46,10 +64,6 @@ app.include_router(kgapi.router, prefix="/api/kgapi", tags=["KG"])
 app.include_router(documentapi.router, prefix="/api/documentapi", tags=["docs"])
 app.include_router(tagapi.router, prefix="/api/tagapi", tags=["tags"])
 
-@app.on_event("startup")
-async def startup_event():
-    create_index()  # 确保应用启动时索引已创建
-
 @app.get("/")
 def read_root():
     return {"Hello": "Welcome to KG System"}    
@@ -58,9 +72,7 @@ def read_root():
 async def init_db():
     from app.dbmodels import Base
     await create_table(Base)
-    # 启用WAL模式
-    async with engine.begin() as conn:
-        await conn.execute(text("PRAGMA journal_mode=WAL;"))  # 正确写法
+    await create_document_fts()
         
 if __name__ == "__main__":
     asyncio.run(init_db())
@@ -1,25 +1,44 @@
-import json
 import os
 import shutil
-import uuid
 import asyncio
+import codecs
 import logging
+import re
+import time
+from collections import deque
+from contextlib import nullcontext
 from datetime import datetime, timedelta
-from typing import Dict, Tuple, Optional
+from typing import Dict, List, Tuple, Optional
 
 from celery import Celery
 from celery.signals import worker_ready
-from sqlalchemy.ext.asyncio import AsyncSession
 
-from config import REDIS_HOST, REDIS_PASSWORD, REDIS_PORT
+from config import REDIS_HOST, REDIS_PASSWORD, REDIS_PORT, ES_INDEX_LAYOUT
 from app.doc_crud import get_unparsed_documents, mark_document_parsed
-from app.utils.es_utils import index_document_with_fragments, create_index
+from app.utils.cache_utils import close_async_redis
+from app.utils.es_utils import bulk_index_blocks, bulk_index_documents, create_index
+from app.utils.mineru_utils import get_pdf_page_count, iter_page_fragments, merge_fragments, merge_middle_json
+from app.utils.parse_progress import ProgressTracker, reset_parse_progress
+from app.utils.parse_cache import (
+    file_sha256, get_cached_middle_json, parse_cache_key, pin_cache_entry, store_middle_json, unpin_cache_entry
+)
 from app.database import AsyncSessionLocal
 from app.dbmodels import Document
 
 # 配置参数
 MAGIC_PDF_PATH = os.getenv("MAGIC_PDF_PATH", "mineru")
 OUTPUT_BASE_DIR = "static/output/magic_pdf/"
+# 同时运行的 MinerU 进程数，默认占满所有CPU核心
+PARSE_CONCURRENCY = int(os.getenv("PARSE_CONCURRENCY", os.cpu_count() or 1))
+# 同时进行的ES索引请求数
+INDEX_CONCURRENCY = int(os.getenv("INDEX_CONCURRENCY", 2))
+# 页数达到阈值的PDF按页码范围分片，由多个 MinerU 进程并行解析；阈值为0时不分片
+SHARD_PAGE_THRESHOLD = int(os.getenv("SHARD_PAGE_THRESHOLD", 100))
+# 每个分片的页数
+SHARD_PAGE_SIZE = int(os.getenv("SHARD_PAGE_SIZE", 50))
+# 读取子进程输出的块大小，以及失败时随错误信息返回的末尾输出行数
+STREAM_CHUNK_SIZE = 64 * 1024
+OUTPUT_TAIL_LINES = 200
 
 # 创建Celery实例
 celery = Celery('tasks', broker=f'redis://:{REDIS_PASSWORD}@{REDIS_HOST}:{REDIS_PORT}/0')
@@ -34,16 +53,28 @@ celery.conf.beat_schedule = {
 
 # 创建基于文件路径的锁字典
 file_locks: Dict[str, asyncio.Lock] = {}
+# MinerU 版本号缓存
+_mineru_version: Optional[str] = None
 logger = logging.getLogger(__name__)
 
-async def run_magic_pdf(pdf_path: str, unique_output_dir: str, mode: str = "auto") -> Tuple[bool, str, Optional[str]]:
+async def run_magic_pdf(
+    pdf_path: str,
+    unique_output_dir: str,
+    mode: str = "auto",
+    start_page: Optional[int] = None,
+    end_page: Optional[int] = None,
+    progress: Optional[ProgressTracker] = None
+) -> Tuple[bool, str]:
     """
-    执行 magic-pdf 命令处理 PDF 文件，使用基于文件路径的锁确保同文件串行执行
+    执行 magic-pdf 命令处理 PDF 文件，使用基于文件路径（及页码范围）的锁确保同一任务串行执行
     
     参数:
         pdf_path: 输入 PDF 文件的路径
         unique_output_dir: 输出目录的路径
         mode: 处理模式，默认为 "auto"
+        start_page: 起始页（从0开始，含），None 表示从第一页开始
+        end_page: 结束页（从0开始，含），None 表示到最后一页
+        progress: 解析进度记录器，MinerU 输出的进度行会写入其中
     
     返回:
         success: 命令是否成功执行
@@ -51,21 +82,29 @@ async def run_magic_pdf(pdf_path: str, unique_output_dir: str, mode: str = "auto
     """
     # 检查输入文件是否存在
     if not os.path.exists(pdf_path):
-        return False, f"错误: 输入文件不存在: {pdf_path}", None
+        return False, f"错误: 输入文件不存在: {pdf_path}"
 
     os.makedirs(unique_output_dir, exist_ok=True)
     
-    # 获取或创建基于文件路径的锁
-    if pdf_path not in file_locks:
-        file_locks[pdf_path] = asyncio.Lock()
+    # 获取或创建基于文件路径的锁，不同页码范围的分片互不阻塞
+    lock_key = pdf_path if start_page is None and end_page is None else f"{pdf_path}#{start_page}-{end_page}"
+    if lock_key not in file_locks:
+        file_locks[lock_key] = asyncio.Lock()
     
     # 使用文件锁确保同一文件的处理串行执行
-    async with file_locks[pdf_path]:
-        logger.info(f"获取到 {pdf_path} 的文件锁，开始处理")
+    async with file_locks[lock_key]:
+        logger.info(f"获取到 {lock_key} 的文件锁，开始处理")
         
         # 构建命令（使用可配置的路径）
         cmd = [MAGIC_PDF_PATH, "-p", pdf_path, "-o", unique_output_dir, "-m", mode]
+        if start_page is not None:
+            cmd += ["-s", str(start_page)]
+        if end_page is not None:
+            cmd += ["-e", str(end_page)]
         logger.info(f"执行命令: {' '.join(cmd)}")
+        process = None
+        if progress:
+            await progress.start()
         try:
             # 执行命令
             process = await asyncio.create_subprocess_exec(
@@ -74,198 +113,322 @@ async def run_magic_pdf(pdf_path: str, unique_output_dir: str, mode: str = "auto
                 stderr=asyncio.subprocess.PIPE
             )
 
-            # 实时捕获标准输出和标准错误流
-            output_lines = []
-            while True:
-                stdout_line = await process.stdout.readline()
-                stderr_line = await process.stderr.readline()
-
-                if stdout_line:
-                    line = stdout_line.decode('utf-8').strip()
-                    logger.info(f"执行进度: {line}")
-                    output_lines.append(line)
-                if stderr_line:
-                    line = stderr_line.decode('utf-8').strip()
-                    logger.error(f"执行错误: {line}")
-                    output_lines.append(line)
-
-                if not stdout_line and not stderr_line:
-                    break
-
+            # 同时读取标准输出和标准错误流，避免其中一个管道写满后子进程阻塞
+            output_lines = deque(maxlen=OUTPUT_TAIL_LINES)
+            await asyncio.gather(
+                drain_stream(process.stdout, logging.INFO, output_lines, progress),
+                drain_stream(process.stderr, logging.ERROR, output_lines, progress)
+            )
             await process.wait()
 
             if process.returncode != 0:
-                error_msg = f"命令执行失败，返回代码: {process.returncode}\n错误信息:\n{''.join(output_lines)}"
+                error_msg = f"命令执行失败，返回代码: {process.returncode}\n错误信息:\n{chr(10).join(output_lines)}"
                 return False, error_msg
             
-            success_msg = f"命令成功执行。\n标准输出:\n{''.join(output_lines)}"
+            success_msg = f"命令成功执行。\n标准输出:\n{chr(10).join(output_lines)}"
             return True, success_msg
             
         except Exception as e:
             return False, f"执行命令时发生未知错误: {e}"
         finally:
-            logger.info(f"释放 {pdf_path} 的文件锁，处理完成")
+            if progress:
+                await progress.finish(process is not None and process.returncode == 0)
+            logger.info(f"释放 {lock_key} 的文件锁，处理完成")
+
+async def drain_stream(
+    stream: asyncio.StreamReader,
+    level: int,
+    output_lines: deque,
+    progress: Optional[ProgressTracker] = None
+):
+    """
+    按块读取子进程输出直到EOF，按 \\r 或 \\n 切分成行
+
+    tqdm 用 \\r 刷新进度条，不能依赖 readline；进度行写入进度记录器，其余行写日志
+    """
+    buffer = ""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    while True:
+        chunk = await stream.read(STREAM_CHUNK_SIZE)
+        buffer += decoder.decode(chunk, final=not chunk)
+        *lines, buffer = re.split(r'[\r\n]', buffer)
+        if not chunk:
+            lines.append(buffer)
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if progress and await progress.feed(line):
+                logger.debug(f"执行进度: {line}")
+                continue
+            logger.log(level, f"{'执行进度' if level == logging.INFO else '执行错误'}: {line}")
+            output_lines.append(line)
+        if not chunk:
+            break
+
+def mineru_middle_json_path(output_dir: str, pdf_path: str, mode: str = "auto") -> str:
+    """MinerU 输出的 middle.json 路径: {输出目录}/{文件名}/{模式}/{文件名}_middle.json"""
+    tmpname = os.path.splitext(os.path.basename(pdf_path))[0]
+    return os.path.join(output_dir, tmpname, mode, f"{tmpname}_middle.json")
+
+async def run_magic_pdf_sharded(
+    pdf_path: str,
+    output_dir: str,
+    total_pages: int,
+    mode: str = "auto",
+    parse_semaphore: Optional[asyncio.Semaphore] = None,
+    document_id: Optional[str] = None
+) -> Tuple[bool, str]:
+    """
+    按页码范围把大PDF拆成多个分片，每个分片由独立的 MinerU 进程并行解析，
+    再把各分片的 middle.json 按全局页码合并
+
+    每个分片各占用一个 parse_semaphore 名额，与其他文档共享同一并发上限
+
+    返回:
+        success: 是否全部分片解析成功
+        message: 成功时为合并后的 middle.json 路径，失败时为错误信息
+    """
+    ranges = [
+        (start, min(start + SHARD_PAGE_SIZE, total_pages) - 1)
+        for start in range(0, total_pages, SHARD_PAGE_SIZE)
+    ]
+    logger.info(f"{pdf_path} 共 {total_pages} 页，拆分为 {len(ranges)} 个分片并行解析")
+
+    async def parse_shard(start_page: int, end_page: int):
+        shard_dir = os.path.join(output_dir, f"shard_{start_page}_{end_page}")
+        async with parse_semaphore or nullcontext():
+            progress = None
+            if document_id is not None:
+                progress = ProgressTracker(document_id, end_page - start_page + 1, start_page, end_page)
+            success, message = await run_magic_pdf(pdf_path, shard_dir, mode, start_page, end_page, progress)
+        if not success:
+            raise RuntimeError(f"分片 {start_page}-{end_page} 解析失败: {message}")
+        shard_json = mineru_middle_json_path(shard_dir, pdf_path, mode)
+        if not os.path.exists(shard_json):
+            raise RuntimeError(f"分片 {start_page}-{end_page} 中间文件不存在: {shard_json}")
+        return start_page, shard_json
+
+    try:
+        shards = await asyncio.gather(*(parse_shard(start, end) for start, end in ranges))
+    except Exception as e:
+        return False, str(e)
+
+    merged_path = os.path.join(output_dir, "merged_middle.json")
+    merged_pages = await asyncio.to_thread(merge_middle_json, shards, merged_path)
+    logger.info(f"{pdf_path} 分片解析完成，合并 {merged_pages} 页")
+    return True, merged_path
+
+async def get_mineru_version() -> str:
+    """获取 MinerU 版本号（进程内只查询一次），作为解析缓存键的一部分"""
+    global _mineru_version
+    if _mineru_version is None:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                MAGIC_PDF_PATH, "--version",
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout=60)
+            _mineru_version = stdout.decode('utf-8').strip() or "unknown"
+        except Exception as e:
+            logger.warning(f"获取 MinerU 版本失败: {e}")
+            _mineru_version = "unknown"
+    return _mineru_version
+
+def collect_merged_fragments(middle_json_path: str) -> Tuple[List[dict], int]:
+    """逐页读取 middle.json，span合并为行/块以减少nested文档数，返回 (片段列表, 页数)"""
+    fragments = []
+    total_pages = 0
+    for _, page_fragments in iter_page_fragments(middle_json_path):
+        fragments.extend(merge_fragments(page_fragments))
+        total_pages += 1
+    return fragments, total_pages
 
 async def cleanup_output(output_dir: Optional[str]):
-    """清理输出目录"""
+    """清理输出目录（在线程中删除，不阻塞事件循环）"""
     if output_dir and os.path.exists(output_dir):
         try:
-            shutil.rmtree(output_dir)
+            await asyncio.to_thread(shutil.rmtree, output_dir)
             logger.info(f"已清理临时目录: {output_dir}")
         except Exception as e:
             logger.error(f"清理目录 {output_dir} 失败: {str(e)}")
 
-async def process_single_document(db: AsyncSession, doc: Document):
-    """处理单个文档的协程函数"""
+async def process_single_document(
+    doc: Document,
+    parse_semaphore: Optional[asyncio.Semaphore] = None,
+    index_semaphore: Optional[asyncio.Semaphore] = None
+):
+    """
+    处理单个文档的协程函数
+
+    解析期间不占用数据库连接：doc 为已脱离会话的文档对象，解析、索引完成后
+    再用一个短会话标记为已解析
+
+    参数:
+        parse_semaphore: 限制同时运行的 MinerU 进程数
+        index_semaphore: 限制同时进行的ES索引请求数
+    """
     pdf_path = doc.file_path
     # 使用标准路径处理方式
     unique_output_dir = os.path.join(OUTPUT_BASE_DIR, f"{str(doc.id)}")
-    base_name = os.path.basename(pdf_path)
-    tmpname = os.path.splitext(base_name)[0]
-    tmppath = os.path.join(OUTPUT_BASE_DIR, f"{str(doc.id)}/{tmpname}/auto/{tmpname}_middle.json")
+    tmppath = mineru_middle_json_path(unique_output_dir, pdf_path)
+    cache_key = None
     try:
-        if not os.path.exists(tmppath):
-            # 使用异步方式调用run_magic_pdf
-            success, message = await run_magic_pdf(
-                pdf_path, unique_output_dir, mode="auto"
-            )
+        # 按文件内容哈希查找解析缓存，相同内容的PDF不再重复OCR；上传时已记录哈希的不再读取文件计算
+        file_hash = doc.content_hash or await asyncio.to_thread(file_sha256, pdf_path)
+        cache_key = parse_cache_key(file_hash, await get_mineru_version(), "auto")
+        # 使用期间（解析、写入缓存到索引完成）固定条目，淘汰时跳过
+        pin_cache_entry(cache_key)
+        middle_json_path = await asyncio.to_thread(get_cached_middle_json, cache_key)
+        if middle_json_path:
+            logger.info(f"文档 {doc.id} 命中解析缓存: {cache_key}")
+        else:
+            await reset_parse_progress(str(doc.id))
+            total_pages = await asyncio.to_thread(get_pdf_page_count, pdf_path)
+
+            if SHARD_PAGE_THRESHOLD > 0 and total_pages and total_pages >= SHARD_PAGE_THRESHOLD \
+                    and total_pages > SHARD_PAGE_SIZE:
+                # 大PDF按页码范围分片并行解析
+                success, message = await run_magic_pdf_sharded(
+                    pdf_path, unique_output_dir, total_pages, mode="auto",
+                    parse_semaphore=parse_semaphore, document_id=str(doc.id)
+                )
+                if success:
+                    tmppath = message
+            else:
+                # 使用异步方式调用run_magic_pdf
+                async with parse_semaphore or nullcontext():
+                    success, message = await run_magic_pdf(
+                        pdf_path, unique_output_dir, mode="auto",
+                        progress=ProgressTracker(str(doc.id), total_pages)
+                    )
             
             if not success:
                 logger.error(f"处理文档 {doc.id} 失败: {message}")
-                return
+                return None
         
-        # 检查中间文件是否存在
-        if not os.path.exists(tmppath):
-            logger.error(f"中间文件不存在: {tmppath}")
-            return
-        
-        # 加载解析结果
-        with open(tmppath, 'r', encoding='utf-8') as f:
-            pdf_data = json.load(f)
-        
-        # 提取并添加片段 - 优化后的代码
-        fragments = []
-        for page in pdf_data.get('pdf_info', []):
-            page_idx = page.get('page_idx', 0)
-            
-            # 优先处理 preproc_blocks
-            blocks = page.get('preproc_blocks', [])
-            if not blocks:
-                # 如果没有 preproc_blocks，尝试使用 para_blocks
-                blocks = page.get('para_blocks', [])
-            
-            for block_idx, block in enumerate(blocks):
-                block_id = f"p{page_idx}_b{block_idx}"
-                
-                # 处理区块中的行
-                for line_idx, line in enumerate(block.get('lines', [])):
-                    line_id = f"{block_id}_l{line_idx}"
-                    spans = line.get('spans', [])
-                    
-                    # 如果行内没有span，尝试从行对象直接提取内容
-                    if not spans:
-                        content = line.get('content', '')
-                        if content:
-                            fragment = {
-                                "page_idx": page_idx,
-                                "content": content,
-                                "bbox": line.get('bbox', []),
-                                "block_id": block_id,
-                                "line_id": line_id,
-                                "span_id": f"{line_id}_s0"
-                            }
-                            fragments.append(fragment)
-                        continue
-                    
-                    # 处理行内的每个span
-                    for span_idx, span in enumerate(spans):
-                        span_id = f"{line_id}_s{span_idx}"
-                        content = span.get('content', '')
-                        if content:
-                            fragment = {
-                                "page_idx": page_idx,
-                                "content": content,
-                                "bbox": span.get('bbox', []),
-                                "block_id": block_id,
-                                "line_id": line_id,
-                                "span_id": span_id
-                            }
-                            fragments.append(fragment)
+            # 检查中间文件是否存在
+            if not os.path.exists(tmppath):
+                logger.error(f"中间文件不存在: {tmppath}")
+                return None
+
+            # 解析结果移入缓存，临时输出目录随后清理
+            middle_json_path = await asyncio.to_thread(store_middle_json, cache_key, tmppath)
         
         # 准备文档元数据
         metadata = {
             "file_path": doc.file_path,
             "created_at": datetime.now().isoformat(),
-            "total_pages": len(pdf_data.get('pdf_info', [])),
             "tags": doc.tag_string if doc.tag_string else ""
         }
         
-        # 修复点1: 检查index_document_with_fragments是否异步
-        # 这里我们根据错误日志假设它是同步函数
-        index_document_with_fragments(
-            document_id=f"doc_{doc.id}",
-            title=doc.title,
-            fragments=fragments,
-            metadata=metadata
-        )
+        # 通过 streaming_bulk 批量索引，避免单次超大请求超时；放到线程中执行以免阻塞其他文档的解析
+        if ES_INDEX_LAYOUT == "block":
+            # 块级布局：逐页解析、逐页写入，内存中只保留一页
+            async with index_semaphore or nullcontext():
+                stats = await asyncio.to_thread(
+                    bulk_index_blocks, f"doc_{doc.id}", doc.title, iter_page_fragments(middle_json_path), metadata
+                )
+        else:
+            # 逐页增量解析 middle.json 并合并片段，整体放到线程中执行，大文件不阻塞事件循环
+            fragments, total_pages = await asyncio.to_thread(collect_merged_fragments, middle_json_path)
+            metadata["total_pages"] = total_pages
+            async with index_semaphore or nullcontext():
+                stats = await asyncio.to_thread(bulk_index_documents, [{
+                    "document_id": f"doc_{doc.id}",
+                    "title": doc.title,
+                    "fragments": fragments,
+                    "metadata": metadata
+                }])
+        if stats["failed"]:
+            logger.error(f"文档 {doc.id} 索引失败: {stats['errors']}")
+            return stats
         
         # 标记为已解析
-        # 修复点2: 确保在同一个会话中操作
-        doc.parsed = True
-        await db.commit()
-        await db.refresh(doc)
-        
-        logger.info(f"成功解析并索引文档: {doc.id}")
+        async with AsyncSessionLocal() as db:
+            await mark_document_parsed(db, doc.id)
+
+        logger.info(f"成功解析并索引文档: {doc.id}，写入 {stats['success']} 条，索引耗时 {stats['elapsed']:.2f}s")
+        return stats
     except Exception as e:
         logger.error(f"处理文档 {doc.id} 时出错: {str(e)}")
-        # 回滚事务
-        await db.rollback()
         raise
     finally:
-        # 确保清理临时目录
+        if cache_key:
+            unpin_cache_entry(cache_key)
+        # 确保清理临时目录（解析结果已移入缓存）
         if unique_output_dir:
-            # 同步清理函数在异步上下文中直接调用
-            cleanup_output(unique_output_dir)
+            await cleanup_output(unique_output_dir)
 
 @celery.task
 def parse_documents():
     """Celery任务：解析文档"""
     logger.info("Starting document parsing task...")
-    asyncio.run(async_parse_documents())
+    return asyncio.run(async_parse_documents())
+
+async def parse_document_by_id(
+    doc_id: int,
+    parse_semaphore: asyncio.Semaphore,
+    index_semaphore: asyncio.Semaphore
+):
+    """
+    解析单个文档：只在读取文档记录时短暂占用连接，会话关闭后再解析，
+    避免大量文档同时等待解析时耗尽连接池
+    """
+    async with AsyncSessionLocal() as doc_db:
+        doc = await doc_db.get(Document, doc_id)
+    if not doc:
+        logger.warning(f"文档 {doc_id} 不存在，跳过")
+        return None
+    logger.info(f"处理文档 ID: {doc.id}, 标题: {doc.title}")
+    return await process_single_document(doc, parse_semaphore, index_semaphore)
 
 async def async_parse_documents():
-    """异步函数：解析文档"""
+    """异步函数：并发解析文档，返回索引成功/失败统计"""
     create_index()  # 确保索引存在
-    
-    # 修复点3: 使用新的会话上下文
-    async with AsyncSessionLocal() as db:
-        try:
-            # 获取未解析文档
+    summary = {"success": 0, "failed": 0, "indexed": 0, "elapsed": 0.0, "docs_per_hour": 0.0}
+    start = time.perf_counter()
+    # 每次 asyncio.run 都是新的事件循环，旧循环创建的锁不能复用
+    file_locks.clear()
+    parse_semaphore = asyncio.Semaphore(PARSE_CONCURRENCY)
+    index_semaphore = asyncio.Semaphore(INDEX_CONCURRENCY)
+
+    try:
+        # 获取未解析文档
+        async with AsyncSessionLocal() as db:
             unparsed_docs = await get_unparsed_documents(db)
-            logger.info(f"找到 {len(unparsed_docs)} 个未解析文档")
-            
-            for doc in unparsed_docs:
-                try:
-                    logger.info(f"处理文档 ID: {doc.id}, 标题: {doc.title}")
-                    
-                    # 避免会话状态污染
-                    async with AsyncSessionLocal() as doc_db:
-                        # 重新加载文档以确保会话状态一致
-                        doc_refreshed = await doc_db.get(Document, doc.id)
-                        if doc_refreshed:
-                            await process_single_document(doc_db, doc_refreshed)
-                        else:
-                            logger.warning(f"文档 {doc.id} 不存在，跳过")
-                except Exception as e:
-                    logger.error(f"处理文档 {doc.id} 时出错: {str(e)}")
-                    # 继续处理下一个文档
-                    continue
-            
-        except Exception as e:
-            logger.error(f"批量处理文档时出错: {str(e)}")
-        finally:
-            # 确保关闭会话
-            await db.close()
+        logger.info(
+            f"找到 {len(unparsed_docs)} 个未解析文档，解析并发 {PARSE_CONCURRENCY}，索引并发 {INDEX_CONCURRENCY}"
+        )
+
+        results = await asyncio.gather(
+            *(parse_document_by_id(doc.id, parse_semaphore, index_semaphore) for doc in unparsed_docs),
+            return_exceptions=True
+        )
+        for doc, stats in zip(unparsed_docs, results):
+            if isinstance(stats, Exception):
+                logger.error(f"处理文档 {doc.id} 时出错: {str(stats)}")
+                summary["failed"] += 1
+            elif stats and not stats["failed"]:
+                summary["success"] += 1
+                summary["indexed"] += stats["success"]
+            else:
+                summary["failed"] += 1
+    except Exception as e:
+        logger.error(f"批量处理文档时出错: {str(e)}")
+    finally:
+        # 每次 asyncio.run 都会新建事件循环和对应的Redis客户端，循环结束前关闭，避免连接泄漏
+        await close_async_redis()
+
+    summary["elapsed"] = time.perf_counter() - start
+    if summary["elapsed"] > 0:
+        summary["docs_per_hour"] = summary["success"] * 3600 / summary["elapsed"]
+    logger.info(
+        f"文档解析任务完成: 成功 {summary['success']}，失败 {summary['failed']}，"
+        f"耗时 {summary['elapsed']:.1f}s，吞吐 {summary['docs_per_hour']:.1f} 文档/小时"
+    )
+    return summary
 
 @worker_ready.connect
 def at_start(sender, **kwargs):